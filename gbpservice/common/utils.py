@@ -11,13 +11,17 @@
 #    under the License.
 
 from collections import OrderedDict
+import functools
 import sys
+import threading
+import time
 
 from neutron_lib import context as n_context
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import importutils
+import sqlalchemy as sa
 from stevedore import driver
 
 from gbpservice._i18n import _
@@ -25,6 +29,31 @@ from gbpservice._i18n import _
 LOG = logging.getLogger(__name__)
 cfg.CONF.import_group('keystone_authtoken', 'keystonemiddleware.auth_token')
 
+profiling_opts = [
+    cfg.FloatOpt('slow_operation_seconds',
+                 default=0,
+                 help=_("Log a warning with the elapsed time, the number of "
+                        "SQL statements executed and the number of rows "
+                        "they returned whenever a profiled API call or RPC "
+                        "handler takes longer than this many seconds. "
+                        "Default is 0 which disables the time threshold.")),
+    cfg.IntOpt('slow_operation_queries',
+               default=0,
+               help=_("Log the same warning whenever a profiled API call "
+                      "or RPC handler executes more than this many SQL "
+                      "statements. Default is 0 which disables the query "
+                      "threshold.")),
+    cfg.BoolOpt('collect_operation_stats',
+                default=False,
+                help=_("Keep per-process counters of the calls, slow "
+                       "calls, SQL statements and latencies of each "
+                       "profiled operation, which can be retrieved with "
+                       "get_operation_stats().")),
+]
+
+
+cfg.CONF.register_opts(profiling_opts, "gbp_profiling")
+
 
 def get_function_local_from_stack(function, local):
     frame = sys._getframe()
@@ -138,3 +167,177 @@ def set_difference(iterable_1, iterable_2):
     set1 = set(iterable_1)
     set2 = set(iterable_2)
     return (set1 - set2), (set2 - set1)
+
+
+class LatencyHistogram(object):
+    """Counts of observed latencies by bucket.
+
+    Buckets are given by their upper bound in milliseconds, with a
+    final bucket for anything slower than the last bound.
+    """
+
+    BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+    def __init__(self, buckets_ms=BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.total_seconds = 0.0
+
+    def observe(self, seconds):
+        ms = seconds * 1000
+        for index, bound in enumerate(self.buckets_ms):
+            if ms <= bound:
+                break
+        else:
+            index = len(self.buckets_ms)
+        self.counts[index] += 1
+        self.total_seconds += seconds
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def snapshot(self):
+        result = OrderedDict(
+            ('<=%sms' % bound, count)
+            for bound, count in zip(self.buckets_ms, self.counts))
+        result['>%sms' % self.buckets_ms[-1]] = self.counts[-1]
+        return result
+
+
+class OperationProfile(object):
+    """SQL statements, rows and time spent in one profiled operation."""
+
+    def __init__(self, name):
+        self.name = name
+        self.queries = 0
+        self.rows = 0
+        self.started = time.time()
+        self.elapsed = None
+
+    def stop(self):
+        self.elapsed = time.time() - self.started
+
+
+class OperationStats(object):
+    """Per-process counters of a profiled operation."""
+
+    def __init__(self):
+        self.calls = 0
+        self.slow_calls = 0
+        self.queries = 0
+        self.rows = 0
+        self.latency = LatencyHistogram()
+
+    def add(self, profile, slow):
+        self.calls += 1
+        self.slow_calls += int(slow)
+        self.queries += profile.queries
+        self.rows += profile.rows
+        self.latency.observe(profile.elapsed)
+
+    def snapshot(self):
+        return {'calls': self.calls,
+                'slow_calls': self.slow_calls,
+                'queries': self.queries,
+                'rows': self.rows,
+                'latency': self.latency.snapshot()}
+
+
+# The profiles active in the current (green) thread, innermost last.
+_active_profiles = threading.local()
+_operation_stats = {}
+_listeners_installed = False
+
+
+def _get_active_profiles():
+    profiles = getattr(_active_profiles, 'profiles', None)
+    if profiles is None:
+        profiles = _active_profiles.profiles = []
+    return profiles
+
+
+def _count_statement(conn, cursor, statement, parameters, context,
+                     executemany):
+    profiles = getattr(_active_profiles, 'profiles', None)
+    if profiles:
+        # The DB driver reports -1 when the row count isn't known.
+        rows = max(cursor.rowcount, 0)
+        for profile in profiles:
+            profile.queries += 1
+            profile.rows += rows
+
+
+def _install_listeners():
+    global _listeners_installed
+    if not _listeners_installed:
+        sa.event.listen(sa.engine.Engine, 'after_cursor_execute',
+                        _count_statement)
+        _listeners_installed = True
+
+
+def _profiling_enabled():
+    conf = cfg.CONF.gbp_profiling
+    return (conf.slow_operation_seconds > 0 or
+            conf.slow_operation_queries > 0 or
+            conf.collect_operation_stats)
+
+
+def _finish_profile(profile):
+    conf = cfg.CONF.gbp_profiling
+    slow = ((conf.slow_operation_seconds > 0 and
+             profile.elapsed > conf.slow_operation_seconds) or
+            (conf.slow_operation_queries > 0 and
+             profile.queries > conf.slow_operation_queries))
+    if slow:
+        LOG.warning("Slow operation %(operation)s took %(elapsed).3f "
+                    "seconds, executing %(queries)d SQL statements "
+                    "returning %(rows)d rows",
+                    {'operation': profile.name,
+                     'elapsed': profile.elapsed,
+                     'queries': profile.queries,
+                     'rows': profile.rows})
+    if conf.collect_operation_stats:
+        stats = _operation_stats.get(profile.name)
+        if stats is None:
+            stats = _operation_stats.setdefault(profile.name,
+                                                OperationStats())
+        stats.add(profile, slow)
+
+
+def profiled(func):
+    """Decorator profiling each call of an API call or RPC handler.
+
+    When the gbp_profiling options enable it, the SQL statements
+    executed by the call, the rows they returned and the time it took
+    are measured, a warning is logged if a threshold is exceeded, and
+    the per-process counters are updated. Statements executed by
+    nested profiled calls are counted for each of them.
+    """
+    name = '%s.%s' % (func.__module__, func.__qualname__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _profiling_enabled():
+            return func(*args, **kwargs)
+        _install_listeners()
+        profile = OperationProfile(name)
+        profiles = _get_active_profiles()
+        profiles.append(profile)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiles.pop()
+            profile.stop()
+            _finish_profile(profile)
+    return wrapper
+
+
+def get_operation_stats():
+    """Return the counters of the operations profiled by this process."""
+    return dict((name, stats.snapshot())
+                for name, stats in _operation_stats.items())
+
+
+def clear_operation_stats():
+    _operation_stats.clear()
@@ -11,6 +11,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from neutron.db.models import securitygroup as sg_models
+from neutron.db import models_v2
+from neutron.db.port_security import models as psec_models
 from neutron.extensions import securitygroup as ext_sg
 from neutron.notifiers import nova
 from neutron import quota
@@ -19,11 +22,14 @@ from neutron_lib.exceptions import address_scope as as_exc
 from neutron_lib.exceptions import l3
 from neutron_lib.plugins import constants as pconst
 from neutron_lib.plugins import directory
+from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import excutils
 
+from gbpservice.neutron.db import api as db_api
 from gbpservice.neutron.extensions import group_policy as gp_ext
 from gbpservice.neutron.services.grouppolicy.common import exceptions as exc
+from gbpservice.neutron.services.grouppolicy import config  # noqa
 
 LOG = logging.getLogger(__name__)
 
@@ -83,7 +89,8 @@ class LocalAPI(object):
         # REVISIT(rkukura): Do create.start notification?
         # REVISIT(rkukura): Check authorization?
         reservation = None
-        if plugin in [self._group_policy_plugin]:
+        if (plugin in [self._group_policy_plugin] and
+                cfg.CONF.group_policy.reserve_implicit_resource_quota):
             reservation = quota.QUOTAS.make_reservation(
                 context, context.tenant_id, {resource: 1}, plugin)
         action = 'create_' + resource
@@ -175,10 +182,98 @@ class LocalAPI(object):
         return self._create_resource(self._core_plugin, plugin_context, 'port',
                                      attrs)
 
+    def _create_ports_bulk(self, plugin_context, attrs_list):
+        # The core plugin creates all the ports in a single transaction,
+        # so either all of them are created or none is.
+        return self._core_plugin.create_port_bulk(
+            plugin_context, {'ports': [{'port': attrs}
+                                       for attrs in attrs_list]})
+
     def _update_port(self, plugin_context, port_id, attrs):
         return self._update_resource(self._core_plugin, plugin_context, 'port',
                                      port_id, attrs)
 
+    def _update_ports_security_groups(self, plugin_context, port_ids,
+                                      add_sg_ids=None, remove_sg_ids=None):
+        """Add and/or remove SGs on a set of ports in one transaction.
+
+        Unlike _update_port, this manipulates the SecurityGroupPortBinding
+        rows for all the ports set-wise rather than doing a full port
+        update for each one, so the mechanism drivers are not invoked.
+        Ports that no longer exist or that have port security disabled
+        are skipped. Once the transaction is committed, a single SG member
+        update notification covering all the affected SGs is sent, and a
+        port update notification is sent for each changed port.
+        Returns the set of IDs of the ports whose SGs were changed.
+        """
+        port_ids = set(port_ids or [])
+        add_sg_ids = set(add_sg_ids or [])
+        remove_sg_ids = set(remove_sg_ids or []) - add_sg_ids
+        if not port_ids or not (add_sg_ids or remove_sg_ids):
+            return set()
+
+        updated_port_ids = set()
+        with db_api.CONTEXT_WRITER.using(plugin_context) as session:
+            found_port_ids = {
+                port_id for port_id, in session.query(models_v2.Port.id).
+                filter(models_v2.Port.id.in_(port_ids))}
+            for port_id in port_ids - found_port_ids:
+                LOG.warning("Port %s is missing", port_id)
+            psec_disabled_port_ids = {
+                port_id for port_id, in session.query(
+                    psec_models.PortSecurityBinding.port_id).
+                filter(psec_models.PortSecurityBinding.port_id.in_(
+                    found_port_ids)).
+                filter(psec_models.PortSecurityBinding.
+                       port_security_enabled.is_(False))}
+            for port_id in psec_disabled_port_ids:
+                LOG.debug("Port security disabled for port %s ", port_id)
+            port_ids = found_port_ids - psec_disabled_port_ids
+            if not port_ids:
+                return set()
+
+            # Individual ORM deletes and adds are used rather than bulk
+            # statements so that the ports' revision numbers get bumped.
+            bound = set()
+            for binding in session.query(
+                    sg_models.SecurityGroupPortBinding).filter(
+                    sg_models.SecurityGroupPortBinding.port_id.in_(
+                        port_ids)).filter(
+                    sg_models.SecurityGroupPortBinding.security_group_id.in_(
+                        add_sg_ids | remove_sg_ids)):
+                if binding.security_group_id in remove_sg_ids:
+                    session.delete(binding)
+                    updated_port_ids.add(binding.port_id)
+                else:
+                    bound.add((binding.port_id, binding.security_group_id))
+            for port_id in port_ids:
+                for sg_id in add_sg_ids:
+                    if (port_id, sg_id) not in bound:
+                        session.add(sg_models.SecurityGroupPortBinding(
+                            port_id=port_id, security_group_id=sg_id))
+                        updated_port_ids.add(port_id)
+
+        notifier = getattr(self._core_plugin, 'notifier', None)
+        if updated_port_ids and notifier:
+            # The SG member update only reaches the ports using these SGs
+            # as remote groups. The ports whose own SGs changed are told
+            # with a port update, as a full port update would do.
+            notifier.security_groups_member_updated(
+                plugin_context, sorted(add_sg_ids | remove_sg_ids))
+            self._notify_ports_updated(plugin_context, updated_port_ids)
+        return updated_port_ids
+
+    def _notify_ports_updated(self, plugin_context, port_ids):
+        get_contexts = getattr(self._core_plugin, 'get_bound_ports_contexts',
+                               None)
+        if not get_contexts:
+            return
+        port_contexts = get_contexts(plugin_context, sorted(port_ids))
+        for port_id in sorted(port_ids):
+            port_context = port_contexts.get(port_id)
+            if port_context:
+                self._core_plugin._notify_port_updated(port_context)
+
     def _delete_port(self, plugin_context, port_id):
         try:
             self._delete_resource(self._core_plugin,
@@ -0,0 +1,53 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add snat port owners
+
+Revision ID: 3c1b5a7d9e2f
+Revises: f0c1d2e3a4b5
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3c1b5a7d9e2f'
+down_revision = 'f0c1d2e3a4b5'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'apic_aim_snat_port_owners',
+        sa.Column('network_id', sa.String(36), nullable=False),
+        sa.Column('owner', sa.String(255), nullable=False),
+        sa.Column('port_id', sa.String(36), nullable=False),
+        sa.ForeignKeyConstraint(['network_id'], ['networks.id'],
+                                ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['port_id'], ['ports.id'],
+                                ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('network_id', 'owner'),
+        sa.UniqueConstraint('port_id'))
+
+    # Record the owners of the existing SNAT pool ports. Should an
+    # owner already have several ports on a network, only one of them
+    # is recorded, and the others are left as they are.
+    op.execute(
+        "INSERT INTO apic_aim_snat_port_owners (network_id, owner, port_id) "
+        "SELECT network_id, device_id, MIN(id) FROM ports "
+        "WHERE device_owner = 'apic:snat-pool' "
+        "GROUP BY network_id, device_id")
+
+
+def downgrade():
+    pass
@@ -0,0 +1,38 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add static resources versions
+
+Revision ID: c5e7a9b1d3f4
+Revises: 3c1b5a7d9e2f
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c5e7a9b1d3f4'
+down_revision = '3c1b5a7d9e2f'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        'apic_aim_static_resources_versions',
+        sa.Column('system_id', sa.String(255), nullable=False),
+        sa.Column('version', sa.Integer, nullable=False),
+        sa.PrimaryKeyConstraint('system_id'))
+
+
+def downgrade():
+    pass
@@ -1011,6 +1011,7 @@ class Group_policy(extensions.ExtensionDescriptor):
         return resource_helper.build_resource_info(plural_mappings,
                                                    RESOURCE_ATTRIBUTE_MAP,
                                                    constants.GROUP_POLICY,
+                                                   allow_bulk=True,
                                                    register_quota=True)
 
     @classmethod
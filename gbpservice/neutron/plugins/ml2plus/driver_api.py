@@ -477,6 +477,23 @@ class MechanismDriver(driver_api.MechanismDriver):
         """
         pass
 
+    def create_security_group_rule_bulk_precommit(self, contexts):
+        """Allocate resources for new security group rules.
+
+        :param contexts: List of SecurityGroupRuleContext instances
+        describing the new security group rules, which may belong to
+        different security groups.
+
+        Called instead of create_security_group_rule_precommit for the
+        rules of a bulk create request, inside the same transaction
+        context on session. The default implementation calls
+        create_security_group_rule_precommit for each rule. Call
+        cannot block. Raising an exception will result in a rollback
+        of the current transaction.
+        """
+        for context in contexts:
+            self.create_security_group_rule_precommit(context)
+
     def create_security_group_rule_postcommit(self, context):
         """Create a security group rule.
 
@@ -13,6 +13,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import copy
+import time
+
+from aim import aim_manager
+from aim.api import infra as aim_infra
+from aim.api import resource as aim_resource
 from gbpclient.v2_0 import client as gbp_client
 from keystoneauth1 import loading as ks_loading
 from keystoneauth1 import session as ks_session
@@ -22,6 +28,7 @@ from neutronclient.neutron.v2_0 import purge
 from neutronclient.v2_0 import client as neutron_client
 from oslo_config import cfg
 from oslo_log import log as logging
+import sqlalchemy as sa
 
 
 LOG = logging.getLogger(__name__)
@@ -33,6 +40,22 @@ LOG = logging.getLogger(__name__)
 # needed, or if neutron's credentials could somehow be used.
 AUTH_GROUP = 'keystone_authtoken'
 
+# Key of the per-transaction AIM object cache in the DB session's
+# info dict.
+AIM_CACHE_KEY = '_aim_object_cache'
+
+# Key of the per-transaction global settings cache in the DB session's
+# info dict.
+SETTINGS_CACHE_KEY = '_aim_settings_cache'
+
+# Key of the distributed SNAT service node cache entries to drop when
+# the transaction ends in the DB session's info dict.
+DIST_SNAT_CACHE_KEY = '_aim_dist_snat_service_node_changes'
+
+# Final value of global settings registered without one, which no
+# loaded value can be equal to.
+_NO_FINAL_VALUE = object()
+
 
 class ProjectDetailsCache(object):
     """Cache of Keystone project ID to project details mappings."""
@@ -171,3 +194,358 @@ class PurgeAPI(purge.Purge):
 
     def get_client(self):
         return self.neutron_client
+
+
+class CachingAimManager(aim_manager.AimManager):
+    """AimManager caching ACI objects for the current DB transaction.
+
+    Within one transaction, get() and find() calls for ACI resources
+    are served from memory after the first time, saving a round-trip
+    to the DB server each. Writes through this manager invalidate the
+    affected entries, and the cache is dropped whenever the session's
+    transaction commits or rolls back, so it never outlives the API
+    call that populated it. Callers get copies, so modifying a returned
+    object does not modify the cache.
+    """
+
+    def _get_cache(self, context):
+        session = getattr(context, 'db_session', None)
+        if session is None:
+            return None
+        cache = session.info.get(AIM_CACHE_KEY)
+        if cache is None:
+            cache = session.info[AIM_CACHE_KEY] = {
+                'get': {}, 'find': {}, 'hits': 0}
+            if not sa.event.contains(session, 'after_commit',
+                                     _drop_aim_cache):
+                sa.event.listen(session, 'after_commit', _drop_aim_cache)
+                sa.event.listen(session, 'after_rollback', _drop_aim_cache)
+        return cache
+
+    @staticmethod
+    def _cacheable(klass, for_update, include_aim_id):
+        return (not for_update and not include_aim_id and
+                issubclass(klass, aim_resource.AciResourceBase))
+
+    def get(self, context, resource, for_update=False,
+            include_aim_id=False):
+        cache = (self._cacheable(type(resource), for_update, include_aim_id)
+                 and self._get_cache(context))
+        if not cache:
+            return super(CachingAimManager, self).get(
+                context, resource, for_update=for_update,
+                include_aim_id=include_aim_id)
+        key = (type(resource), tuple(resource.identity))
+        if key in cache['get']:
+            cache['hits'] += 1
+        else:
+            cache['get'][key] = super(CachingAimManager, self).get(
+                context, resource)
+        return copy.deepcopy(cache['get'][key])
+
+    def find(self, context, resource_class, for_update=False,
+             include_aim_id=False, **kwargs):
+        cache = (self._cacheable(resource_class, for_update, include_aim_id)
+                 and self._get_cache(context))
+        key = None
+        if cache:
+            try:
+                key = (resource_class, frozenset(kwargs.items()))
+                hash(key)
+            except TypeError:
+                # Filters with list values are not cached.
+                key = None
+        if key is None:
+            return super(CachingAimManager, self).find(
+                context, resource_class, for_update=for_update,
+                include_aim_id=include_aim_id, **kwargs)
+        if key in cache['find']:
+            cache['hits'] += 1
+        else:
+            cache['find'][key] = super(CachingAimManager, self).find(
+                context, resource_class, **kwargs)
+        return copy.deepcopy(cache['find'][key])
+
+    def _invalidate(self, context, resource_class, identity=None):
+        session = getattr(context, 'db_session', None)
+        cache = session.info.get(AIM_CACHE_KEY) if session else None
+        if not cache:
+            return
+        if identity is None:
+            for key in [k for k in cache['get'] if k[0] is resource_class]:
+                del cache['get'][key]
+        else:
+            cache['get'].pop((resource_class, tuple(identity)), None)
+        for key in [k for k in cache['find'] if k[0] is resource_class]:
+            del cache['find'][key]
+
+    def _invalidate_all(self, context):
+        session = getattr(context, 'db_session', None)
+        cache = session.info.get(AIM_CACHE_KEY) if session else None
+        if cache:
+            cache['get'].clear()
+            cache['find'].clear()
+
+    def create(self, context, resource, *args, **kwargs):
+        try:
+            return super(CachingAimManager, self).create(
+                context, resource, *args, **kwargs)
+        finally:
+            self._invalidate(context, type(resource), resource.identity)
+
+    def update(self, context, resource, *args, **kwargs):
+        try:
+            return super(CachingAimManager, self).update(
+                context, resource, *args, **kwargs)
+        finally:
+            self._invalidate(context, type(resource), resource.identity)
+
+    def delete(self, context, resource, *args, **kwargs):
+        try:
+            return super(CachingAimManager, self).delete(
+                context, resource, *args, **kwargs)
+        finally:
+            # A cascading delete can remove children of any type.
+            self._invalidate_all(context)
+
+    def delete_all(self, context, resource_class, *args, **kwargs):
+        try:
+            return super(CachingAimManager, self).delete_all(
+                context, resource_class, *args, **kwargs)
+        finally:
+            self._invalidate(context, resource_class)
+
+    def get_saved_round_trips(self, context):
+        """Return how many DB round-trips the cache saved so far.
+
+        :param context: AimContext whose transaction to report on
+
+        The count covers the current transaction of the context's
+        session, and is also logged when that transaction ends.
+        """
+        session = getattr(context, 'db_session', None)
+        cache = session.info.get(AIM_CACHE_KEY) if session else None
+        return cache['hits'] if cache else 0
+
+
+def _drop_aim_cache(session):
+    cache = session.info.pop(AIM_CACHE_KEY, None)
+    if cache and cache['hits']:
+        LOG.debug("AIM object cache saved %s DB round-trips",
+                  cache['hits'])
+
+
+class GlobalSettingsCache(object):
+    """Process-wide cache of rarely changing global settings.
+
+    Each setting is registered with a function loading its value from
+    the DB. Once loaded, a value is kept for global_settings_cache_max_age
+    seconds, after which it is loaded again, so that changes made by
+    other processes are picked up within that time.
+    A setting can also be registered with a final value, i.e. a value
+    it never changes from once set, such as a one-way migration flag,
+    which is then kept for the lifetime of the process.
+
+    Setters must call invalidate() so that the change is seen by this
+    process right away. Within the transaction making the change the
+    setting is always loaded from the DB, and the cached value is only
+    replaced once that transaction has ended.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._values = {}
+        # Bumped on every change made by this process, so that values
+        # cached by other transactions are not used after it.
+        self._generation = 0
+
+    def register(self, name, loader, final_value=_NO_FINAL_VALUE):
+        self._loaders[name] = (loader, final_value)
+
+    def get(self, session, name):
+        loader, final_value = self._loaders[name]
+        txn_cache = session.info.get(SETTINGS_CACHE_KEY)
+        if txn_cache and name in txn_cache['changed']:
+            return loader(session)
+        entry = self._values.get(name)
+        if entry and (
+                (final_value is not _NO_FINAL_VALUE and
+                 entry[0] == final_value) or
+                time.time() - entry[1] <
+                cfg.CONF.ml2_apic_aim.global_settings_cache_max_age):
+            return entry[0]
+        # Values that cannot be cached for the whole process are at
+        # least only loaded once per transaction.
+        txn_cache = self._get_txn_cache(session)
+        if txn_cache['generation'] != self._generation:
+            txn_cache['values'].clear()
+            txn_cache['generation'] = self._generation
+        if name not in txn_cache['values']:
+            value = loader(session)
+            txn_cache['values'][name] = value
+            self._values[name] = (value, time.time())
+        return txn_cache['values'][name]
+
+    def invalidate(self, session, name):
+        self._values.pop(name, None)
+        self._generation += 1
+        txn_cache = self._get_txn_cache(session)
+        txn_cache['values'].pop(name, None)
+        txn_cache['changed'].add(name)
+
+    def clear(self):
+        self._values.clear()
+        self._generation += 1
+
+    def _get_txn_cache(self, session):
+        txn_cache = session.info.get(SETTINGS_CACHE_KEY)
+        if txn_cache is None:
+            txn_cache = session.info[SETTINGS_CACHE_KEY] = {
+                'values': {}, 'changed': set(),
+                'generation': self._generation}
+            if not sa.event.contains(session, 'after_commit',
+                                     self._end_transaction):
+                sa.event.listen(session, 'after_commit',
+                                self._end_transaction)
+                sa.event.listen(session, 'after_rollback',
+                                self._end_transaction)
+        return txn_cache
+
+    def _end_transaction(self, session):
+        txn_cache = session.info.pop(SETTINGS_CACHE_KEY, None)
+        if txn_cache and txn_cache['changed']:
+            for name in txn_cache['changed']:
+                self._values.pop(name, None)
+            self._generation += 1
+
+
+class HostTopologyCache(object):
+    """Process-wide cache of the fabric topology of each host.
+
+    Holds the AIM HostLink and HostDomainMappingV2 objects of each host,
+    so that binding and unbinding ports does not need to look them up
+    in the AIM DB every time. Entries are dropped when the topology RPC
+    handler of this process changes a host's links, and are reloaded
+    once older than topology_cache_max_age seconds, which bounds how
+    long changes made by other processes, such as other neutron-server
+    workers handling topology RPCs or aimctl, can go unnoticed. A max
+    age of 0 disables caching of these objects.
+
+    The parsed form of static path strings is always cached, as it
+    only depends on the string itself.
+    """
+
+    def __init__(self, aim_mgr):
+        self.aim = aim_mgr
+        self._entries = {}
+        self._path_topologies = {}
+
+    def _find(self, aim_ctx, key, resource_class, **filters):
+        max_age = cfg.CONF.ml2_apic_aim.topology_cache_max_age
+        if max_age <= 0:
+            return self.aim.find(aim_ctx, resource_class, **filters)
+        entry = self._entries.get(key)
+        now = time.time()
+        if not entry or now - entry[1] >= max_age:
+            entry = self._entries[key] = (
+                self.aim.find(aim_ctx, resource_class, **filters), now)
+        return copy.deepcopy(entry[0])
+
+    def get_host_links(self, aim_ctx, host):
+        return self._find(aim_ctx, ('links', host), aim_infra.HostLink,
+                          host_name=host)
+
+    def get_host_domain_mappings(self, aim_ctx, host):
+        return self._find(aim_ctx, ('domains', host),
+                          aim_infra.HostDomainMappingV2, host_name=host)
+
+    def get_path_topology(self, path, parse):
+        topology = self._path_topologies.get(path)
+        if topology is None:
+            topology = self._path_topologies[path] = parse(path)
+        is_vpc, pod_id, nodes, node_paths, module, port = topology
+        # Callers get their own lists.
+        return (is_vpc, pod_id,
+                list(nodes) if nodes is not None else None,
+                list(node_paths) if node_paths is not None else None,
+                module, port)
+
+    def invalidate_host(self, host):
+        self._entries.pop(('links', host), None)
+        self._entries.pop(('domains', host), None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class DistSnatServiceNodeCache(object):
+    """Process-wide cache of the distributed SNAT service nodes.
+
+    Holds, for each SNAT IP and subnet, the service nodes of all the
+    hosts sharing that SNAT IP, which is the same for every endpoint on
+    every one of those hosts. Entries are dropped when this process
+    changes the SNAT IP's port range mappings or cleans up a host, both
+    right away and once the transaction making the change ends, and
+    are reloaded once older than dist_snat_service_node_cache_max_age
+    seconds, which bounds how long changes made by other processes can
+    go unnoticed. A max age of 0 disables this cache.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, snat_ip, subnet_id, load):
+        max_age = cfg.CONF.ml2_apic_aim.dist_snat_service_node_cache_max_age
+        if max_age <= 0:
+            return load()
+        key = (snat_ip, subnet_id)
+        entry = self._entries.get(key)
+        now = time.time()
+        if not entry or now - entry[1] >= max_age:
+            entry = self._entries[key] = (load(), now)
+        return copy.deepcopy(entry[0])
+
+    def invalidate(self, session, snat_ip=None, subnet_id=None):
+        # Entries are dropped right away for this transaction, and again
+        # once it ends, since they may meanwhile have been reloaded with
+        # data the transaction had not yet committed.
+        self._invalidate(snat_ip, subnet_id)
+        self._get_txn_changes(session).append(
+            lambda: self._invalidate(snat_ip, subnet_id))
+
+    def invalidate_host(self, session, host):
+        self._invalidate_host(host)
+        self._get_txn_changes(session).append(
+            lambda: self._invalidate_host(host))
+
+    def _invalidate(self, snat_ip, subnet_id):
+        if snat_ip is None:
+            self._entries.clear()
+            return
+        for key in list(self._entries):
+            if key[0] == snat_ip and subnet_id in (None, key[1]):
+                del self._entries[key]
+
+    def _invalidate_host(self, host):
+        for key, entry in list(self._entries.items()):
+            if any(node['host'] == host for node in entry[0]):
+                del self._entries[key]
+
+    def _get_txn_changes(self, session):
+        changes = session.info.get(DIST_SNAT_CACHE_KEY)
+        if changes is None:
+            changes = session.info[DIST_SNAT_CACHE_KEY] = []
+            if not sa.event.contains(session, 'after_commit',
+                                     self._end_transaction):
+                sa.event.listen(session, 'after_commit',
+                                self._end_transaction)
+                sa.event.listen(session, 'after_rollback',
+                                self._end_transaction)
+        return changes
+
+    def _end_transaction(self, session):
+        for invalidate in session.info.pop(DIST_SNAT_CACHE_KEY, None) or []:
+            invalidate()
+
+    def clear(self):
+        self._entries.clear()
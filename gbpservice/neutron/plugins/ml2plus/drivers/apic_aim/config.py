@@ -81,6 +81,51 @@ apic_opts = [
                       "this should only be used temporarily to enable "
                       "cleaning up overlapping routed subnets created before "
                       "overlap checking was implemented.")),
+    cfg.IntOpt('global_settings_cache_max_age', default=0,
+               help=("How many seconds a global setting, such as whether "
+                     "host protection policies have been normalized, can "
+                     "be served from the neutron-server process' cache "
+                     "before being read from the DB again. Changes made "
+                     "by other processes, such as the hpp-normalize tool, "
+                     "can take this long to be seen. Settings that have "
+                     "reached their final value are always cached, and "
+                     "settings are always read at most once per DB "
+                     "transaction.")),
+    cfg.IntOpt('topology_cache_max_age', default=0,
+               help=("How many seconds the AIM host links and host domain "
+                     "mappings of a host can be served from the "
+                     "neutron-server process' cache before being read from "
+                     "the DB again. Links changed through the topology RPC "
+                     "handled by the same process are seen at once, but "
+                     "changes handled by other processes, including those "
+                     "made with aimctl, can take this long to be seen. The "
+                     "default of 0 disables this cache.")),
+    cfg.IntOpt('agent_cache_ttl', default=0,
+               help=("How many seconds the agents found on a host can be "
+                     "reused by the neutron-server process when binding "
+                     "ports to that host. Agent state reports and agent "
+                     "deletions handled by the same process refresh the "
+                     "host's entry at once, but those handled by other "
+                     "processes, usually the RPC workers, can take this "
+                     "long to be seen, including changes to the agents' "
+                     "liveness and configurations. Hosts without agents "
+                     "are never cached. The default of 0 disables this "
+                     "cache.")),
+    cfg.IntOpt('dist_snat_service_node_cache_max_age', default=5,
+               help=("How many seconds the list of distributed SNAT "
+                     "service nodes sharing an SNAT IP can be reused by "
+                     "the neutron-server process when answering endpoint "
+                     "details requests. Port range mapping changes and "
+                     "host cleanups done by the same process refresh "
+                     "the list at once. Set to 0 to query the list for "
+                     "every request.")),
+    cfg.BoolOpt('preallocate_snat_ips', default=False,
+                help=("If True, when a router's gateway is set on an "
+                      "external network, SNAT IPs on that network's "
+                      "SNAT pool subnets are allocated in one batch for "
+                      "all hosts with ports on the router's networks, "
+                      "instead of one at a time as each host requests "
+                      "its endpoint details.")),
 ]
 
 
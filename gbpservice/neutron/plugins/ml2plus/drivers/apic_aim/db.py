@@ -105,6 +105,26 @@ class HAIPAddressToPortAssociation(model_base.BASEV2):
                         nullable=False)
 
 
+class SnatPortOwner(model_base.BASEV2):
+
+    """Owner of an SNAT pool port.
+
+    This table records the host (or VRF) that each SNAT pool port was
+    allocated for. Its primary key ensures that at most one SNAT pool
+    port is allocated per owner on each external network.
+    """
+
+    __tablename__ = 'apic_aim_snat_port_owners'
+
+    network_id = sa.Column(sa.String(36),
+                           sa.ForeignKey('networks.id', ondelete='CASCADE'),
+                           primary_key=True)
+    owner = sa.Column(sa.String(255), primary_key=True)
+    port_id = sa.Column(sa.String(36),
+                        sa.ForeignKey('ports.id', ondelete='CASCADE'),
+                        nullable=False, unique=True)
+
+
 class VMName(model_base.BASEV2):
     __tablename__ = 'apic_aim_vm_names'
 
@@ -125,6 +145,22 @@ class VMNameUpdate(model_base.BASEV2):
     last_full_update_time = sa.Column(sa.DateTime)
 
 
+class StaticResourcesVersion(model_base.BASEV2):
+
+    """Version of the static AIM resources ensured for a system.
+
+    This table records, for each apic_system_id, the version of the
+    static AIM resources (the common tenant, unrouted VRF, any filter
+    and default security group) that were last ensured, so that
+    neutron-server workers starting later need not ensure them again.
+    """
+
+    __tablename__ = 'apic_aim_static_resources_versions'
+
+    system_id = sa.Column(sa.String(255), primary_key=True)
+    version = sa.Column(sa.Integer, nullable=False)
+
+
 class DbMixin(object):
 
     # AddressScopeMapping functions.
@@ -476,6 +512,28 @@ class DbMixin(object):
                 LOG.debug("Ignoring FK error for port %s: %s", port_id, dbe)
         return ports_to_update
 
+    # SnatPortOwner functions.
+
+    def _get_snat_port_owner(self, session, network_id, owner):
+        query = BAKERY(lambda s: s.query(
+            SnatPortOwner))
+        query += lambda q: q.filter_by(
+            network_id=sa.bindparam('network_id'),
+            owner=sa.bindparam('owner'))
+        return query(session).params(
+            network_id=network_id, owner=owner).one_or_none()
+
+    def _add_snat_port_owner(self, session, network_id, owner, port_id):
+        db_obj = SnatPortOwner(
+            network_id=network_id, owner=owner, port_id=port_id)
+        session.add(db_obj)
+        return db_obj
+
+    def _delete_snat_port_owner(self, session, port_id):
+        # REVISIT: Can this query be baked? See
+        # delete_port_id_for_ha_ipaddress.
+        session.query(SnatPortOwner).filter_by(port_id=port_id).delete()
+
     # VMName functions.
 
     def _get_vm_name(self, session, device_id, is_detailed=False):
@@ -530,3 +588,29 @@ class DbMixin(object):
                 last_full_update_time=last_full_update_time)
         session.add(db_obj)
         session.flush()
+
+    # StaticResourcesVersion functions.
+
+    def _get_static_resources_version(self, session, system_id):
+        query = BAKERY(lambda s: s.query(
+            StaticResourcesVersion.version))
+        query += lambda q: q.filter_by(
+            system_id=sa.bindparam('system_id'))
+        version = query(session).params(
+            system_id=system_id).one_or_none()
+        return version[0] if version else None
+
+    def _set_static_resources_version(self, session, system_id, version):
+        query = BAKERY(lambda s: s.query(
+            StaticResourcesVersion))
+        query += lambda q: q.filter_by(
+            system_id=sa.bindparam('system_id'))
+        db_obj = query(session).params(
+            system_id=system_id).one_or_none()
+        if db_obj:
+            db_obj.version = version
+        else:
+            db_obj = StaticResourcesVersion(
+                system_id=system_id, version=version)
+        session.add(db_obj)
+        session.flush()
@@ -19,6 +19,7 @@ This module provides methods for programming AIM policy resources required
 for distributed SNAT functionality in group-based-policy.
 """
 
+import hashlib
 import logging
 
 from aim.api import resource as aim_resource
@@ -35,6 +36,44 @@ UNROUTED_VRF_NAME = aim_cst.UNROUTED_VRF_NAME
 DEFAULT_SNAT_PORT_MAX = aim_cst.DEFAULT_SNAT_PORT_MAX
 
 
+class DistSnatPortRangeBitmap(object):
+    """Bitmap of used port ranges for one SNAT IP and subnet.
+
+    The ports from start_port to end_port are split into slots of
+    alloc_size ports each, and bit N is set when an existing mapping
+    overlaps slot N. Finding a free slot is then a couple of integer
+    operations rather than a scan of every candidate range against
+    every existing mapping.
+    """
+
+    def __init__(self, start_port, end_port, alloc_size):
+        self.start_port = start_port
+        self.alloc_size = alloc_size
+        self.slot_count = max(0, (end_port - start_port + 1) // alloc_size)
+        self._all = (1 << self.slot_count) - 1
+        self._used = 0
+
+    def mark_used(self, start_port, end_port):
+        first = max(0, (start_port - self.start_port) // self.alloc_size)
+        last = min(self.slot_count - 1,
+                   (end_port - self.start_port) // self.alloc_size)
+        if first <= last:
+            self._used |= ((1 << (last - first + 1)) - 1) << first
+
+    def first_free(self, offset=0):
+        """Return the first free slot at or after offset, wrapping."""
+        free = self._all & ~self._used
+        if not free:
+            return None
+        offset %= self.slot_count
+        free = (free >> offset << offset) or free
+        return (free & -free).bit_length() - 1
+
+    def slot_range(self, slot):
+        start_port = self.start_port + slot * self.alloc_size
+        return start_port, start_port + self.alloc_size - 1
+
+
 class DistributedSnatHelper(object):
     """Mixin providing distributed SNAT policy programming methods."""
 
@@ -73,6 +112,15 @@ class DistributedSnatHelper(object):
         # follows explicit requirement-based helpers above.
         return self._sanitize_snat_name(resource_id)[:12]
 
+    def _dist_snat_host_slot_offset(self, host, slot_count):
+        # Hosts start looking for a free port range at a stable,
+        # host-specific slot, so that hosts allocating concurrently
+        # for the same SNAT IP rarely pick the same range.
+        if not slot_count:
+            return 0
+        digest = hashlib.sha256(host.encode('utf-8')).hexdigest()
+        return int(digest[:8], 16) % slot_count
+
     def _get_unrouted_vrf_name(self):
         """Get name for SNAT VRF in common tenant.
 
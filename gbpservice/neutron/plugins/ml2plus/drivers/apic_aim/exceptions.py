@@ -194,3 +194,8 @@ class DirectSnatModeTransitionNotSupported(exceptions.BadRequest):
     message = _("Cannot directly transition subnet %(subnet_id)s between "
                 "host-pool SNAT and distributed SNAT. Disable one mode "
                 "first, then enable the other.")
+
+
+class SnatPortAlreadyAllocated(exceptions.Conflict):
+    message = _("An SNAT pool port is already allocated for %(owner)s on "
+                "external network %(network_id)s.")
@@ -26,12 +26,15 @@ from sqlalchemy.sql.expression import true
 
 from gbpservice.neutron.extensions import cisco_apic
 from gbpservice.neutron.extensions import cisco_apic_l3
+from gbpservice.neutron.plugins.ml2plus.drivers.apic_aim import cache
 
 LOG = log.getLogger(__name__)
 
 BAKERY = baked.bakery(_size_alert=lambda c: LOG.warning(
     "sqlalchemy baked query cache size exceeded in %s", __name__))
 
+HPP_NORMALIZED = 'hpp_normalized'
+
 
 class PortExtensionErspanDb(model_base.BASEV2):
 
@@ -687,6 +690,7 @@ class ExtensionDbMixin(object):
         db_obj['end_port'] = end_port
         db_obj['service_port_id'] = service_port_id
         session.add(db_obj)
+        DIST_SNAT_SERVICE_NODES.invalidate(session, snat_ip, subnet_id)
         return db_obj
 
     def delete_dist_snat_mappings(self, session, snat_ip=None, host_name=None,
@@ -711,6 +715,7 @@ class ExtensionDbMixin(object):
             has_filter = True
         if not has_filter:
             return 0
+        DIST_SNAT_SERVICE_NODES.invalidate(session, snat_ip, subnet_id)
         return query.delete(synchronize_session=False)
 
     def get_router_extn_db(self, session, router_id):
@@ -817,10 +822,7 @@ class ExtensionDbMixin(object):
                 router_id=router_id, provides=False)
 
     def get_hpp_normalized(self, session):
-        with session.begin_nested():
-            query = BAKERY(lambda s: s.query(HPPDb))
-            db_obj = query(session).first()
-            return db_obj['hpp_normalized']
+        return SETTINGS.get(session, HPP_NORMALIZED)
 
     def set_hpp_normalized(self, session, hpp_normalized):
         with session.begin_nested():
@@ -828,3 +830,21 @@ class ExtensionDbMixin(object):
             db_obj = query(session).first()
             db_obj['hpp_normalized'] = hpp_normalized
             session.add(db_obj)
+        SETTINGS.invalidate(session, HPP_NORMALIZED)
+
+
+def _load_hpp_normalized(session):
+    with session.begin_nested():
+        query = BAKERY(lambda s: s.query(HPPDb))
+        db_obj = query(session).first()
+        return db_obj['hpp_normalized']
+
+
+# Normalization of host protection policies is one-way, so once the
+# flag has been seen set it does not need to be read again.
+SETTINGS = cache.GlobalSettingsCache()
+SETTINGS.register(HPP_NORMALIZED, _load_hpp_normalized, final_value=True)
+
+# The service nodes sharing a distributed SNAT IP are looked up for
+# every endpoint on each of those hosts.
+DIST_SNAT_SERVICE_NODES = cache.DistSnatServiceNodeCache()
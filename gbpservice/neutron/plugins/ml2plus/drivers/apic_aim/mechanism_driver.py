@@ -19,6 +19,7 @@ import copy
 from datetime import datetime
 import os
 import re
+import time
 
 from aim.aim_lib.db import model as aim_lib_model
 from aim.aim_lib import nat_strategy
@@ -122,6 +123,9 @@ L3OUT_IF_PROFILE_NAME = 'IfProfile'
 L3OUT_IF_PROFILE_NAME6 = 'IfProfile6'
 L3OUT_EXT_EPG = 'ExtEpg'
 SYNC_STATE_TMP = 'synchronization_state_tmp'
+# Bump whenever _ensure_static_resources() changes what it creates, so
+# that it is run again when the upgraded neutron-server starts.
+STATIC_RESOURCES_VERSION = 1
 AIM_RESOURCES_CNT = 'aim_resources_cnt'
 
 SUPPORTED_HPB_SEGMENT_TYPES = (ofcst.TYPE_OPFLEX, n_constants.TYPE_VLAN)
@@ -130,6 +134,8 @@ SUPPORTED_VNIC_TYPES = [portbindings.VNIC_NORMAL,
                         portbindings.VNIC_DIRECT]
 
 AGENT_TYPE_DVS = 'DVS agent'
+BINDING_AGENT_TYPES = [AGENT_TYPE_DVS, ofcst.AGENT_TYPE_OPFLEX_OVS,
+                       ofcst.AGENT_TYPE_OPFLEX_VPP]
 VIF_TYPE_DVS = 'dvs'
 VIF_TYPE_FABRIC = 'fabric'
 FABRIC_HOST_ID = 'fabric'
@@ -242,7 +248,10 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
         LOG.info("APIC AIM MD initializing")
         self.project_details_cache = cache.ProjectDetailsCache()
         self.name_mapper = apic_mapper.APICNameMapper()
-        self.aim = aim_manager.AimManager()
+        self.aim = cache.CachingAimManager()
+        self._topology_cache = cache.HostTopologyCache(self.aim)
+        self._host_agents_cache = {}
+        self._binding_latency = gbp_utils.LatencyHistogram()
         self._core_plugin = None
         self._l3_plugin = None
         self._trunk_plugin = None
@@ -465,6 +474,21 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
     @db_api.retry_db_errors
     def _ensure_static_resources(self):
         ctx = n_context.get_admin_context()
+        # Once one worker has ensured the current version of the static
+        # resources, the others need not create or overwrite them
+        # again, as long as the default SG and the unrouted VRF are
+        # still in AIM. Should those have been removed by other means,
+        # the static resources are all ensured again.
+        with db_api.CONTEXT_READER.using(ctx) as session:
+            version = self._get_static_resources_version(
+                session, self.apic_system_id)
+            if (version is not None and
+                    version >= STATIC_RESOURCES_VERSION and
+                    self._static_resources_exist(
+                        aim_context.AimContext(session))):
+                LOG.debug("Static resources version %s already ensured",
+                          version)
+                return
         with db_api.CONTEXT_WRITER.using(ctx):
             aim_ctx = aim_context.AimContext(ctx.session)
             self._ensure_common_tenant(aim_ctx)
@@ -482,6 +506,18 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
                 infra_aim = aim_resource.Infra()
                 self.aim.create(aim_ctx, infra_aim)
 
+            # Workers starting concurrently may both get here, in which
+            # case one fails on the primary key and retries, finding
+            # the version set.
+            self._set_static_resources_version(
+                ctx.session, self.apic_system_id, STATIC_RESOURCES_VERSION)
+
+    def _static_resources_exist(self, aim_ctx):
+        sg = aim_resource.SecurityGroup(
+            tenant_name=COMMON_TENANT_NAME, name=self._default_sg_name)
+        return bool(self.aim.get(aim_ctx, sg) and
+                    self.aim.get(aim_ctx, self._map_unrouted_vrf()))
+
     def _setup_default_arp_dhcp_security_group_rules(self, aim_ctx):
         sg_name = self._default_sg_name
         dname = aim_utils.sanitize_display_name('DefaultSecurityGroup')
@@ -2875,6 +2911,22 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
                     id1=id1, cidr1=cidr1, id2=id2, cidr2=cidr2, vrf=vrf)
 
     def bind_port(self, context):
+        start = time.time()
+        try:
+            self._bind_port(context)
+        finally:
+            elapsed = time.time() - start
+            self._binding_latency.observe(elapsed)
+            LOG.debug("Binding port %(port)s on host %(host)s took "
+                      "%(elapsed).3f seconds",
+                      {'port': context.current['id'], 'host': context.host,
+                       'elapsed': elapsed})
+
+    def get_binding_latency_histogram(self):
+        """Return the bind_port latencies seen by this process."""
+        return self._binding_latency.snapshot()
+
+    def _bind_port(self, context):
         port = context.current
         LOG.debug("Attempting to bind port %(port)s on network %(net)s",
                   {'port': port['id'],
@@ -2903,22 +2955,21 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
             return
 
         if vnic_type in [portbindings.VNIC_NORMAL]:
-            if is_vm_port:
-                # For compute ports, try to bind DVS agent first.
-                if self._agent_bind_port(context, AGENT_TYPE_DVS,
-                                         self._dvs_bind_port):
+            # For compute ports, try to bind DVS agent first, then
+            # OpFlex agent, then OpFlex VPP agent, only considering the
+            # agent types actually present on the host.
+            host_agents = self._get_host_agents(context)
+            for agent_type, bind_strategy in [
+                    (AGENT_TYPE_DVS, self._dvs_bind_port),
+                    (ofcst.AGENT_TYPE_OPFLEX_OVS, self._opflex_bind_port),
+                    (ofcst.AGENT_TYPE_OPFLEX_VPP, self._opflex_bind_port)]:
+                if agent_type == AGENT_TYPE_DVS and not is_vm_port:
+                    continue
+                agents = host_agents.get(agent_type)
+                if agents and self._agent_bind_port(
+                        context, agents, bind_strategy):
                     return
 
-            # Try to bind OpFlex agent.
-            if self._agent_bind_port(context, ofcst.AGENT_TYPE_OPFLEX_OVS,
-                                     self._opflex_bind_port):
-                return
-
-            # Try to bind OpFlex VPP agent.
-            if self._agent_bind_port(context, ofcst.AGENT_TYPE_OPFLEX_VPP,
-                                     self._opflex_bind_port):
-                return
-
         if self._is_baremetal_vnic_type(context.current):
             self._bind_baremetal_vnic(context)
             return
@@ -3147,8 +3198,7 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
     def _get_acc_bundle_for_host(self, aim_ctx, host_name):
         if not host_name:
             return None
-        host_links = self.aim.find(aim_ctx, aim_infra.HostLink,
-            host_name=host_name)
+        host_links = self._topology_cache.get_host_links(aim_ctx, host_name)
         # Extract the interface policy group names from the DNs.
         grpNames = []
         for host_link in host_links:
@@ -3302,6 +3352,8 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
             self._really_update_sg_rule_with_remote_group_set(
                 context, port, port['security_groups'], is_delete=False)
         self._insert_provisioning_block(context)
+        if port['device_owner'] == aim_cst.DEVICE_OWNER_SNAT_PORT:
+            self._check_snat_port_owner(session, port)
 
         # Handle router gateway port creation.
         if self._is_port_router_gateway(port):
@@ -3385,8 +3437,8 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
         # port. Then update with new subnet.
         session = ctx.session
         aim_ctx = aim_context.AimContext(db_session=session)
-        host_links = self.aim.find(aim_ctx, aim_infra.HostLink,
-            host_name=original_port['binding:host_id'])
+        host_links = self._topology_cache.get_host_links(
+            aim_ctx, original_port['binding:host_id'])
         allnodes = set()
         for host_link in host_links:
             _, _, nodes, _, _, _ = self._get_topology_from_path(host_link.path)
@@ -3496,6 +3548,9 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
         self._check_active_active_aap(context, port)
         if port.get(cisco_apic.ERSPAN_CONFIG):
             self._check_valid_erspan_config(port)
+        if (port['device_owner'] != orig['device_owner'] or
+                port['device_id'] != orig['device_id']):
+            self._update_snat_port_owner(session, orig, port)
         if context.original_host and context.original_host != context.host:
             self.disassociate_domain(context, use_original=True)
             if self._use_static_path(context.original_bottom_bound_segment):
@@ -3800,6 +3855,11 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
         other_host_physdoms = self._get_physdoms_by_hosts(
             aim_ctx, other_hosts)
 
+        # The host no longer serves distributed SNAT, so don't keep
+        # handing it out as a service node from the cache.
+        extension_db.DIST_SNAT_SERVICE_NODES.invalidate_host(
+            session, host)
+
         # Step 6: per physdom decide whether to remove just the ConcreteDevice
         # or the entire DeviceCluster.
         for physdom in physdoms:
@@ -3872,13 +3932,13 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
 
     def _get_physdoms_for_host(self, aim_ctx, host):
         """Return physdom names for a host using HostDomainMappingV2."""
-        mappings = self.aim.find(
-            aim_ctx, aim_infra.HostDomainMappingV2,
-            host_name=host, domain_type='PhysDom')
-        if not mappings:
-            mappings = self.aim.find(
-                aim_ctx, aim_infra.HostDomainMappingV2,
-                host_name=DEFAULT_HOST_DOMAIN, domain_type='PhysDom')
+        for mapping_host in (host, DEFAULT_HOST_DOMAIN):
+            mappings = [
+                m for m in self._topology_cache.get_host_domain_mappings(
+                    aim_ctx, mapping_host)
+                if m.domain_type == 'PhysDom']
+            if mappings:
+                break
         return {
             m.domain_name for m in mappings
             if getattr(m, 'domain_name', None)
@@ -4036,46 +4096,61 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
     @registry.receives(resources.ADDRESS_GROUP, [events.AFTER_UPDATE])
     def update_addresses_in_address_group(self, resource, event,
                                           trigger, payload):
+        previous_addresses = set(payload.states[0]['addresses'])
+        updated_addresses = payload.states[1]['addresses']
+        removed = previous_addresses - set(updated_addresses)
+        added = [address for address in updated_addresses
+                 if address not in previous_addresses]
+        if not removed and not added:
+            return
+
         context = payload.context
         with db_api.CONTEXT_WRITER.using(context):
-            aim_ctx = aim_context.AimContext(context.session)
-
-            previous_state = payload.states[0]
-            updated_state = payload.states[1]
-
-            if (previous_state['addresses'] != updated_state['addresses']):
-                ag_id = payload.states[0]['id']
+            session = context.session
+            aim_ctx = aim_context.AimContext(session)
 
-                query = BAKERY(lambda s: s.query(
-                    sg_models.SecurityGroupRule))
-                query += lambda q: q.join(ag_db.AddressGroup).filter(
-                    sg_models.SecurityGroupRule.remote_address_group_id ==
-                    ag_db.AddressGroup.id)
-                sg_rules = query(context.session).params(
-                    sg_rule=ag_id).all()
-
-                if sg_rules:
-                    sg_rule = sg_rules[0]
-                else:
-                    return
+            query = BAKERY(lambda s: s.query(
+                sg_models.SecurityGroupRule.id,
+                sg_models.SecurityGroupRule.security_group_id,
+                sg_models.SecurityGroupRule.ethertype))
+            query += lambda q: q.filter(
+                sg_models.SecurityGroupRule.remote_address_group_id ==
+                sa.bindparam('ag_id'))
+            sg_rules = query(session).params(
+                ag_id=payload.states[0]['id']).all()
+            if not sg_rules:
+                return
 
+            tenant_anames = {
+                sg_id: self.name_mapper.project(session, tenant_id)
+                for sg_id, tenant_id in self._get_sg_tenant_ids(
+                    session, {sg_rule.security_group_id
+                              for sg_rule in sg_rules}).items()}
+            added_by_version = defaultdict(list)
+            for address in added:
+                added_by_version[netaddr.IPNetwork(address).version].append(
+                    address)
+
+            for sg_rule_id, sg_id, ethertype in sg_rules:
                 sg_rule_aim = aim_resource.SecurityGroupRule(
-                        tenant_name="prj_" + payload.states[0]['tenant_id'],
-                        security_group_name=sg_rule['security_group_id'],
-                        security_group_subject_name='default',
-                        name=sg_rule['id'])
+                    tenant_name=tenant_anames[sg_id],
+                    security_group_name=sg_id,
+                    security_group_subject_name='default',
+                    name=sg_rule_id)
                 aim_sg_rule = self.aim.get(aim_ctx, sg_rule_aim)
-
-                for address in payload.states[0]['addresses']:
-                    if address not in payload.states[1]['addresses']:
-                        aim_sg_rule.remote_ips.remove(address)
-
-                for address in payload.states[1]['addresses']:
-                    if address not in payload.states[0]['addresses']:
-                        aim_sg_rule.remote_ips.append(address)
-
-                self.aim.update(aim_ctx, sg_rule_aim,
-                                remote_ips=aim_sg_rule.remote_ips)
+                if not aim_sg_rule:
+                    continue
+                # Rules only hold the addresses of their own IP version.
+                ip_version = 6 if ethertype == 'IPv6' else 4
+                remote_ips = [ip for ip in aim_sg_rule.remote_ips
+                              if ip not in removed]
+                current = set(remote_ips)
+                remote_ips.extend(
+                    address for address in added_by_version[ip_version]
+                    if address not in current)
+                if remote_ips != aim_sg_rule.remote_ips:
+                    self.aim.update(aim_ctx, sg_rule_aim,
+                                    remote_ips=remote_ips)
 
     def _get_sg_tenant_id(self, session, sg_id):
         query = BAKERY(lambda s: s.query(
@@ -4087,119 +4162,159 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
 
         return tenant_id
 
-    def create_security_group_rule_precommit(self, context):
-        session = context._plugin_context.session
-        aim_ctx = aim_context.AimContext(session)
-        sg_rule = context.current
-        tenant_id = self._get_sg_rule_tenant_id(session, sg_rule)
-        tenant_aname = self.name_mapper.project(session, tenant_id)
-        if sg_rule.get('remote_group_id'):
-            remote_ips = []
-            remote_group_id = sg_rule['remote_group_id']
-            dn = ''
+    def _get_sg_tenant_ids(self, session, sg_ids):
+        query = BAKERY(lambda s: s.query(
+            sg_models.SecurityGroup.id,
+            sg_models.SecurityGroup.tenant_id))
+        query += lambda q: q.filter(
+            sg_models.SecurityGroup.id.in_(
+                sa.bindparam('sg_ids', expanding=True)))
+        return dict(query(session).params(sg_ids=list(sg_ids)))
 
-            query = BAKERY(lambda s: s.query(
-                models_v2.Port))
-            query += lambda q: q.join(
-                sg_models.SecurityGroupPortBinding,
-                sg_models.SecurityGroupPortBinding.port_id ==
-                models_v2.Port.id)
-            query += lambda q: q.filter(
+    def _get_sg_member_ips(self, session, sg_ids):
+        # Query the fixed IPs directly rather than loading the member
+        # ports along with all their relationships.
+        query = BAKERY(lambda s: s.query(
+            sg_models.SecurityGroupPortBinding.security_group_id,
+            models_v2.IPAllocation.ip_address))
+        query += lambda q: q.join(
+            models_v2.IPAllocation,
+            models_v2.IPAllocation.port_id ==
+            sg_models.SecurityGroupPortBinding.port_id)
+        query += lambda q: q.filter(
+            sg_models.SecurityGroupPortBinding.security_group_id.in_(
+                sa.bindparam('sg_ids', expanding=True)))
+        member_ips = defaultdict(list)
+        for sg_id, ip_address in query(session).params(
+                sg_ids=list(sg_ids)):
+            member_ips[sg_id].append(ip_address)
+        return member_ips
+
+    def _get_sgs_with_member_ips(self, session, sg_ids):
+        # Only the existence of a member port with a fixed IP matters
+        # here, so let the DB stop at the first one for each SG.
+        query = BAKERY(lambda s: s.query(
+            sg_models.SecurityGroup.id))
+        query += lambda q: q.filter(
+            sg_models.SecurityGroup.id.in_(
+                sa.bindparam('sg_ids', expanding=True)),
+            sa.exists().where(sa.and_(
                 sg_models.SecurityGroupPortBinding.security_group_id ==
-                sa.bindparam('sg_id'))
-            sg_ports = query(session).params(
-                sg_id=sg_rule['remote_group_id']).all()
+                sg_models.SecurityGroup.id,
+                models_v2.IPAllocation.port_id ==
+                sg_models.SecurityGroupPortBinding.port_id)))
+        return {row[0] for row in query(session).params(
+            sg_ids=list(sg_ids))}
 
-            if self.get_hpp_normalized(session):
-                has_fixed_ips = False
-                for sg_port in sg_ports:
-                    if sg_port['fixed_ips']:
-                        has_fixed_ips = True
-                        break
-                if has_fixed_ips:
-                    # Get the remote group container's dn
-                    rg_tenant_id = self._get_sg_tenant_id(session,
-                        sg_rule['remote_group_id'])
-                    rg_tenant_aname = self.name_mapper.project(session,
-                        rg_tenant_id)
-                    rg_cont = aim_resource.SecurityGroupRemoteIpContainer(
-                        tenant_name=rg_tenant_aname,
-                        security_group_name=sg_rule['remote_group_id'],
-                        name=sg_rule['remote_group_id'])
-                    dn = rg_cont.dn
-            else:
-                ip_version = 0
-                if sg_rule['ethertype'] == 'IPv4':
-                    ip_version = 4
-                elif sg_rule['ethertype'] == 'IPv6':
-                    ip_version = 6
-
-                for sg_port in sg_ports:
-                    for fixed_ip in sg_port['fixed_ips']:
-                        if ip_version == netaddr.IPAddress(
-                            fixed_ip['ip_address']).version:
-                            remote_ips.append(fixed_ip['ip_address'])
-        elif sg_rule.get('remote_address_group_id'):
-            remote_ips = []
+    def _get_address_group_addresses(self, session, ag_ids):
+        query = BAKERY(lambda s: s.query(
+            ag_db.AddressAssociation.address_group_id,
+            ag_db.AddressAssociation.address))
+        query += lambda q: q.filter(
+            ag_db.AddressAssociation.address_group_id.in_(
+                sa.bindparam('ag_ids', expanding=True)))
+        addresses = defaultdict(list)
+        for ag_id, address in query(session).params(ag_ids=list(ag_ids)):
+            addresses[ag_id].append(address)
+        return addresses
 
-            query = BAKERY(lambda s: s.query(
-                    ag_db.AddressAssociation))
-            query += lambda q: q.join(
-                sg_models.SecurityGroupRule,
-                ag_db.AddressAssociation.address_group_id ==
-                sg_models.SecurityGroupRule.remote_address_group_id)
-            query += lambda q: q.filter(
-                sg_models.SecurityGroupRule.remote_address_group_id ==
-                sa.bindparam('ag_id'))
-            address_group_list = query(session).params(
-                ag_id=sg_rule['remote_address_group_id']).all()
+    def create_security_group_rule_precommit(self, context):
+        self.create_security_group_rule_bulk_precommit([context])
+
+    def create_security_group_rule_bulk_precommit(self, contexts):
+        session = contexts[0]._plugin_context.session
+        aim_ctx = aim_context.AimContext(session)
+        sg_rules = [context.current for context in contexts]
+
+        # Resolve everything the rules depend on once for the whole
+        # batch rather than once per rule.
+        sg_ids = {sg_rule['security_group_id'] for sg_rule in sg_rules}
+        remote_sg_ids = {sg_rule['remote_group_id'] for sg_rule in sg_rules
+                         if sg_rule.get('remote_group_id')}
+        ag_ids = {sg_rule['remote_address_group_id'] for sg_rule in sg_rules
+                  if not sg_rule.get('remote_group_id') and
+                  sg_rule.get('remote_address_group_id')}
+        # There is a bug in Neutron that sometimes the tenant_id contained
+        # within the sg_rule is pointing to the wrong tenant. So here we
+        # have to query DB to get the tenant_id of the SG then use that
+        # instead.
+        tenant_anames = {
+            sg_id: self.name_mapper.project(session, tenant_id)
+            for sg_id, tenant_id in self._get_sg_tenant_ids(
+                session, sg_ids | remote_sg_ids).items()}
+        hpp_normalized = False
+        if remote_sg_ids:
+            hpp_normalized = self.get_hpp_normalized(session)
+            if hpp_normalized:
+                sgs_with_ips = self._get_sgs_with_member_ips(
+                    session, remote_sg_ids)
+            else:
+                member_ips = self._get_sg_member_ips(session, remote_sg_ids)
+        if ag_ids:
+            ag_addresses = self._get_address_group_addresses(session, ag_ids)
 
+        for sg_rule in sg_rules:
             ip_version = 0
             if sg_rule['ethertype'] == 'IPv4':
                 ip_version = 4
             elif sg_rule['ethertype'] == 'IPv6':
                 ip_version = 6
-
-            for address_group in address_group_list:
-                if ip_version == netaddr.IPAddress(
-                    address_group['address'].split('/')[0]).version:
-                    remote_ips.append(address_group['address'])
-
-            remote_group_id = ''
-            dn = ''
-
-        else:
-            remote_ips = ([sg_rule['remote_ip_prefix']]
-                          if sg_rule['remote_ip_prefix'] else '')
             remote_group_id = ''
             dn = ''
+            if sg_rule.get('remote_group_id'):
+                remote_ips = []
+                remote_group_id = sg_rule['remote_group_id']
+                if hpp_normalized:
+                    if remote_group_id in sgs_with_ips:
+                        # Get the remote group container's dn
+                        rg_cont = aim_resource.SecurityGroupRemoteIpContainer(
+                            tenant_name=tenant_anames[remote_group_id],
+                            security_group_name=remote_group_id,
+                            name=remote_group_id)
+                        dn = rg_cont.dn
+                else:
+                    remote_ips = [
+                        ip_address
+                        for ip_address in member_ips[remote_group_id]
+                        if ip_version == netaddr.IPAddress(
+                            ip_address).version]
+            elif sg_rule.get('remote_address_group_id'):
+                remote_ips = [
+                    address for address in ag_addresses[
+                        sg_rule['remote_address_group_id']]
+                    if ip_version == netaddr.IPAddress(
+                        address.split('/')[0]).version]
+            else:
+                remote_ips = ([sg_rule['remote_ip_prefix']]
+                              if sg_rule['remote_ip_prefix'] else '')
 
-        sg_rule_aim = aim_resource.SecurityGroupRule(
-            tenant_name=tenant_aname,
-            security_group_name=sg_rule['security_group_id'],
-            security_group_subject_name='default',
-            name=sg_rule['id'],
-            direction=sg_rule['direction'],
-            ethertype=sg_rule['ethertype'].lower(),
-            ip_protocol=self.get_aim_protocol(sg_rule['protocol']),
-            remote_ips=remote_ips,
-            icmp_code=(sg_rule['port_range_max']
-                       if (sg_rule['port_range_max'] and
-                          (sg_rule['protocol'].lower() == 'icmp' or
-                           sg_rule['protocol'] == '1'))
-                       else 'unspecified'),
-            icmp_type=(sg_rule['port_range_min']
-                       if (sg_rule['port_range_min'] and
-                          (sg_rule['protocol'].lower() == 'icmp' or
-                           sg_rule['protocol'] == '1'))
-                       else 'unspecified'),
-            from_port=(sg_rule['port_range_min']
-                       if sg_rule['port_range_min'] else 'unspecified'),
-            to_port=(sg_rule['port_range_max']
-                     if sg_rule['port_range_max'] else 'unspecified'),
-            tDn=dn,
-            remote_group_id=remote_group_id)
-        self.aim.create(aim_ctx, sg_rule_aim)
+            # REVISIT: Use a bulk create once AIM provides one.
+            sg_rule_aim = aim_resource.SecurityGroupRule(
+                tenant_name=tenant_anames[sg_rule['security_group_id']],
+                security_group_name=sg_rule['security_group_id'],
+                security_group_subject_name='default',
+                name=sg_rule['id'],
+                direction=sg_rule['direction'],
+                ethertype=sg_rule['ethertype'].lower(),
+                ip_protocol=self.get_aim_protocol(sg_rule['protocol']),
+                remote_ips=remote_ips,
+                icmp_code=(sg_rule['port_range_max']
+                           if (sg_rule['port_range_max'] and
+                              (sg_rule['protocol'].lower() == 'icmp' or
+                               sg_rule['protocol'] == '1'))
+                           else 'unspecified'),
+                icmp_type=(sg_rule['port_range_min']
+                           if (sg_rule['port_range_min'] and
+                              (sg_rule['protocol'].lower() == 'icmp' or
+                               sg_rule['protocol'] == '1'))
+                           else 'unspecified'),
+                from_port=(sg_rule['port_range_min']
+                           if sg_rule['port_range_min'] else 'unspecified'),
+                to_port=(sg_rule['port_range_max']
+                         if sg_rule['port_range_max'] else 'unspecified'),
+                tDn=dn,
+                remote_group_id=remote_group_id)
+            self.aim.create(aim_ctx, sg_rule_aim)
 
     def delete_security_group_rule_precommit(self, context):
         session = context._plugin_context.session
@@ -4263,6 +4378,7 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
                                            interface_name=interface,
                                            **attrs)
                 self.aim.create(aim_ctx, hlink, overwrite=True)
+        self._topology_cache.invalidate_host(host)
         self._update_network_links(context, host)
 
     # Topology RPC method handler
@@ -4280,6 +4396,7 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
                 return
 
             self.aim.delete(aim_ctx, hlink)
+        self._topology_cache.invalidate_host(host)
         self._update_network_links(context, host)
 
     def _update_network_links(self, context, host):
@@ -4293,7 +4410,7 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
         # two different ifaces assigned to them.
         with db_api.CONTEXT_WRITER.using(context) as session:
             aim_ctx = aim_context.AimContext(db_session=session)
-            hlinks = self.aim.find(aim_ctx, aim_infra.HostLink, host_name=host)
+            hlinks = self._topology_cache.get_host_links(aim_ctx, host)
             nets_segs = self._get_non_opflex_segments_on_host(context, host)
             registry.publish(aim_cst.GBP_NETWORK_LINK, events.PRECOMMIT_UPDATE,
                              self,
@@ -4306,9 +4423,44 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
             self._rebuild_host_path_for_network(
                 context, network, segment, host, hlinks)
 
-    def _agent_bind_port(self, context, agent_type, bind_strategy):
+    def _get_host_agents(self, context):
+        """Return the host's agents that can bind ports, by type.
+
+        All the types are looked up with one query. Results with agents
+        are cached for agent_cache_ttl seconds, and the host's entry is
+        dropped whenever this process handles a state report from, or
+        the deletion of, one of the host's agents.
+        """
+        host = context.host
+        entry = self._host_agents_cache.get(host)
+        if entry and (time.time() - entry[1] <
+                      cfg.CONF.ml2_apic_aim.agent_cache_ttl):
+            return entry[0]
+        host_agents = defaultdict(list)
+        for agent in self.plugin.get_agents(
+                context._plugin_context,
+                filters={'agent_type': BINDING_AGENT_TYPES,
+                         'host': [host]}):
+            host_agents[agent['agent_type']].append(agent)
+        # A host without agents is not cached, so that an agent that
+        # just started is used as soon as it has reported its state.
+        if host_agents and cfg.CONF.ml2_apic_aim.agent_cache_ttl > 0:
+            self._host_agents_cache[host] = (host_agents, time.time())
+        return host_agents
+
+    @registry.receives(resources.AGENT,
+                       [events.AFTER_CREATE, events.AFTER_UPDATE,
+                        events.AFTER_DELETE])
+    def _handle_agent_change(self, resource, event, trigger, payload):
+        if event == events.AFTER_DELETE:
+            host = payload.states[0].host
+        else:
+            host = payload.metadata.get('host')
+        self._host_agents_cache.pop(host, None)
+
+    def _agent_bind_port(self, context, agents, bind_strategy):
         current = context.current
-        for agent in context.host_agents(agent_type) or []:
+        for agent in agents:
             LOG.debug("Checking agent: %s", agent)
             if agent['alive']:
                 for segment in context.segments_to_bind:
@@ -5806,6 +5958,47 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
                 'alloc_size': row[8],
                 'service_vrf': row[9]}
 
+    def _query_dist_snat_subnet_ids(self, session, ext_network_id,
+                                    routed_subnet_ids):
+        # Returns those of the routed subnets whose router's gateway on
+        # the external network is served by distributed SNAT, with the
+        # same criteria as _query_dist_snat_gateway_info.
+        gw_alloc = orm.aliased(models_v2.IPAllocation)
+        intf_alloc = orm.aliased(models_v2.IPAllocation)
+        extn_db_sn = extension_db.SubnetExtensionDb
+
+        query = BAKERY(lambda s: s.query(
+            intf_alloc.subnet_id))
+        query += lambda q: q.join(
+            l3_db.RouterPort,
+            l3_db.RouterPort.port_id == intf_alloc.port_id)
+        query += lambda q: q.join(
+            l3_db.Router,
+            l3_db.Router.id == l3_db.RouterPort.router_id)
+        query += lambda q: q.join(
+            models_v2.Port,
+            models_v2.Port.id == l3_db.Router.gw_port_id)
+        query += lambda q: q.join(
+            gw_alloc,
+            gw_alloc.port_id == models_v2.Port.id)
+        query += lambda q: q.join(
+            extn_db_sn,
+            extn_db_sn.subnet_id == gw_alloc.subnet_id)
+        query += lambda q: q.filter(
+            intf_alloc.subnet_id.in_(
+                sa.bindparam('subnet_ids', expanding=True)),
+            l3_db.RouterPort.port_type ==
+            n_constants.DEVICE_OWNER_ROUTER_INTF,
+            models_v2.Port.network_id == sa.bindparam('ext_network_id'),
+            models_v2.Port.device_owner ==
+            n_constants.DEVICE_OWNER_ROUTER_GW,
+            extn_db_sn.service_network_id.isnot(None),
+            extn_db_sn.service_network_id != '')
+        query += lambda q: q.distinct()
+        return set(subnet_id for subnet_id, in query(session).params(
+            ext_network_id=ext_network_id,
+            subnet_ids=list(routed_subnet_ids)))
+
     def _get_or_create_dist_snat_service_port(self, plugin_context, host,
                                               service_network_id,
                                               project_id):
@@ -5909,33 +6102,39 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
             if existing:
                 return sorted(existing, key=lambda x: x.start_port)[0]
 
-            used = self.get_dist_snat_mappings(
-                session, snat_ip=gw_info['snat_ip'],
-                subnet_id=gw_info['snat_subnet_id'])
-            start_port = gw_info['start_port']
-            end_port = gw_info['end_port']
-            alloc_size = gw_info['alloc_size']
-            candidate = start_port
-            while candidate + alloc_size - 1 <= end_port:
-                candidate_end = candidate + alloc_size - 1
-                overlap = False
-                for mapping in used:
-                    if (candidate <= mapping.end_port and
-                            candidate_end >= mapping.start_port):
-                        overlap = True
-                        break
-                if not overlap:
-                    mapping = self.set_dist_snat_mapping(
-                        session, gw_info['snat_ip'], host, candidate,
-                        candidate_end,
-                        subnet_id=gw_info['snat_subnet_id'],
-                        service_port_id=service_port_id)
-                    session.flush()
-                    return mapping
-                candidate += alloc_size
+            bitmap = distributed_snat_helper.DistSnatPortRangeBitmap(
+                gw_info['start_port'], gw_info['end_port'],
+                gw_info['alloc_size'])
+            mapping_db = extension_db.DistSnatMappingDb
+            used = session.query(
+                mapping_db.start_port, mapping_db.end_port).filter(
+                    mapping_db.snat_ip == gw_info['snat_ip'],
+                    mapping_db.subnet_id == gw_info['snat_subnet_id'])
+            for start_port, end_port in used:
+                bitmap.mark_used(start_port, end_port)
+            slot = bitmap.first_free(self._dist_snat_host_slot_offset(
+                host, bitmap.slot_count))
+            if slot is None:
+                return
+            start_port, end_port = bitmap.slot_range(slot)
+            mapping = self.set_dist_snat_mapping(
+                session, gw_info['snat_ip'], host, start_port, end_port,
+                subnet_id=gw_info['snat_subnet_id'],
+                service_port_id=service_port_id)
+            session.flush()
+            return mapping
 
     def _query_dist_snat_service_nodes(self, plugin_context, snat_ip,
                                        snat_subnet_id, local_host):
+        service_nodes = extension_db.DIST_SNAT_SERVICE_NODES.get(
+            snat_ip, snat_subnet_id,
+            lambda: self._load_dist_snat_service_nodes(
+                plugin_context, snat_ip, snat_subnet_id))
+        return [node for node in service_nodes
+                if node['host'] != local_host]
+
+    def _load_dist_snat_service_nodes(self, plugin_context, snat_ip,
+                                      snat_subnet_id):
         with db_api.CONTEXT_READER.using(plugin_context) as session:
             mapping_db = extension_db.DistSnatMappingDb
             query = session.query(
@@ -5953,7 +6152,6 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
             query = query.filter(
                 mapping_db.snat_ip == snat_ip,
                 mapping_db.subnet_id == snat_subnet_id,
-                mapping_db.host_name != local_host,
                 mapping_db.service_port_id.isnot(None))
             query = query.order_by(mapping_db.start_port)
 
@@ -5989,46 +6187,15 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
         """
         with db_api.CONTEXT_READER.using(plugin_context) as session:
             # Query for existing SNAT port.
-            query = BAKERY(lambda s: s.query(
-                models_v2.IPAllocation.ip_address,
-                models_v2.Port.mac_address,
-                models_v2.Subnet.gateway_ip,
-                models_v2.Subnet.cidr))
-            query += lambda q: q.join(
-                models_v2.Subnet,
-                models_v2.Subnet.id == models_v2.IPAllocation.subnet_id)
-            query += lambda q: q.join(
-                models_v2.Port,
-                models_v2.Port.id == models_v2.IPAllocation.port_id)
-            query += lambda q: q.filter(
-                models_v2.Port.network_id == sa.bindparam('network_id'),
-                models_v2.Port.device_id == sa.bindparam('device_id'),
-                models_v2.Port.device_owner == aim_cst.DEVICE_OWNER_SNAT_PORT)
-            result = query(session).params(
-                network_id=ext_network['id'],
-                device_id=host_or_vrf).first()
-            if result:
-                return {'host_snat_ip': result[0],
-                        'host_snat_mac': result[1],
-                        'gateway_ip': result[2],
-                        'prefixlen': int(result[3].split('/')[1])}
+            allocs = self._get_snat_ip_allocations(
+                session, ext_network['id'], [host_or_vrf])
+            if host_or_vrf in allocs:
+                return allocs[host_or_vrf]
 
             # None found, so query for subnets on which to allocate
             # SNAT port.
-            extn_db_sn = extension_db.SubnetExtensionDb
-
-            query = BAKERY(lambda s: s.query(
-                models_v2.Subnet))
-            query += lambda q: q.join(
-                extn_db_sn,
-                extn_db_sn.subnet_id == models_v2.Subnet.id)
-            query += lambda q: q.filter(
-                models_v2.Subnet.network_id == sa.bindparam('network_id'))
-            query += lambda q: q.filter(
-                extn_db_sn.snat_host_pool.is_(True))
-            snat_subnets = query(session).params(
-                network_id=ext_network['id']).all()
-
+            snat_subnets = self._get_snat_pool_subnets(
+                session, ext_network['id'])
             if not snat_subnets:
                 LOG.info('No subnet in external network %s is marked as '
                          'SNAT-pool',
@@ -6038,50 +6205,291 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
         # Outside the transaction, try allocating SNAT port from
         # available subnets.
         #
-        # REVISIT: Although unlikely, creating the SNAT port outside
-        # this transaction means multiple SNAT ports could be created
-        # by different threads for the same host on the same external
-        # network. Furthermore, once created, any of these ports could
-        # be found and used by other threads, so checking after the
-        # port is created is not sufficient. To eliminate this race
-        # condition, consider having create_port_precommit validate
-        # that no other equivalent SNAT port already exists. If that
-        # validation resulted in an exception from create_port, a loop
-        # encompassing this entire method would retry the initial
-        # query, which should then find the existing equivalent SNAT
-        # port.
+        # Creating the SNAT port outside this transaction means
+        # another thread could create an SNAT port for the same host
+        # on the same external network at the same time. The
+        # apic_aim_snat_port_owners table allows only one of them to be
+        # created, and the thread that loses the race finds the winner's
+        # port when it queries again. If the winner's port is not found,
+        # no SNAT IP is returned.
         for snat_subnet in snat_subnets:
             try:
                 # REVISIT:  This is a temporary fix and needs to be redone.
                 # We need to make sure that we do a proper bind.  Currently
                 # the SNAT endpoint is created by looking at VM port bind.
-                attrs = {'device_id': host_or_vrf,
-                         'device_owner': aim_cst.DEVICE_OWNER_SNAT_PORT,
-                         'tenant_id': ext_network['tenant_id'],
-                         'name': 'snat-pool-port:%s' % host_or_vrf,
-                         'network_id': ext_network['id'],
-                         'mac_address': n_constants.ATTR_NOT_SPECIFIED,
-                         'fixed_ips': [{'subnet_id': snat_subnet.id}],
-                         'status': "ACTIVE",
-                         'admin_state_up': True}
+                attrs = self._make_snat_port_attrs(
+                    host_or_vrf, ext_network, snat_subnet)
                 port = self.plugin.create_port(
                     plugin_context, {'port': attrs})
                 if port and port['fixed_ips']:
                     snat_ip = port['fixed_ips'][0]['ip_address']
-                    return {'host_snat_ip': snat_ip,
-                            'host_snat_mac': port['mac_address'],
-                            'gateway_ip': snat_subnet['gateway_ip'],
-                            'prefixlen':
-                            int(snat_subnet['cidr'].split('/')[1])}
+                    return self._make_snat_ip_info(
+                        snat_ip, port['mac_address'],
+                        snat_subnet['gateway_ip'], snat_subnet['cidr'])
             except n_exceptions.IpAddressGenerationFailure:
                 LOG.info('No more addresses available in subnet %s '
                          'for SNAT IP allocation',
                          snat_subnet['id'])
+            except n_exceptions.MultipleExceptions as e:
+                if not self._is_snat_port_conflict(e):
+                    raise
+                # Another thread won the race, so use its SNAT port
+                # rather than trying again.
+                with db_api.CONTEXT_READER.using(plugin_context) as session:
+                    allocs = self._get_snat_ip_allocations(
+                        session, ext_network['id'], [host_or_vrf])
+                if host_or_vrf in allocs:
+                    return allocs[host_or_vrf]
+                LOG.warning("SNAT port for %(owner)s on external network "
+                            "%(net)s conflicted with another one that "
+                            "could not be found",
+                            {'owner': host_or_vrf,
+                             'net': ext_network['id']})
+                return
 
         # Failed to allocate SNAT port.
         LOG.warning("Failed to allocate SNAT IP on external network %s",
                     ext_network['id'])
 
+    def preallocate_snat_ips(self, plugin_context, hosts_or_vrfs,
+                             ext_network):
+        """Fetch or allocate SNAT IPs on the external network in bulk.
+
+        Allocates the SNAT IPs of all the given hosts (or VRFs) that do
+        not have one yet with a single bulk port create on the SNAT-pool
+        subnet with the most free addresses. If the batch cannot be
+        allocated, the missing SNAT IPs are allocated one at a time by
+        get_or_allocate_snat_ip.
+        Returns a dict mapping each host (or VRF) whose SNAT IP was found
+        or allocated to the dict returned by get_or_allocate_snat_ip.
+        """
+        with db_api.CONTEXT_READER.using(plugin_context) as session:
+            allocs = self._get_snat_ip_allocations(
+                session, ext_network['id'], hosts_or_vrfs)
+            missing = sorted(set(hosts_or_vrfs) - set(allocs))
+            if not missing:
+                return allocs
+            snat_subnets = self._get_snat_pool_subnets(
+                session, ext_network['id'])
+            if not snat_subnets:
+                LOG.info('No subnet in external network %s is marked as '
+                         'SNAT-pool',
+                         ext_network['id'])
+                return allocs
+
+        snat_subnet = snat_subnets[0]
+        try:
+            ports = self.plugin.create_port_bulk(
+                plugin_context,
+                {'ports': [{'port': self._make_snat_port_attrs(
+                    owner, ext_network, snat_subnet)}
+                    for owner in missing]})
+            for owner, port in zip(missing, ports):
+                if port['fixed_ips']:
+                    allocs[owner] = self._make_snat_ip_info(
+                        port['fixed_ips'][0]['ip_address'],
+                        port['mac_address'], snat_subnet['gateway_ip'],
+                        snat_subnet['cidr'])
+        except (n_exceptions.IpAddressGenerationFailure,
+                n_exceptions.MultipleExceptions) as e:
+            LOG.info('Failed to allocate %(count)s SNAT IPs on external '
+                     'network %(net)s in bulk, allocating them one at a '
+                     'time: %(ex)s',
+                     {'count': len(missing), 'net': ext_network['id'],
+                      'ex': e})
+        for owner in missing:
+            if owner not in allocs:
+                alloc = self.get_or_allocate_snat_ip(
+                    plugin_context, owner, ext_network)
+                if alloc:
+                    allocs[owner] = alloc
+        return allocs
+
+    def _get_snat_ip_allocations(self, session, network_id, hosts_or_vrfs):
+        query = BAKERY(lambda s: s.query(
+            models_v2.Port.device_id,
+            models_v2.IPAllocation.ip_address,
+            models_v2.Port.mac_address,
+            models_v2.Subnet.gateway_ip,
+            models_v2.Subnet.cidr))
+        query += lambda q: q.join(
+            models_v2.Subnet,
+            models_v2.Subnet.id == models_v2.IPAllocation.subnet_id)
+        query += lambda q: q.join(
+            models_v2.Port,
+            models_v2.Port.id == models_v2.IPAllocation.port_id)
+        query += lambda q: q.filter(
+            models_v2.Port.network_id == sa.bindparam('network_id'),
+            models_v2.Port.device_id.in_(
+                sa.bindparam('device_ids', expanding=True)),
+            models_v2.Port.device_owner == aim_cst.DEVICE_OWNER_SNAT_PORT)
+        allocs = {}
+        for device_id, ip, mac, gateway_ip, cidr in query(session).params(
+                network_id=network_id, device_ids=list(hosts_or_vrfs)):
+            if device_id not in allocs:
+                allocs[device_id] = self._make_snat_ip_info(
+                    ip, mac, gateway_ip, cidr)
+        return allocs
+
+    def _get_snat_pool_subnets(self, session, network_id):
+        extn_db_sn = extension_db.SubnetExtensionDb
+
+        query = BAKERY(lambda s: s.query(
+            models_v2.Subnet))
+        query += lambda q: q.join(
+            extn_db_sn,
+            extn_db_sn.subnet_id == models_v2.Subnet.id)
+        query += lambda q: q.filter(
+            models_v2.Subnet.network_id == sa.bindparam('network_id'))
+        query += lambda q: q.filter(
+            extn_db_sn.snat_host_pool.is_(True))
+        snat_subnets = query(session).params(
+            network_id=network_id).all()
+        # Try the subnets with the most free addresses first.
+        free = self._get_subnet_free_address_counts(
+            session, [subnet.id for subnet in snat_subnets])
+        return sorted(snat_subnets, key=lambda subnet: -free[subnet.id])
+
+    def _get_subnet_free_address_counts(self, session, subnet_ids):
+        """Estimate the number of free addresses in each subnet.
+
+        This is the size of the subnet's allocation pools less the
+        number of addresses allocated from it. Addresses allocated
+        outside the pools make it an underestimate, so it is only used
+        to choose which subnet to try allocating from first.
+        """
+        free = defaultdict(int)
+        if not subnet_ids:
+            return free
+
+        query = BAKERY(lambda s: s.query(
+            models_v2.IPAllocationPool.subnet_id,
+            models_v2.IPAllocationPool.first_ip,
+            models_v2.IPAllocationPool.last_ip))
+        query += lambda q: q.filter(
+            models_v2.IPAllocationPool.subnet_id.in_(
+                sa.bindparam('subnet_ids', expanding=True)))
+        for subnet_id, first_ip, last_ip in query(session).params(
+                subnet_ids=subnet_ids):
+            free[subnet_id] += (int(netaddr.IPAddress(last_ip)) -
+                                int(netaddr.IPAddress(first_ip)) + 1)
+
+        query = BAKERY(lambda s: s.query(
+            models_v2.IPAllocation.subnet_id,
+            sa.func.count(models_v2.IPAllocation.ip_address)))
+        query += lambda q: q.filter(
+            models_v2.IPAllocation.subnet_id.in_(
+                sa.bindparam('subnet_ids', expanding=True)))
+        query += lambda q: q.group_by(
+            models_v2.IPAllocation.subnet_id)
+        for subnet_id, allocated in query(session).params(
+                subnet_ids=subnet_ids):
+            free[subnet_id] -= allocated
+        return free
+
+    def _make_snat_port_attrs(self, host_or_vrf, ext_network, snat_subnet):
+        return {'device_id': host_or_vrf,
+                'device_owner': aim_cst.DEVICE_OWNER_SNAT_PORT,
+                'tenant_id': ext_network['tenant_id'],
+                'name': 'snat-pool-port:%s' % host_or_vrf,
+                'network_id': ext_network['id'],
+                'mac_address': n_constants.ATTR_NOT_SPECIFIED,
+                'fixed_ips': [{'subnet_id': snat_subnet.id}],
+                'status': "ACTIVE",
+                'admin_state_up': True}
+
+    def _make_snat_ip_info(self, ip_address, mac_address, gateway_ip, cidr):
+        return {'host_snat_ip': ip_address,
+                'host_snat_mac': mac_address,
+                'gateway_ip': gateway_ip,
+                'prefixlen': int(cidr.split('/')[1])}
+
+    def _check_snat_port_owner(self, session, port):
+        # Only one SNAT pool port may be allocated for each host (or
+        # VRF) on an external network. Concurrent creates that both
+        # pass this check conflict on the table's primary key.
+        if self._get_snat_port_owner(
+                session, port['network_id'], port['device_id']):
+            raise exceptions.SnatPortAlreadyAllocated(
+                owner=port['device_id'], network_id=port['network_id'])
+        self._add_snat_port_owner(
+            session, port['network_id'], port['device_id'], port['id'])
+
+    def _update_snat_port_owner(self, session, orig, port):
+        # Keep the owner of an SNAT pool port in sync with its device_id
+        # and device_owner, so the owner can be allocated a new SNAT
+        # pool port once this one is no longer an SNAT port for it.
+        if orig['device_owner'] == aim_cst.DEVICE_OWNER_SNAT_PORT:
+            self._delete_snat_port_owner(session, port['id'])
+        if port['device_owner'] == aim_cst.DEVICE_OWNER_SNAT_PORT:
+            self._check_snat_port_owner(session, port)
+
+    def _is_snat_port_conflict(self, e):
+        # ML2 wraps exceptions raised by mechanism drivers.
+        return any(isinstance(inner, exceptions.SnatPortAlreadyAllocated)
+                   for inner in e.inner_exceptions)
+
+    def _get_router_endpoint_hosts(self, session, router_id,
+                                   ext_network_id):
+        query = BAKERY(lambda s: s.query(
+            models_v2.IPAllocation.subnet_id))
+        query += lambda q: q.join(
+            l3_db.RouterPort,
+            l3_db.RouterPort.port_id == models_v2.IPAllocation.port_id)
+        query += lambda q: q.filter(
+            l3_db.RouterPort.router_id == sa.bindparam('router_id'),
+            l3_db.RouterPort.port_type ==
+            n_constants.DEVICE_OWNER_ROUTER_INTF)
+        subnet_ids = set(subnet_id for subnet_id, in query(session).params(
+            router_id=router_id))
+        if not subnet_ids:
+            return []
+        # Endpoints on subnets served by distributed SNAT do not use
+        # SNAT pool IPs.
+        subnet_ids -= self._query_dist_snat_subnet_ids(
+            session, ext_network_id, subnet_ids)
+        if not subnet_ids:
+            return []
+
+        query = BAKERY(lambda s: s.query(
+            models.PortBinding.host))
+        query += lambda q: q.join(
+            models_v2.Port,
+            models_v2.Port.id == models.PortBinding.port_id)
+        query += lambda q: q.join(
+            models_v2.IPAllocation,
+            models_v2.IPAllocation.port_id == models_v2.Port.id)
+        query += lambda q: q.filter(
+            models_v2.IPAllocation.subnet_id.in_(
+                sa.bindparam('subnet_ids', expanding=True)),
+            models_v2.Port.device_owner.startswith('compute:'),
+            models.PortBinding.host != '')
+        query += lambda q: q.distinct()
+        return [host for host, in query(session).params(
+            subnet_ids=list(subnet_ids))]
+
+    @registry.receives(resources.ROUTER_GATEWAY, [events.AFTER_CREATE])
+    def _handle_router_gateway_create(self, resource, event, trigger,
+                                      payload):
+        if not cfg.CONF.ml2_apic_aim.preallocate_snat_ips:
+            return
+        # Routers without SNAT do not use SNAT IPs.
+        if not payload.latest_state.enable_snat:
+            return
+        # Ports cannot be created inside a transaction, so leave the
+        # SNAT IPs to be allocated when they are first requested.
+        if db_api.is_session_active(payload.context.session):
+            return
+        plugin_context = payload.context.elevated()
+        ext_network_id = payload.metadata['network_id']
+        with db_api.CONTEXT_READER.using(plugin_context) as session:
+            hosts = self._get_router_endpoint_hosts(
+                session, payload.resource_id, ext_network_id)
+        if not hosts:
+            return
+        ext_network = self.plugin.get_network(plugin_context, ext_network_id)
+        self.preallocate_snat_ips(plugin_context, hosts, ext_network)
+
     def _has_snat_ip_ports(self, plugin_context, subnet_id):
         session = plugin_context.session
 
@@ -6193,10 +6601,13 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
         query += lambda q: q.filter(
             sa.or_(extn_db_sn.snat_host_pool.is_(False),
                    extn_db_sn.snat_host_pool.is_(None)))
-        other_sn = query(session).params(
-            network_id=floatingip['floating_network_id']).all()
+        other_sn = [s[0] for s in query(session).params(
+            network_id=floatingip['floating_network_id']).all()]
 
-        return [s[0] for s in other_sn]
+        # Try the subnets with the most free addresses first, so that
+        # the first allocation attempt rarely fails.
+        free = self._get_subnet_free_address_counts(session, other_sn)
+        return sorted(other_sn, key=lambda subnet_id: -free[subnet_id])
 
     def _is_opflex_type(self, net_type):
         return net_type == ofcst.TYPE_OPFLEX
@@ -6305,6 +6716,10 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
                         self.aim.create(aim_ctx, static_path)
 
     def _get_topology_from_path(self, path):
+        return self._topology_cache.get_path_topology(
+            path, self._parse_topology_from_path)
+
+    def _parse_topology_from_path(self, path):
         """Convert path string to toplogy elements.
 
         Given a static path DN, convert it into the individual
@@ -6674,8 +7089,7 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
             # filtering applied
             session = plugin_context.session
             aim_ctx = aim_context.AimContext(db_session=session)
-            host_links = self.aim.find(aim_ctx,
-                                       aim_infra.HostLink, host_name=host)
+            host_links = self._topology_cache.get_host_links(aim_ctx, host)
             return [StaticPort(host_link, encap, 'regular') for host_link in
                     self._filter_host_links_by_segment(session,
                                                        segment, host_links)]
@@ -6962,43 +7376,44 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
                 for s in port_context.original['fixed_ips']]
             del_subnet = list(set(orig) - set(curr))
 
-        if remove or del_subnet:
-            # check if there are any other ports from this network on the host
-            query = BAKERY(lambda s: s.query(
-                models.PortBindingLevel))
-            query += lambda q: q.filter_by(
-                host=sa.bindparam('host'),
-                segment_id=sa.bindparam('segment_id'))
-            query += lambda q: q.filter(
-                models.PortBindingLevel.port_id != sa.bindparam('port_id'))
-            exist = query(session).params(
-                host=host,
-                segment_id=segment['id'],
-                port_id=port_context.current['id']).all()
-
-            if remove and exist:
+        if remove:
+            # Check if there are any other ports from this network on
+            # the host. Only their existence matters, so let the DB stop
+            # at the first one.
+            query = BAKERY(lambda s: s.query(sa.exists().where(sa.and_(
+                models.PortBindingLevel.host == sa.bindparam('host'),
+                models.PortBindingLevel.segment_id ==
+                sa.bindparam('segment_id'),
+                models.PortBindingLevel.port_id !=
+                sa.bindparam('port_id')))))
+            if query(session).params(
+                    host=host,
+                    segment_id=segment['id'],
+                    port_id=port_context.current['id']).scalar():
                 # We are removing a bound port, but there is at least
                 # one other port on this host so don't remove the
                 # IProfile.
                 return
-
-            if del_subnet and exist:
-                # Subnet is being removed from the port, if there is
-                # at least one other port with the subnet on the host -
-                # Leave the IProfile for this AF intact.
-                host_ports = [p['port_id'] for p in exist]
-                query = BAKERY(lambda s: s.query(
-                    models_v2.Port))
-                query += lambda q: q.filter(
-                    models_v2.Port.id.in_(sa.bindparam(
-                        'host_ports', expanding=True)))
-                query += lambda q: q.filter(
-                    models_v2.Port.fixed_ips.any(
-                        models_v2.IPAllocation.subnet_id.in_(
-                            sa.bindparam('del_subnet', expanding=True))))
-                if query(session).params(host_ports=host_ports,
-                    del_subnet=del_subnet).all():
-                    return
+        elif del_subnet:
+            # Subnet is being removed from the port, if there is at
+            # least one other port with the subnet on the host - Leave
+            # the IProfile for this AF intact.
+            query = BAKERY(lambda s: s.query(sa.exists().where(sa.and_(
+                models.PortBindingLevel.host == sa.bindparam('host'),
+                models.PortBindingLevel.segment_id ==
+                sa.bindparam('segment_id'),
+                models.PortBindingLevel.port_id !=
+                sa.bindparam('port_id'),
+                models_v2.IPAllocation.port_id ==
+                models.PortBindingLevel.port_id,
+                models_v2.IPAllocation.subnet_id.in_(
+                    sa.bindparam('del_subnet', expanding=True))))))
+            if query(session).params(
+                    host=host,
+                    segment_id=segment['id'],
+                    port_id=port_context.current['id'],
+                    del_subnet=del_subnet).scalar():
+                return
 
         static_ports = self._get_static_ports(port_context._plugin_context,
                                               host, segment,
@@ -7086,12 +7501,11 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
         if not aim_epg:
             return
         host_id = port[portbindings.HOST_ID]
-        aim_hd_mappings = (self.aim.find(aim_ctx,
-                                         aim_infra.HostDomainMappingV2,
-                                         host_name=host_id) or
-                           self.aim.find(aim_ctx,
-                                         aim_infra.HostDomainMappingV2,
-                                         host_name=DEFAULT_HOST_DOMAIN))
+        aim_hd_mappings = (
+            self._topology_cache.get_host_domain_mappings(
+                aim_ctx, host_id) or
+            self._topology_cache.get_host_domain_mappings(
+                aim_ctx, DEFAULT_HOST_DOMAIN))
         domains = []
         try:
             if is_vmm:
@@ -7172,9 +7586,8 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
                        else port_context.host)
             session = port_context._plugin_context.session
             aim_ctx = aim_context.AimContext(session)
-            aim_hd_mappings = self.aim.find(aim_ctx,
-                                            aim_infra.HostDomainMappingV2,
-                                            host_name=host_id)
+            aim_hd_mappings = self._topology_cache.get_host_domain_mappings(
+                aim_ctx, host_id)
             # For baremetal VNIC types, there may be additional topology
             # information in the binding:profile from Ironic. This may
             # include the PhysDom name in ACI, which can be used to
@@ -7607,12 +8020,11 @@ class ApicMechanismDriver(api_plus.MechanismDriver,
         aim_ctx = aim_context.AimContext(session)
         if self._is_port_bound(port):
             host_id = port[portbindings.HOST_ID]
-            dom_mappings = (self.aim.find(aim_ctx,
-                                          aim_infra.HostDomainMappingV2,
-                                          host_name=host_id) or
-                            self.aim.find(aim_ctx,
-                                          aim_infra.HostDomainMappingV2,
-                                          host_name=DEFAULT_HOST_DOMAIN))
+            dom_mappings = (
+                self._topology_cache.get_host_domain_mappings(
+                    aim_ctx, host_id) or
+                self._topology_cache.get_host_domain_mappings(
+                    aim_ctx, DEFAULT_HOST_DOMAIN))
 
             if not dom_mappings:
                 # If there's no direct mapping, get all the existing domains in
@@ -15,6 +15,7 @@
 
 from collections import defaultdict
 from collections import namedtuple
+import threading
 
 import netaddr
 from neutron.db.extra_dhcp_opt import models as dhcp_models
@@ -40,6 +41,7 @@ from oslo_serialization import jsonutils
 import sqlalchemy as sa
 from sqlalchemy.ext import baked
 
+from gbpservice.common import utils as gbp_utils
 from gbpservice.neutron.db import api as db_api
 from gbpservice.neutron.plugins.ml2plus.drivers.apic_aim import constants
 from gbpservice.neutron.plugins.ml2plus.drivers.apic_aim import db
@@ -165,6 +167,39 @@ NEUTRON_INTERNAL_PORTS = (n_constants.DEVICE_OWNER_ROUTER_INTF,
     n_constants.DEVICE_OWNER_ROUTER_GW)
 
 
+class PortBindingCoalescer(object):
+    """Coalesces concurrent binding attempts for the same port.
+
+    When many agent requests for the same unbound port arrive at once,
+    such as while a host boots, only the first one binds the port and
+    re-runs the endpoint queries. The others find the binding in
+    progress and return right away, leaving the agent to request the
+    details again. Shared by all the greenthreads of a worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_progress = set()
+        self.bindings = 0
+        self.coalesced = 0
+
+    def begin(self, port_id):
+        with self._lock:
+            if port_id in self._in_progress:
+                self.coalesced += 1
+                return False
+            self._in_progress.add(port_id)
+            self.bindings += 1
+            return True
+
+    def end(self, port_id):
+        with self._lock:
+            self._in_progress.discard(port_id)
+
+
+BINDING_COALESCER = PortBindingCoalescer()
+
+
 class TopologyRpcEndpoint(object):
 
     target = oslo_messaging.Target(version=oa_rpc.VERSION)
@@ -226,6 +261,7 @@ class ApicRpcHandlerMixin(object):
         gbp_details = response.get('gbp_details')
         return gbp_details or response
 
+    @gbp_utils.profiled
     def get_vrf_details(self, context, **kwargs):
         LOG.debug("APIC AIM MD handling get_vrf_details for: %s", kwargs)
 
@@ -304,6 +340,7 @@ class ApicRpcHandlerMixin(object):
                 'vrf_subnets': vrf_subnets
             }
 
+    @gbp_utils.profiled
     @db_api.retry_if_session_inactive()
     def _request_endpoint_details(self, context, request, host):
         device = request['device']
@@ -473,8 +510,23 @@ class ApicRpcHandlerMixin(object):
                     # Done with queries, so exit transaction and retry loop.
                     break
 
-            # Attempt to bind port outside transaction.
-            pc = self.plugin.get_bound_port_context(context, port_id, host)
+            # Attempt to bind port outside transaction, unless another
+            # request for the same port is already doing so, in which
+            # case let the agent retry once that is done.
+            if not BINDING_COALESCER.begin(port_id):
+                LOG.debug("Binding of port %s already in progress for "
+                          "request_endpoint_details RPC from host %s "
+                          "(%s coalesced of %s binding attempts)",
+                          port_id, host, BINDING_COALESCER.coalesced,
+                          BINDING_COALESCER.bindings +
+                          BINDING_COALESCER.coalesced)
+                response['binding_in_progress'] = True
+                return response
+            try:
+                pc = self.plugin.get_bound_port_context(
+                    context, port_id, host)
+            finally:
+                BINDING_COALESCER.end(port_id)
             if (pc.vif_type == portbindings.VIF_TYPE_BINDING_FAILED or
                 pc.vif_type == portbindings.VIF_TYPE_UNBOUND):
                 LOG.warning("The request_endpoint_details RPC handler is "
@@ -18,6 +18,7 @@ from neutron.plugins.ml2 import managers
 from oslo_log import log
 from oslo_utils import excutils
 
+from gbpservice.common import utils as gbp_utils
 from gbpservice.neutron.db import api as db_api
 from gbpservice.neutron.plugins.ml2plus import driver_api
 
@@ -165,6 +166,11 @@ class MechanismManager(managers.MechanismManager):
         self._call_on_extended_drivers("create_security_group_rule_precommit",
                                        context, raise_db_retriable=True)
 
+    def create_security_group_rule_bulk_precommit(self, contexts):
+        self._call_on_extended_drivers(
+            "create_security_group_rule_bulk_precommit", contexts,
+            raise_db_retriable=True)
+
     def create_security_group_rule_postcommit(self, context):
         self._call_on_extended_drivers("create_security_group_rule_postcommit",
                                        context)
@@ -281,6 +287,7 @@ class ExtensionManager(managers.ExtensionManager):
         self._call_on_dict_driver("extend_subnet_dict_bulk", session,
                                   None, result, has_base_model=False)
 
+    @gbp_utils.profiled
     def extend_port_dict_bulk(self, session, result):
         self._call_on_dict_driver("extend_port_dict_bulk", session, None,
                                   result, has_base_model=False)
@@ -44,6 +44,7 @@ from oslo_log import log
 from oslo_utils import excutils
 from sqlalchemy.orm import exc
 
+from gbpservice.common import utils as gbp_utils
 from gbpservice.neutron.db import api as db_api
 from gbpservice.neutron.db import implicitsubnetpool_db
 from gbpservice.neutron.plugins.ml2plus import driver_api as api_plus
@@ -160,8 +161,25 @@ class Ml2PlusPlugin(ml2_plugin.Ml2Plugin,
                 sg_rule = kwargs.get('security_group_rule')
             mech_context = driver_context.SecurityGroupRuleContext(
                 self, context, sg_rule)
-            self.mechanism_manager.create_security_group_rule_precommit(
-                mech_context)
+            batch = getattr(context, '_sg_rule_batch', None)
+            if batch is None:
+                self.mechanism_manager.create_security_group_rule_precommit(
+                    mech_context)
+                return
+            # Rules created by create_security_group_rule_bulk are
+            # passed to the mechanism drivers together once the event
+            # for the last rule of the batch has been received. A new
+            # transaction means the previous attempt was rolled back
+            # and is being retried, so start collecting again.
+            transaction = context.session.get_transaction()
+            if batch['transaction'] is not transaction:
+                batch['transaction'] = transaction
+                batch['contexts'] = []
+            batch['contexts'].append(mech_context)
+            if len(batch['contexts']) == batch['size']:
+                (self.mechanism_manager.
+                 create_security_group_rule_bulk_precommit(
+                     batch['contexts']))
             return
         if event == events.PRECOMMIT_DELETE:
             if 'payload' in kwargs:
@@ -405,12 +423,14 @@ class Ml2PlusPlugin(ml2_plugin.Ml2Plugin,
         return super(Ml2PlusPlugin, self).create_subnet_bulk(context,
                                                              subnets)
 
+    @gbp_utils.profiled
     @n_utils.transaction_guard
     @db_api.retry_if_session_inactive()
     def create_port(self, context, port):
         self._ensure_tenant(context, port[port_def.RESOURCE_NAME])
         return super(Ml2PlusPlugin, self).create_port(context, port)
 
+    @gbp_utils.profiled
     @n_utils.transaction_guard
     @db_api.retry_if_session_inactive()
     def create_port_bulk(self, context, ports):
@@ -419,6 +439,19 @@ class Ml2PlusPlugin(ml2_plugin.Ml2Plugin,
         return super(Ml2PlusPlugin, self).create_port_bulk(context,
                                                            ports)
 
+    @n_utils.transaction_guard
+    def create_security_group_rule_bulk(self, context, security_group_rules):
+        context._sg_rule_batch = {
+            'size': len(security_group_rules['security_group_rules']),
+            'transaction': None,
+            'contexts': []}
+        try:
+            return super(Ml2PlusPlugin,
+                         self).create_security_group_rule_bulk(
+                             context, security_group_rules)
+        finally:
+            del context._sg_rule_batch
+
     @n_utils.transaction_guard
     @db_api.retry_if_session_inactive()
     def create_subnetpool(self, context, subnetpool):
@@ -561,14 +594,18 @@ class Ml2PlusPlugin(ml2_plugin.Ml2Plugin,
     def _make_networks_dict(self, networks, context):
         nets = []
         for network in networks:
-            if network.mtu is None:
+            mtu = network.get('mtu', n_const.DEFAULT_NETWORK_MTU)
+            if mtu is None:
+                # Networks created before Pike may have a null MTU. It
+                # is computed here but not persisted, so that GETs
+                # remain pure reads.
                 # TODO(ivar): also refactor this to run for bulk networks
-                network.mtu = self._get_network_mtu(network, validate=False)
+                mtu = self._get_network_mtu(network, validate=False)
             res = {'id': network['id'],
                    'name': network['name'],
                    'tenant_id': network['tenant_id'],
                    'admin_state_up': network['admin_state_up'],
-                   'mtu': network.get('mtu', n_const.DEFAULT_NETWORK_MTU),
+                   'mtu': mtu,
                    'status': network['status'],
                    'subnets': [subnet['id']
                                for subnet in network['subnets']]}
@@ -588,10 +625,11 @@ class Ml2PlusPlugin(ml2_plugin.Ml2Plugin,
             result.append(db_utils.resource_fields(res, []))
         return result
 
+    @gbp_utils.profiled
     @db_api.retry_if_session_inactive()
     def get_networks(self, context, filters=None, fields=None,
                      sorts=None, limit=None, marker=None, page_reverse=False):
-        with db_api.CONTEXT_WRITER.using(context):
+        with db_api.CONTEXT_READER.using(context):
             nets_db = super(Ml2PlusPlugin, self)._get_networks(
                 context, filters, None, sorts, limit, marker, page_reverse)
 
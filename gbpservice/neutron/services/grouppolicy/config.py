@@ -28,6 +28,28 @@ group_policy_opts = [
                        "entrypoints to be loaded from the "
                        "gbpservice.neutron.group_policy.extension_drivers "
                        "namespace.")),
+    cfg.IntOpt('status_refresh_interval',
+               default=0,
+               help=_("Number of seconds between periodic refreshes, done "
+                      "by a single worker of each server, of the status "
+                      "of all GBP resources. When set to a positive "
+                      "value, the status is recomputed by the policy "
+                      "drivers and persisted only by this periodic task "
+                      "(or when a policy driver requests a refresh), and "
+                      "GET requests are pure DB reads. Default is 0 which "
+                      "means the status is recomputed, and persisted if "
+                      "changed, on every GET request.")),
+    cfg.BoolOpt('reserve_implicit_resource_quota',
+                default=True,
+                help=_("If True, a quota reservation is made and committed "
+                       "for each GBP resource that the policy drivers "
+                       "create implicitly, such as the L2 and L3 policies "
+                       "created for a policy target group. If False, these "
+                       "implicit creates skip the quota reservation. This "
+                       "avoids locking the quota tables several times for "
+                       "one API request. The implicit resources still "
+                       "count against the tenant's quota for later "
+                       "requests.")),
 ]
 
 
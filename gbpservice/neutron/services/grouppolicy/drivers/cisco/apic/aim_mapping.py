@@ -146,6 +146,8 @@ class AIMMappingDriver(nrd.CommonNeutronBase, aim_rpc.AIMMappingRPCMixin):
             self._create_per_l3p_implicit_contracts()
         self._nested_host_vlan = (
                 cfg.CONF.aim_mapping.nested_host_vlan)
+        if cfg.CONF.aim_mapping.cache_port_policy_target_info:
+            self._port_pt_infos = {}
 
     @log.log_method_call
     def start_rpc_listeners(self):
@@ -292,6 +294,8 @@ class AIMMappingDriver(nrd.CommonNeutronBase, aim_rpc.AIMMappingRPCMixin):
 
     @log.log_method_call
     def update_l3_policy_postcommit(self, context):
+        if context.current['name'] != context.original['name']:
+            self._forget_default_l3_policy(context.original)
         self._update_l3p_subnetpools_postcommit(context)
 
         l3p_orig = context.original
@@ -319,6 +323,7 @@ class AIMMappingDriver(nrd.CommonNeutronBase, aim_rpc.AIMMappingRPCMixin):
 
     @log.log_method_call
     def delete_l3_policy_postcommit(self, context):
+        self._forget_default_l3_policy(context.current)
         external_segments = context.current['external_segments']
         if external_segments:
             self._unplug_l3p_routers_from_ext_segment(
@@ -716,13 +721,18 @@ class AIMMappingDriver(nrd.CommonNeutronBase, aim_rpc.AIMMappingRPCMixin):
                        context.ptg, pluralized='policy_target_groups')
         if context.current['port_id']:
             # Explicit port case.
-            #
-            # REVISIT: Add port extension to specify the EPG so the
-            # mechanism driver can take care of domain association
-            # itself.
-            port_context = self.aim_mech_driver.make_port_context(
-                context._plugin_context, context.current['port_id'])
-            self.aim_mech_driver.associate_domain(port_context)
+            self._associate_explicit_port(context)
+
+    def _associate_explicit_port(self, context):
+        self._invalidate_port_pt_info(context._plugin_context,
+                                      context.current['port_id'])
+        #
+        # REVISIT: Add port extension to specify the EPG so the
+        # mechanism driver can take care of domain association
+        # itself.
+        port_context = self.aim_mech_driver.make_port_context(
+            context._plugin_context, context.current['port_id'])
+        self.aim_mech_driver.associate_domain(port_context)
 
     @log.log_method_call
     def create_policy_target_postcommit(self, context):
@@ -733,12 +743,40 @@ class AIMMappingDriver(nrd.CommonNeutronBase, aim_rpc.AIMMappingRPCMixin):
             self._use_implicit_port(context, subnets=subnets)
         self._associate_fip_to_pt(context)
 
+    @log.log_method_call
+    def create_policy_target_bulk_precommit(self, contexts):
+        # Look up and authorize each PTG only once, however many of
+        # the new PTs belong to it.
+        ptgs = {}
+        for context in contexts:
+            ptg_id = context.current['policy_target_group_id']
+            if ptg_id not in ptgs:
+                ptgs[ptg_id] = self._get_policy_target_group(
+                    context._plugin_context, ptg_id)
+                policy.enforce(context._plugin_context,
+                               'get_policy_target_group', ptgs[ptg_id],
+                               pluralized='policy_target_groups')
+            context.ptg = ptgs[ptg_id]
+            if context.current['port_id']:
+                self._associate_explicit_port(context)
+
+    @log.log_method_call
+    def create_policy_target_bulk_postcommit(self, contexts):
+        self._use_implicit_ports(contexts)
+        for context in contexts:
+            self.create_policy_target_postcommit(context)
+
     @log.log_method_call
     def update_policy_target_precommit(self, context):
         pass
 
     @log.log_method_call
     def update_policy_target_postcommit(self, context):
+        if context.current['port_id'] != context.original['port_id']:
+            self._invalidate_port_pt_info(context._plugin_context,
+                                          context.original['port_id'])
+            self._invalidate_port_pt_info(context._plugin_context,
+                                          context.current['port_id'])
         if self.apic_segmentation_label_driver and (
             set(context.current['segmentation_labels']) != (
                 set(context.original['segmentation_labels']))):
@@ -761,6 +799,8 @@ class AIMMappingDriver(nrd.CommonNeutronBase, aim_rpc.AIMMappingRPCMixin):
             context._plugin_context, context.current['id'])
         for fip in fips:
             self._delete_fip(context._plugin_context, fip.floatingip_id)
+        self._invalidate_port_pt_info(context._plugin_context,
+                                      context.current.get('port_id'))
         self._cleanup_port(
             context._plugin_context, context.current.get('port_id'))
 
@@ -1074,6 +1114,7 @@ class AIMMappingDriver(nrd.CommonNeutronBase, aim_rpc.AIMMappingRPCMixin):
 
     @log.log_method_call
     def create_external_segment_postcommit(self, context):
+        self._default_es_ids.clear()
         cidrs = sorted([x['destination']
                         for x in context.current['external_routes']])
         self._update_network(context._plugin_context,
@@ -1082,6 +1123,8 @@ class AIMMappingDriver(nrd.CommonNeutronBase, aim_rpc.AIMMappingRPCMixin):
 
     @log.log_method_call
     def update_external_segment_precommit(self, context):
+        if context.current['name'] != context.original['name']:
+            self._validate_default_external_segment(context)
         # REVISIT: what other attributes should we prevent an update on?
         invalid = ['port_address_translation']
         for attr in invalid:
@@ -1090,6 +1133,7 @@ class AIMMappingDriver(nrd.CommonNeutronBase, aim_rpc.AIMMappingRPCMixin):
 
     @log.log_method_call
     def update_external_segment_postcommit(self, context):
+        self._default_es_ids.clear()
         old_cidrs = sorted([x['destination']
                             for x in context.original['external_routes']])
         new_cidrs = sorted([x['destination']
@@ -1107,6 +1151,7 @@ class AIMMappingDriver(nrd.CommonNeutronBase, aim_rpc.AIMMappingRPCMixin):
 
     @log.log_method_call
     def delete_external_segment_postcommit(self, context):
+        self._default_es_ids.clear()
         subnet = self._get_subnet(context._plugin_context,
                                   context.current['subnet_id'])
         self._update_network(context._plugin_context,
@@ -1236,14 +1281,13 @@ class AIMMappingDriver(nrd.CommonNeutronBase, aim_rpc.AIMMappingRPCMixin):
     # this feature, since VM names should not effect behavior.
     def check_allow_vm_names(self, context, port):
         ok_to_bind = True
-        ptg, pt = self._port_id_to_ptg(context._plugin_context, port['id'])
+        pt_info = self._port_id_to_pt_info(context._plugin_context,
+                                           port['id'])
         # enforce the allowed_vm_names rules if possible
-        if (ptg and port['device_id'] and
+        if (pt_info and pt_info.l3p_id and port['device_id'] and
                 self.apic_allowed_vm_name_driver):
-            l2p = self._get_l2_policy(context._plugin_context,
-                                      ptg['l2_policy_id'])
             l3p = self.gbp_plugin.get_l3_policy(
-                context._plugin_context, l2p['l3_policy_id'])
+                context._plugin_context, pt_info.l3p_id)
             if l3p.get('allowed_vm_names'):
                 ok_to_bind = False
                 vm = nova_client.NovaClient().get_server(port['device_id'])
@@ -1264,9 +1308,14 @@ class AIMMappingDriver(nrd.CommonNeutronBase, aim_rpc.AIMMappingRPCMixin):
     # domain. Consider a more general way for neutron ports to be
     # bound using a non-default EPG.
     def get_ptg_port_ids(self, context, ptg):
-        pts = self.gbp_plugin.get_policy_targets(
-            context, {'id': ptg['policy_targets']})
-        return [x['port_id'] for x in pts]
+        query = BAKERY(lambda s: s.query(
+            gpmdb.PolicyTargetMapping.port_id))
+        query += lambda q: q.filter(
+            gpmdb.PolicyTargetMapping.policy_target_group_id ==
+            sa.bindparam('ptg_id'))
+        with db_api.CONTEXT_READER.using(context):
+            return [x for x, in query(context.session).params(
+                ptg_id=ptg['id'])]
 
     def _reject_shared_update(self, context, type):
         if context.original.get('shared') != context.current.get('shared'):
@@ -2302,6 +2351,14 @@ class AIMMappingDriver(nrd.CommonNeutronBase, aim_rpc.AIMMappingRPCMixin):
         super(AIMMappingDriver, self)._use_implicit_port(
                 context, subnets=subnets)
 
+    def _use_implicit_ports(self, contexts):
+        tenant_ids = set(context.current['tenant_id'] for context in contexts
+                         if not context.current['port_id'])
+        for tenant_id in tenant_ids:
+            self._create_default_security_group(contexts[0]._plugin_context,
+                                                tenant_id)
+        super(AIMMappingDriver, self)._use_implicit_ports(contexts)
+
     def _handle_create_network_service_policy(self, context):
         self._validate_nat_pool_for_nsp(context)
         self._handle_network_service_policy(context)
@@ -55,6 +55,15 @@ opts = [
                       "VLAN. The VLAN is stripped by the Opflex installed "
                       "flows on the integration bridge and the traffic is "
                       "forwarded on the Neutron network.")),
+    cfg.BoolOpt('cache_port_policy_target_info',
+                default=False,
+                help=_("Keep a per-process cache mapping Neutron ports to "
+                       "their policy target, policy target group, L2 and "
+                       "L3 policies, in addition to the per-request one. "
+                       "Entries are invalidated when this process creates, "
+                       "updates or deletes the policy target, so this "
+                       "should only be enabled when policy targets are "
+                       "managed through a single Neutron server.")),
 ]
 
 
@@ -96,13 +96,43 @@ class ImplicitPolicyBase(api.PolicyDriver, local_api.LocalAPI):
         self._default_proxy_subnet_prefix_length = (
             gpproxy.default_proxy_subnet_prefix_length)
         self._default_es_name = gpip.default_external_segment_name
-
-    def _create_implicit_l3_policy(self, context):
-        tenant_id = context.current['tenant_id']
+        # Maps tenant IDs to the IDs of their default L3 policies.
+        self._default_l3p_ids = {}
+        # Maps tenant IDs to the IDs of the default external segments
+        # they use.
+        self._default_es_ids = {}
+
+    def _get_default_l3_policy(self, context, tenant_id):
+        # Once known, the tenant's default L3 policy is fetched by ID
+        # rather than searched for by tenant and name. The ID is checked
+        # against what is fetched, since the L3 policy may have been
+        # deleted or renamed by another process.
+        l3p_id = self._default_l3p_ids.get(tenant_id)
+        if l3p_id:
+            try:
+                l3p = self._get_l3_policy(context._plugin_context, l3p_id)
+                if (l3p['tenant_id'] == tenant_id and
+                        l3p['name'] == self._default_l3p_name):
+                    return l3p
+            except gbp_ext.L3PolicyNotFound:
+                pass
+            self._default_l3p_ids.pop(tenant_id, None)
         filter = {'tenant_id': [tenant_id],
                   'name': [self._default_l3p_name]}
         l3ps = self._get_l3_policies(context._plugin_context, filter)
-        l3p = l3ps and l3ps[0]
+        if l3ps:
+            # Pick the same one in every process should there be more.
+            l3p = min(l3ps, key=lambda x: x['id'])
+            self._default_l3p_ids[tenant_id] = l3p['id']
+            return l3p
+
+    def _forget_default_l3_policy(self, l3p):
+        if self._default_l3p_ids.get(l3p['tenant_id']) == l3p['id']:
+            del self._default_l3p_ids[l3p['tenant_id']]
+
+    def _create_implicit_l3_policy(self, context):
+        tenant_id = context.current['tenant_id']
+        l3p = self._get_default_l3_policy(context, tenant_id)
         if not l3p:
             attrs = {'tenant_id': tenant_id,
                      'name': self._default_l3p_name,
@@ -121,14 +151,13 @@ class ImplicitPolicyBase(api.PolicyDriver, local_api.LocalAPI):
                 l3p = self._create_l3_policy(context._plugin_context, attrs)
                 self._mark_l3_policy_owned(context._plugin_context.session,
                                            l3p['id'])
+                self._default_l3p_ids[tenant_id] = l3p['id']
             except exc.DefaultL3PolicyAlreadyExists:
                 with excutils.save_and_reraise_exception(
                         reraise=False) as ctxt:
                     LOG.debug("Possible concurrent creation of default L3 "
                               "policy for tenant %s", tenant_id)
-                    l3ps = self._get_l3_policies(context._plugin_context,
-                                                 filter)
-                    l3p = l3ps and l3ps[0]
+                    l3p = self._get_default_l3_policy(context, tenant_id)
                     if not l3p:
                         LOG.warning(
                             "Caught DefaultL3PolicyAlreadyExists, "
@@ -228,20 +257,46 @@ class ImplicitPolicyBase(api.PolicyDriver, local_api.LocalAPI):
         if not self._default_es_name:
             return
 
+        default = self._get_default_external_segment(
+            context, context.current['tenant_id'])
+        if default:
+            # Set default ES
+            context.set_external_segment(default['id'])
+
+    def _get_default_external_segment(self, context, tenant_id):
+        # Once found, the default ES used by a tenant is fetched by ID
+        # rather than searched for among all the tenants' ESs. Since it
+        # may have been deleted, renamed or unshared by another process,
+        # what is fetched is checked. A tenant cannot create an ES with,
+        # or rename one to, the default name while another default ES
+        # is visible to it, so the ES found remains the preferred one as
+        # long as it passes this check.
+        es_id = self._default_es_ids.get(tenant_id)
+        if es_id:
+            try:
+                es = self._get_external_segment(context._plugin_context,
+                                                es_id)
+                if (es['name'] == self._default_es_name and
+                        (es['tenant_id'] == tenant_id or es['shared'])):
+                    return es
+            except gbp_ext.ExternalSegmentNotFound:
+                pass
+            self._default_es_ids.pop(tenant_id, None)
+
         filter = {'name': [self._default_es_name]}
         ess = self._get_external_segments(context._plugin_context, filter)
         # Multiple default ES may exist, this can happen when a per-tenant
         # default ES gets his shared attribute flipped. Always prefer the
         # specific tenant's ES if any.
         for es in ess:
-            if es['tenant_id'] == context.current['tenant_id']:
+            if es['tenant_id'] == tenant_id:
                 default = es
                 break
         else:
             default = ess and ess[0]
         if default:
-            # Set default ES
-            context.set_external_segment(default['id'])
+            self._default_es_ids[tenant_id] = default['id']
+        return default
 
 
 class ImplicitPolicyDriver(ImplicitPolicyBase):
@@ -299,6 +354,23 @@ class ImplicitPolicyDriver(ImplicitPolicyBase):
     def create_external_segment_precommit(self, context):
         self._validate_default_external_segment(context)
 
+    @log.log_method_call
+    def create_external_segment_postcommit(self, context):
+        self._default_es_ids.clear()
+
+    @log.log_method_call
+    def update_external_segment_precommit(self, context):
+        if context.current['name'] != context.original['name']:
+            self._validate_default_external_segment(context)
+
+    @log.log_method_call
+    def update_external_segment_postcommit(self, context):
+        self._default_es_ids.clear()
+
+    @log.log_method_call
+    def delete_external_segment_postcommit(self, context):
+        self._default_es_ids.clear()
+
     @log.log_method_call
     def create_external_policy_postcommit(self, context):
         if not context.current['external_segments']:
@@ -329,4 +401,9 @@ class ImplicitPolicyDriver(ImplicitPolicyBase):
 
     @log.log_method_call
     def update_l3_policy_postcommit(self, context):
-        pass
+        if context.current['name'] != context.original['name']:
+            self._forget_default_l3_policy(context.original)
+
+    @log.log_method_call
+    def delete_l3_policy_postcommit(self, context):
+        self._forget_default_l3_policy(context.current)
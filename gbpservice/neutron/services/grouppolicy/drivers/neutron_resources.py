@@ -10,16 +10,34 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from collections import namedtuple
+
 from neutron_lib.plugins import directory
 from oslo_log import helpers as log
+from oslo_log import log as logging
+import sqlalchemy as sa
+from sqlalchemy.ext import baked
 
 from gbpservice.neutron.db import api as db_api
+from gbpservice.neutron.db.grouppolicy import group_policy_mapping_db as gpmdb
 from gbpservice.neutron.services.grouppolicy.common import exceptions as exc
 from gbpservice.neutron.services.grouppolicy.drivers import (
     implicit_policy as ipd)
 from gbpservice.neutron.services.grouppolicy.drivers import (
     resource_mapping as rmd)
 
+LOG = logging.getLogger(__name__)
+
+BAKERY = baked.bakery(_size_alert=lambda c: LOG.warning(
+    "sqlalchemy baked query cache size exceeded in %s", __name__))
+
+PortPtInfo = namedtuple(
+    'PortPtInfo',
+    ['pt_id',
+     'ptg_id',
+     'l2p_id',
+     'l3p_id'])
+
 
 class CommonNeutronBase(ipd.ImplicitPolicyBase, rmd.OwnedResourcesOperations,
                         rmd.ImplicitResourceOperations):
@@ -34,6 +52,9 @@ class CommonNeutronBase(ipd.ImplicitPolicyBase, rmd.OwnedResourcesOperations,
         # REVISIT: Check if this is still required
         self._cached_agent_notifier = None
         self._gbp_plugin = None
+        # Process-scoped port ID to PortPtInfo cache, enabled by
+        # setting it to a dict. See _port_id_to_pt_info().
+        self._port_pt_infos = None
         super(CommonNeutronBase, self).initialize()
 
     @property
@@ -72,21 +93,107 @@ class CommonNeutronBase(ipd.ImplicitPolicyBase, rmd.OwnedResourcesOperations,
         if l3p_id:
             self._cleanup_l3_policy(context, l3p_id)
 
-    def _port_id_to_pt(self, plugin_context, port_id):
-        pts = self.gbp_plugin.get_policy_targets(
-            plugin_context, {'port_id': [port_id]})
-        if pts:
-            return pts[0]
+    def _port_id_to_ptg(self, plugin_context, port_id):
+        """Resolve a port to its PTG and PT.
+
+        Returns a (ptg, pt) tuple of partial dicts, or (None, None) if
+        the port is not owned by a policy target. The PTG dict only has
+        the id, tenant_id, name, l2_policy_id and
+        application_policy_group_id attributes, which is what is needed
+        to map it to its EPG, and the PT dict only has the id, port_id
+        and policy_target_group_id attributes. They are read with a
+        single query by PT ID rather than through the plugin's GET
+        methods.
+        """
+        pt_info = self._port_id_to_pt_info(plugin_context, port_id)
+        if not pt_info:
+            return None, None
+        with db_api.CONTEXT_READER.using(plugin_context):
+            ptg = self._query_pt_ptg(plugin_context.session, pt_info.pt_id)
+        if not ptg or ptg['id'] != pt_info.ptg_id:
+            # Stale process-scoped cache entry.
+            self._invalidate_port_pt_info(plugin_context, port_id)
+            return None, None
+        pt = {'id': pt_info.pt_id,
+              'port_id': port_id,
+              'policy_target_group_id': pt_info.ptg_id}
+        return ptg, pt
 
-    def _pt_to_ptg(self, plugin_context, pt):
-        if pt:
-            return self.gbp_plugin.get_policy_target_group(
-                plugin_context, pt['policy_target_group_id'])
-        return None
+    def _query_pt_ptg(self, session, pt_id):
+        query = BAKERY(lambda s: s.query(
+            gpmdb.PolicyTargetGroupMapping.id,
+            gpmdb.PolicyTargetGroupMapping.project_id,
+            gpmdb.PolicyTargetGroupMapping.name,
+            gpmdb.PolicyTargetGroupMapping.l2_policy_id,
+            gpmdb.PolicyTargetGroupMapping.application_policy_group_id,
+        ))
+        query += lambda q: q.join(
+            gpmdb.PolicyTargetMapping,
+            gpmdb.PolicyTargetMapping.policy_target_group_id ==
+            gpmdb.PolicyTargetGroupMapping.id)
+        query += lambda q: q.filter(
+            gpmdb.PolicyTargetMapping.id == sa.bindparam('pt_id'))
+        row = query(session).params(pt_id=pt_id).first()
+        if row:
+            return {'id': row[0],
+                    'tenant_id': row[1],
+                    'name': row[2],
+                    'l2_policy_id': row[3],
+                    'application_policy_group_id': row[4]}
 
-    def _port_id_to_ptg(self, plugin_context, port_id):
-        pt = self._port_id_to_pt(plugin_context, port_id)
-        return self._pt_to_ptg(plugin_context, pt), pt
+    def _query_port_pt_infos(self, session, port_ids):
+        query = BAKERY(lambda s: s.query(
+            gpmdb.PolicyTargetMapping.port_id,
+            gpmdb.PolicyTargetMapping.id,
+            gpmdb.PolicyTargetMapping.policy_target_group_id,
+            gpmdb.PolicyTargetGroupMapping.l2_policy_id,
+            gpmdb.L2PolicyMapping.l3_policy_id,
+        ))
+        query += lambda q: q.join(
+            gpmdb.PolicyTargetGroupMapping,
+            gpmdb.PolicyTargetGroupMapping.id ==
+            gpmdb.PolicyTargetMapping.policy_target_group_id)
+        query += lambda q: q.outerjoin(
+            gpmdb.L2PolicyMapping,
+            gpmdb.L2PolicyMapping.id ==
+            gpmdb.PolicyTargetGroupMapping.l2_policy_id)
+        query += lambda q: q.filter(
+            gpmdb.PolicyTargetMapping.port_id.in_(
+                sa.bindparam('port_ids', expanding=True)))
+        return {row[0]: PortPtInfo._make(row[1:]) for row in
+                query(session).params(port_ids=list(port_ids))}
+
+    def _port_id_to_pt_info(self, plugin_context, port_id):
+        """Resolve a port to its PT, PTG, L2P and L3P IDs.
+
+        Returns a PortPtInfo, or None if the port is not owned by a
+        policy target. Results, including misses, are cached on
+        plugin_context for the rest of the request. Hits are also
+        cached for the life of the process when _port_pt_infos is
+        enabled.
+        """
+        infos = getattr(plugin_context, '_port_pt_infos', None)
+        if infos is None:
+            infos = plugin_context._port_pt_infos = {}
+        if port_id not in infos:
+            info = (self._port_pt_infos or {}).get(port_id)
+            if not info:
+                with db_api.CONTEXT_READER.using(plugin_context):
+                    info = self._query_port_pt_infos(
+                        plugin_context.session, [port_id]).get(port_id)
+                if info and self._port_pt_infos is not None:
+                    self._port_pt_infos[port_id] = info
+            infos[port_id] = info
+        return infos[port_id]
+
+    def _invalidate_port_pt_info(self, plugin_context, port_id):
+        if not port_id:
+            return
+        infos = getattr(plugin_context, '_port_pt_infos', None)
+        if infos:
+            infos.pop(port_id, None)
+        if self._port_pt_infos:
+            self._port_pt_infos.pop(port_id, None)
 
     def _network_id_to_l2p(self, context, network_id):
         l2ps = self.gbp_plugin.get_l2_policies(
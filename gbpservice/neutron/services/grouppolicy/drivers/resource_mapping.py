@@ -739,6 +739,75 @@ class ImplicitResourceOperations(local_api.LocalAPI,
                     last = ex
         raise last
 
+    def _use_implicit_ports(self, contexts):
+        """Create implicit ports for several policy targets at once.
+
+        Policy targets are grouped by PTG so that the PTG, its L2P,
+        its default security group and its subnets are only looked up
+        once per group, and all of the group's ports are created with
+        a single bulk call to the core plugin. Policy targets needing
+        a specific address, as well as any group whose bulk creation
+        fails for lack of addresses, go through _use_implicit_port().
+        """
+        by_ptg = {}
+        for context in contexts:
+            if context.current['port_id']:
+                continue
+            if context.current.get('group_default_gateway'):
+                self._use_implicit_port(context)
+                continue
+            by_ptg.setdefault(
+                context.current['policy_target_group_id'], []).append(context)
+        if not by_ptg:
+            return
+        plugin_context = contexts[0]._plugin_context
+        plugin = contexts[0]._plugin
+        for ptg_id, ptg_contexts in by_ptg.items():
+            ptg = plugin.get_policy_target_group(plugin_context, ptg_id)
+            l2p = plugin.get_l2_policy(plugin_context, ptg['l2_policy_id'])
+            subnets = self._get_subnets(plugin_context,
+                                        {'id': ptg['subnets']})
+            if not subnets:
+                raise exc.NoSubnetAvailable()
+            # Start with the first subnet and, for dual-stack, the first
+            # subnet of the other family, as _use_implicit_port() does.
+            fixed_ips = [{'subnet_id': subnets[0]['id']}]
+            alt_subnets = [subnet for subnet in subnets
+                           if subnet['ip_version'] != subnets[0]['ip_version']]
+            if alt_subnets:
+                fixed_ips.append({'subnet_id': alt_subnets[0]['id']})
+            sg_ids = {}
+            attrs_list = []
+            for context in ptg_contexts:
+                tenant_id = context.current['tenant_id']
+                if tenant_id not in sg_ids:
+                    sg_ids[tenant_id] = self._get_default_security_group(
+                        plugin_context, ptg_id, tenant_id)
+                attrs = {'tenant_id': tenant_id,
+                         'name': 'pt_' + context.current['name'],
+                         'network_id': l2p['network_id'],
+                         'mac_address': n_const.ATTR_NOT_SPECIFIED,
+                         'fixed_ips': [dict(ip) for ip in fixed_ips],
+                         'device_id': '',
+                         'device_owner': '',
+                         'security_groups': ([sg_ids[tenant_id]] if
+                                             sg_ids[tenant_id] else None),
+                         'admin_state_up': True}
+                attrs.update(context.current.get('port_attributes', {}))
+                attrs_list.append(attrs)
+            try:
+                ports = self._create_ports_bulk(plugin_context, attrs_list)
+            except n_exc.IpAddressGenerationFailure:
+                LOG.warning("No more address available in subnet %s for "
+                            "bulk port creation, creating ports one by one",
+                            subnets[0]['id'])
+                for context in ptg_contexts:
+                    self._use_implicit_port(context, subnets=subnets)
+                continue
+            for context, port in zip(ptg_contexts, ports):
+                self._mark_port_owned(plugin_context.session, port['id'])
+                context.set_port_id(port['id'])
+
     def _cleanup_port(self, plugin_context, port_id):
         with db_api.CONTEXT_READER.using(plugin_context):
             res = self._port_is_owned(plugin_context.session, port_id)
@@ -1785,6 +1854,12 @@ class ResourceMappingDriver(api.PolicyDriver, ImplicitResourceOperations,
         if context.current.get('proxy_gateway'):
             self._set_proxy_gateway_routes(context, context.current)
 
+    @log.log_method_call
+    def create_policy_target_bulk_postcommit(self, contexts):
+        self._use_implicit_ports(contexts)
+        for context in contexts:
+            self.create_policy_target_postcommit(context)
+
     @log.log_method_call
     def update_policy_target_precommit(self, context):
         self._validate_cluster_id(context)
@@ -2301,13 +2376,17 @@ class ResourceMappingDriver(api.PolicyDriver, ImplicitResourceOperations,
     def delete_policy_rule_set_postcommit(self, context):
         # Disassociate SGs
         sg_list = context._rmd_sg_list_temp
-        ptg_mapping = [context.current['providing_policy_target_groups'],
-                       context.current['consuming_policy_target_groups']]
-        for ptgs in ptg_mapping:
-            for ptg in ptgs:
-                policy_target_list = ptg['policy_targets']
-                for pt_id in policy_target_list:
-                    self._disassoc_sgs_from_pt(context, pt_id, sg_list)
+        ptg_ids = (context.current['providing_policy_target_groups'] +
+                   context.current['consuming_policy_target_groups'])
+        if ptg_ids:
+            pts = context._plugin.get_policy_targets(
+                context._plugin_context,
+                filters={'policy_target_group_id': ptg_ids},
+                fields=['port_id'])
+            self._update_ports_security_groups(
+                context._plugin_context,
+                [pt['port_id'] for pt in pts if pt['port_id']],
+                remove_sg_ids=sg_list)
         # Delete SGs
         for sg in sg_list:
             self._delete_sg(context._plugin_context, sg)
@@ -2795,13 +2874,30 @@ class ResourceMappingDriver(api.PolicyDriver, ImplicitResourceOperations,
         sg_list = self._generate_list_of_sg_from_ptg(context, ptg_id)
         self._assoc_sgs_to_pt(context, pt_id, sg_list)
 
+    def _get_pt_port_ids(self, context, pt_ids):
+        if not pt_ids:
+            return []
+        pts = context._plugin.get_policy_targets(
+            context._plugin_context, filters={'id': list(pt_ids)},
+            fields=['id', 'port_id'])
+        for pt_id in set(pt_ids) - set(pt['id'] for pt in pts):
+            LOG.warning("PT %s doesn't exist anymore", pt_id)
+        return [pt['port_id'] for pt in pts if pt['port_id']]
+
+    def _update_sgs_on_pts(self, context, pt_ids, sg_list, op):
+        # All the PTs' ports are updated in a single transaction,
+        # instead of doing one full port update per PT.
+        port_ids = self._get_pt_port_ids(context, pt_ids)
+        if op == "ASSOCIATE":
+            self._update_ports_security_groups(
+                context._plugin_context, port_ids, add_sg_ids=sg_list)
+        else:
+            self._update_ports_security_groups(
+                context._plugin_context, port_ids, remove_sg_ids=sg_list)
+
     def _update_sgs_on_pt_with_ptg(self, context, ptg_id, new_pt_list, op):
         sg_list = self._generate_list_of_sg_from_ptg(context, ptg_id)
-        for pt_id in new_pt_list:
-            if op == "ASSOCIATE":
-                self._assoc_sgs_to_pt(context, pt_id, sg_list)
-            else:
-                self._disassoc_sgs_from_pt(context, pt_id, sg_list)
+        self._update_sgs_on_pts(context, new_pt_list, sg_list, op)
 
     def _update_sgs_on_ptg(self, context, ptg_id, provided_policy_rule_sets,
                            consumed_policy_rule_sets, op):
@@ -2809,12 +2905,7 @@ class ResourceMappingDriver(api.PolicyDriver, ImplicitResourceOperations,
             context, provided_policy_rule_sets, consumed_policy_rule_sets)
         ptg = context._plugin.get_policy_target_group(
             context._plugin_context, ptg_id)
-        policy_target_list = ptg['policy_targets']
-        for pt_id in policy_target_list:
-            if op == "ASSOCIATE":
-                self._assoc_sgs_to_pt(context, pt_id, sg_list)
-            else:
-                self._disassoc_sgs_from_pt(context, pt_id, sg_list)
+        self._update_sgs_on_pts(context, ptg['policy_targets'], sg_list, op)
 
     def _set_or_unset_rules_for_subnets(
             self, context, subnets, provided_policy_rule_sets,
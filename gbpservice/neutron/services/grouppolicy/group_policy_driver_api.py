@@ -597,6 +597,32 @@ class PolicyDriver(object):
         """
         pass
 
+    def create_policy_target_bulk_precommit(self, contexts):
+        """Allocate resources for several new policy_targets.
+
+        :param contexts: list of PolicyTargetContext instances, each
+        describing a new policy_target.
+
+        All the policy_targets are created within the same transaction.
+        The default implementation calls create_policy_target_precommit
+        for each of them; drivers can override it to share lookups
+        between policy_targets.
+        """
+        for context in contexts:
+            self.create_policy_target_precommit(context)
+
+    def create_policy_target_bulk_postcommit(self, contexts):
+        """Create several policy_targets.
+
+        :param contexts: list of PolicyTargetContext instances, each
+        describing a new policy_target.
+
+        The default implementation calls create_policy_target_postcommit
+        for each policy_target.
+        """
+        for context in contexts:
+            self.create_policy_target_postcommit(context)
+
     def update_policy_target_precommit(self, context):
         """Update resources of a policy_target.
 
@@ -15,11 +15,14 @@ import six
 
 from neutron.common import utils as n_utils
 from neutron.quota import resource_registry
+from neutron import worker
 from neutron_lib.api.definitions import portbindings
 from neutron_lib import constants
 from neutron_lib import context as n_ctx
+from neutron_lib import exceptions as n_exc
 from neutron_lib.plugins import constants as pconst
 from neutron_lib.plugins import directory
+from oslo_config import cfg
 from oslo_log import helpers as log
 from oslo_log import log as logging
 from oslo_utils import excutils
@@ -45,6 +48,29 @@ LOG = logging.getLogger(__name__)
 STATUS = 'status'
 STATUS_DETAILS = 'status_details'
 STATUS_SET = set([STATUS, STATUS_DETAILS])
+STATUS_RESOURCE_CONTEXTS = {
+    'policy_target': 'PolicyTargetContext',
+    'policy_target_group': 'PolicyTargetGroupContext',
+    'application_policy_group': 'ApplicationPolicyGroupContext',
+    'l2_policy': 'L2PolicyContext',
+    'l3_policy': 'L3PolicyContext',
+    'network_service_policy': 'NetworkServicePolicyContext',
+    'policy_classifier': 'PolicyClassifierContext',
+    'policy_action': 'PolicyActionContext',
+    'policy_rule': 'PolicyRuleContext',
+    'policy_rule_set': 'PolicyRuleSetContext',
+    'external_segment': 'ExternalSegmentContext',
+    'external_policy': 'ExternalPolicyContext',
+    'nat_pool': 'NatPoolContext',
+}
+
+# Number of policy_targets created per transaction by
+# create_policy_target_bulk().
+PT_BULK_CHUNK_SIZE = 100
+
+cfg.CONF.import_opt('status_refresh_interval',
+                    'gbpservice.neutron.services.grouppolicy.config',
+                    group='group_policy')
 
 
 class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
@@ -69,6 +95,43 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
     def start_rpc_listeners(self):
         return self.policy_driver_manager.start_rpc_listeners()
 
+    def get_workers(self):
+        # The status of all resources is refreshed by a single worker,
+        # rather than by each of the RPC workers.
+        if not self.status_refresh_interval:
+            return []
+        return [worker.PeriodicWorker(self._refresh_all_status,
+                                      self.status_refresh_interval, 0,
+                                      desc='GBP status refresh worker')]
+
+    def _refresh_all_status(self):
+        try:
+            self._really_refresh_all_status()
+        except Exception:
+            # Keep the worker's loop running.
+            LOG.exception("Failed to refresh status of GBP resources")
+
+    def _really_refresh_all_status(self):
+        context = n_ctx.get_admin_context()
+        for resource_name in STATUS_RESOURCE_CONTEXTS:
+            get_method = 'get_' + gbp_utils.get_resource_plural(
+                resource_name)
+            with db_api.CONTEXT_READER.using(context):
+                resource_ids = [
+                    resource['id'] for resource in
+                    getattr(super(GroupPolicyPlugin, self), get_method)(
+                        context, fields=['id'])]
+            for resource_id in resource_ids:
+                try:
+                    self.refresh_status(context, resource_name, resource_id)
+                except n_exc.NotFound:
+                    # Deleted since it was listed.
+                    pass
+                except Exception:
+                    LOG.exception("Failed to refresh status of %(type)s "
+                                  "%(id)s", {'type': resource_name,
+                                             'id': resource_id})
+
     def validate_state(self, repair, resources, tenants):
         return self.policy_driver_manager.validate_state(repair,
             resources, tenants)
@@ -370,10 +433,36 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             resource['status_details'] = updated_status_details
         return resource
 
+    def refresh_status(self, context, resource_name, resource_id):
+        """Recompute the status of a GBP resource and persist it.
+
+        Besides being called periodically when status_refresh_interval
+        is set, this can be called by a policy driver that knows the
+        status of one of its resources has changed.
+        """
+        with db_api.CONTEXT_WRITER.using(context):
+            result = getattr(super(GroupPolicyPlugin, self),
+                             'get_' + resource_name)(context, resource_id)
+            getattr(self.extension_manager,
+                    'extend_' + resource_name + '_dict')(
+                        context.session, result)
+            return self._get_status_from_drivers(
+                context, STATUS_RESOURCE_CONTEXTS[resource_name],
+                resource_name, resource_id, result)
+
+    def _status_from_drivers_needed(self, fields):
+        # Invoke drivers only if status attributes are requested and
+        # the status isn't refreshed in the background instead.
+        return (not self.status_refresh_interval and
+                (not fields or bool(STATUS_SET.intersection(set(fields)))))
+
     def _get_resource(self, context, resource_name, resource_id,
                       gbp_context_name, fields=None):
-        # The following is a writer because we do DB write for status
-        with db_api.CONTEXT_WRITER.using(context):
+        get_status = self._status_from_drivers_needed(fields)
+        # A writer is needed only when the status may be written.
+        db_context = (db_api.CONTEXT_WRITER if get_status
+                      else db_api.CONTEXT_READER)
+        with db_context.using(context):
             session = context.session
             get_method = "".join(['get_', resource_name])
             result = getattr(super(GroupPolicyPlugin, self), get_method)(
@@ -383,18 +472,21 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             getattr(self.extension_manager, extend_resources_method)(
                 session, result)
 
-            # Invoke drivers only if status attributes are requested
-            if not fields or STATUS_SET.intersection(set(fields)):
+            if get_status:
                 result = self._get_status_from_drivers(
                     context, gbp_context_name, resource_name, resource_id,
                     result)
             return db_api.resource_fields(result, fields)
 
+    @gbp_utils.profiled
     def _get_resources(self, context, resource_name, gbp_context_name,
                        filters=None, fields=None, sorts=None, limit=None,
                        marker=None, page_reverse=False):
-        # The following is a writer because we do DB write for status
-        with db_api.CONTEXT_WRITER.using(context):
+        get_status = self._status_from_drivers_needed(fields)
+        # A writer is needed only when the status may be written.
+        db_context = (db_api.CONTEXT_WRITER if get_status
+                      else db_api.CONTEXT_READER)
+        with db_context.using(context):
             session = context.session
             resource_plural = gbp_utils.get_resource_plural(resource_name)
             get_resources_method = "".join(['get_', resource_plural])
@@ -412,8 +504,7 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
                     filtered_results.append(filtered)
 
         new_filtered_results = []
-        # Invoke drivers only if status attributes are requested
-        if not fields or STATUS_SET.intersection(set(fields)):
+        if get_status:
             for result in filtered_results:
                 result = self._get_status_from_drivers(
                     context, gbp_context_name, resource_name, result['id'],
@@ -440,9 +531,15 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
     def __init__(self):
         self.extension_manager = ext_manager.ExtensionManager()
         self.policy_driver_manager = manager.PolicyDriverManager()
+        self.status_refresh_interval = (
+            cfg.CONF.group_policy.status_refresh_interval)
         super(GroupPolicyPlugin, self).__init__()
         self.extension_manager.initialize()
         self.policy_driver_manager.initialize()
+        # The API layer only issues bulk requests to the plugin when
+        # every policy driver can handle them.
+        self.__native_bulk_support = (
+            self.policy_driver_manager.native_bulk_support)
 
     def _filter_extended_result(self, result, filters):
         filters = filters or {}
@@ -463,8 +560,89 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             policy_target['policy_target'].update(
                 {'port_attributes': port_attributes})
 
+    def _create_bulk(self, resource, context, items):
+        # Resources other than policy_targets have no bulk driver
+        # hooks, so each item goes through the regular create workflow,
+        # and the ones already created are removed if a later one fails.
+        objects = []
+        try:
+            for item in items:
+                objects.append(getattr(self, 'create_' + resource)(
+                    context, item))
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                LOG.error("Bulk create of %(resource)s failed, deleting "
+                          "%(count)s already created",
+                          {'resource': resource, 'count': len(objects)})
+                for obj in reversed(objects):
+                    try:
+                        getattr(self, 'delete_' + resource)(
+                            context, obj['id'])
+                    except Exception:
+                        LOG.exception("Failed to delete %(resource)s %(id)s",
+                                      {'resource': resource,
+                                       'id': obj['id']})
+        return objects
+
     @log.log_method_call
     @n_utils.transaction_guard
+    def create_policy_target_bulk(self, context, policy_targets):
+        items = policy_targets['policy_targets']
+        if not self.policy_driver_manager.native_bulk_support:
+            return self._create_bulk('policy_target', context, items)
+        tenants = {}
+        for item in items:
+            tenants.setdefault(item['policy_target'].get('tenant_id'),
+                               item['policy_target'])
+        for resource in tenants.values():
+            self._ensure_tenant(context, resource)
+        created = []
+        try:
+            for start in range(0, len(items), PT_BULK_CHUNK_SIZE):
+                policy_contexts = self._create_policy_target_chunk(
+                    context, items[start:start + PT_BULK_CHUNK_SIZE])
+                created.extend(pc.current['id'] for pc in policy_contexts)
+                (self.policy_driver_manager.
+                 create_policy_target_bulk_postcommit(policy_contexts))
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                LOG.exception("create_policy_target_bulk failed, deleting "
+                              "policy_targets %s", created)
+                for pt_id in reversed(created):
+                    try:
+                        self.delete_policy_target(context, pt_id)
+                    except Exception:
+                        LOG.exception("Failed to delete policy_target %s",
+                                      pt_id)
+        pts = dict((pt['id'], pt) for pt in
+                   self.get_policy_targets(context, filters={'id': created}))
+        return [pts[pt_id] for pt_id in created]
+
+    @n_utils.transaction_guard
+    @db_api.retry_if_session_inactive()
+    def _create_policy_target_chunk(self, context, items):
+        # All the policy_targets of a chunk are added, and the drivers'
+        # precommit is run for them, in a single transaction.
+        policy_contexts = []
+        with db_api.CONTEXT_WRITER.using(context):
+            session = context.session
+            for policy_target in items:
+                self._add_fixed_ips_to_port_attributes(policy_target)
+                result = super(GroupPolicyPlugin, self).create_policy_target(
+                    context, policy_target)
+                self.extension_manager.process_create_policy_target(
+                    session, policy_target, result)
+                self._validate_shared_create(
+                    self, context, result, 'policy_target')
+                policy_contexts.append(
+                    p_context.PolicyTargetContext(self, context, result))
+            self.policy_driver_manager.create_policy_target_bulk_precommit(
+                policy_contexts)
+        return policy_contexts
+
+    @log.log_method_call
+    @gbp_utils.profiled
+    @n_utils.transaction_guard
     @db_api.retry_if_session_inactive()
     def create_policy_target(self, context, policy_target):
         self._ensure_tenant(context, policy_target['policy_target'])
@@ -559,6 +737,12 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             marker=marker, page_reverse=page_reverse)
 
     @log.log_method_call
+    def create_policy_target_group_bulk(self, context, policy_target_groups):
+        return self._create_bulk('policy_target_group', context,
+                                 policy_target_groups['policy_target_groups'])
+
+    @log.log_method_call
+    @gbp_utils.profiled
     @n_utils.transaction_guard
     @db_api.retry_if_session_inactive()
     def create_policy_target_group(self, context, policy_target_group):
@@ -707,6 +891,13 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             filters=filters, fields=fields, sorts=sorts, limit=limit,
             marker=marker, page_reverse=page_reverse)
 
+    @log.log_method_call
+    def create_application_policy_group_bulk(self, context,
+                                             application_policy_groups):
+        return self._create_bulk(
+            'application_policy_group', context,
+            application_policy_groups['application_policy_groups'])
+
     @log.log_method_call
     @n_utils.transaction_guard
     @db_api.retry_if_session_inactive()
@@ -815,6 +1006,11 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             'ApplicationPolicyGroupContext', filters=filters, fields=fields,
             sorts=sorts, limit=limit, marker=marker, page_reverse=page_reverse)
 
+    @log.log_method_call
+    def create_l2_policy_bulk(self, context, l2_policies):
+        return self._create_bulk('l2_policy', context,
+                                 l2_policies['l2_policies'])
+
     @log.log_method_call
     @n_utils.transaction_guard
     @db_api.retry_if_session_inactive()
@@ -905,6 +1101,13 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             filters=filters, fields=fields, sorts=sorts, limit=limit,
             marker=marker, page_reverse=page_reverse)
 
+    @log.log_method_call
+    def create_network_service_policy_bulk(self, context,
+                                           network_service_policies):
+        return self._create_bulk(
+            'network_service_policy', context,
+            network_service_policies['network_service_policies'])
+
     @log.log_method_call
     @n_utils.transaction_guard
     @db_api.retry_if_session_inactive()
@@ -1011,6 +1214,11 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             filters=filters, fields=fields, sorts=sorts, limit=limit,
             marker=marker, page_reverse=page_reverse)
 
+    @log.log_method_call
+    def create_l3_policy_bulk(self, context, l3_policies):
+        return self._create_bulk('l3_policy', context,
+                                 l3_policies['l3_policies'])
+
     @log.log_method_call
     @n_utils.transaction_guard
     @db_api.retry_if_session_inactive()
@@ -1110,6 +1318,11 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             filters=filters, fields=fields, sorts=sorts, limit=limit,
             marker=marker, page_reverse=page_reverse)
 
+    @log.log_method_call
+    def create_policy_classifier_bulk(self, context, policy_classifiers):
+        return self._create_bulk('policy_classifier', context,
+                                 policy_classifiers['policy_classifiers'])
+
     @log.log_method_call
     @n_utils.transaction_guard
     @db_api.retry_if_session_inactive()
@@ -1205,6 +1418,11 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             filters=filters, fields=fields, sorts=sorts, limit=limit,
             marker=marker, page_reverse=page_reverse)
 
+    @log.log_method_call
+    def create_policy_action_bulk(self, context, policy_actions):
+        return self._create_bulk('policy_action', context,
+                                 policy_actions['policy_actions'])
+
     @log.log_method_call
     @n_utils.transaction_guard
     @db_api.retry_if_session_inactive()
@@ -1299,6 +1517,11 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             filters=filters, fields=fields, sorts=sorts, limit=limit,
             marker=marker, page_reverse=page_reverse)
 
+    @log.log_method_call
+    def create_policy_rule_bulk(self, context, policy_rules):
+        return self._create_bulk('policy_rule', context,
+                                 policy_rules['policy_rules'])
+
     @log.log_method_call
     @n_utils.transaction_guard
     @db_api.retry_if_session_inactive()
@@ -1391,6 +1614,11 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             filters=filters, fields=fields, sorts=sorts, limit=limit,
             marker=marker, page_reverse=page_reverse)
 
+    @log.log_method_call
+    def create_policy_rule_set_bulk(self, context, policy_rule_sets):
+        return self._create_bulk('policy_rule_set', context,
+                                 policy_rule_sets['policy_rule_sets'])
+
     @log.log_method_call
     @n_utils.transaction_guard
     @db_api.retry_if_session_inactive()
@@ -1484,6 +1712,11 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             filters=filters, fields=fields, sorts=sorts, limit=limit,
             marker=marker, page_reverse=page_reverse)
 
+    @log.log_method_call
+    def create_external_segment_bulk(self, context, external_segments):
+        return self._create_bulk('external_segment', context,
+                                 external_segments['external_segments'])
+
     @log.log_method_call
     @n_utils.transaction_guard
     @db_api.retry_if_session_inactive()
@@ -1591,6 +1824,11 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             filters=filters, fields=fields, sorts=sorts, limit=limit,
             marker=marker, page_reverse=page_reverse)
 
+    @log.log_method_call
+    def create_external_policy_bulk(self, context, external_policies):
+        return self._create_bulk('external_policy', context,
+                                 external_policies['external_policies'])
+
     @log.log_method_call
     @n_utils.transaction_guard
     @db_api.retry_if_session_inactive()
@@ -1689,6 +1927,11 @@ class GroupPolicyPlugin(group_policy_mapping_db.GroupPolicyMappingDbPlugin):
             filters=filters, fields=fields, sorts=sorts, limit=limit,
             marker=marker, page_reverse=page_reverse)
 
+    @log.log_method_call
+    def create_nat_pool_bulk(self, context, nat_pools):
+        return self._create_bulk('nat_pool', context,
+                                 nat_pools['nat_pools'])
+
     @log.log_method_call
     @n_utils.transaction_guard
     @db_api.retry_if_session_inactive()
@@ -96,15 +96,16 @@ class PolicyDriverManager(stevedore.named.NamedExtensionManager):
 
     def initialize(self):
         # Group Policy bulk operations requires each driver to support them.
-        # However, this is currently not supported at the plugin level,
-        # so setting it to False. When the plugin does support it, we can
-        # set it to True such that the drivers can override it.
-        self.native_bulk_support = False
+        # Drivers derived from api.PolicyDriver inherit bulk methods that
+        # fall back to the per-resource ones, and can opt out by setting
+        # native_bulk_support to False.
+        self.native_bulk_support = True
         for driver in self.ordered_policy_drivers:
             LOG.info("Initializing policy driver '%s'", driver.name)
             driver.obj.initialize()
-            self.native_bulk_support &= getattr(driver.obj,
-                                                'native_bulk_support', True)
+            self.native_bulk_support &= getattr(
+                driver.obj, 'native_bulk_support',
+                isinstance(driver.obj, api.PolicyDriver))
 
     def _call_on_drivers(self, method_name, context=None,
                          continue_on_failure=False):
@@ -191,6 +192,13 @@ class PolicyDriverManager(stevedore.named.NamedExtensionManager):
     def create_policy_target_postcommit(self, context):
         self._call_on_drivers("create_policy_target_postcommit", context)
 
+    def create_policy_target_bulk_precommit(self, contexts):
+        self._call_on_drivers("create_policy_target_bulk_precommit", contexts)
+
+    def create_policy_target_bulk_postcommit(self, contexts):
+        self._call_on_drivers("create_policy_target_bulk_postcommit",
+                              contexts)
+
     def update_policy_target_precommit(self, context):
         self._call_on_drivers("update_policy_target_precommit", context)
 
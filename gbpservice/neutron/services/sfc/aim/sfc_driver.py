@@ -12,7 +12,6 @@
 
 import hashlib
 
-from aim import aim_manager
 from aim.api import resource as aim_resource
 from aim.api import service_graph as aim_sg
 from aim import context as aim_context
@@ -100,7 +99,7 @@ class SfcAIMDriver(SfcAIMDriverBase):
         self._aim_mech_driver = None
         self._aim_flowc_driver = None
         self.name_mapper = apic_mapper.APICNameMapper()
-        self.aim = aim_manager.AimManager()
+        self._aim = None
 
     @property
     def plugin(self):
@@ -150,6 +149,14 @@ class SfcAIMDriver(SfcAIMDriverBase):
                 raise exc.GroupPolicyDeploymentError()
         return self._aim_mech_driver
 
+    @property
+    def aim(self):
+        # Share the mechanism driver's AIM manager, so that objects it
+        # caches within a transaction see the writes made here.
+        if not self._aim:
+            self._aim = self.aim_mech.aim
+        return self._aim
+
     @property
     def aim_flowc(self):
         if not self._aim_flowc_driver:
@@ -729,6 +736,49 @@ class SfcAIMDriver(SfcAIMDriverBase):
             return self.sfc_plugin.get_port_chains(plugin_context,
                                                    filters={'id': chain_ids})
 
+    def _get_chain_ids_by_network_id(self, plugin_context, network_id,
+                                     include_groups=True):
+        """Return the IDs of the chains depending on a network.
+
+        These are the chains with a flow classifier whose source or
+        destination is the network and, if include_groups is set, the
+        chains with a port pair group having a port on it. Each set is
+        found with one joined query, rather than with a query per flow
+        classifier or port pair group. The classifier query matches on
+        the unindexed L7Parameter value, so it still scans that table.
+        """
+        session = plugin_context.session
+        query = BAKERY(lambda s: s.query(
+            sfc_db.ChainClassifierAssoc.portchain_id))
+        query += lambda q: q.join(
+            flowc_db.L7Parameter,
+            flowc_db.L7Parameter.classifier_id ==
+            sfc_db.ChainClassifierAssoc.flowclassifier_id)
+        query += lambda q: q.filter(
+            flowc_db.L7Parameter.keyword.in_(
+                sa.bindparam('keywords', expanding=True)))
+        query += lambda q: q.filter(
+            flowc_db.L7Parameter.value == sa.bindparam('network_id'))
+        chain_ids = set(x for x, in query(session).params(
+            keywords=[sfc_cts.LOGICAL_SRC_NET, sfc_cts.LOGICAL_DST_NET],
+            network_id=network_id).all())
+        if include_groups:
+            query = BAKERY(lambda s: s.query(
+                sfc_db.ChainGroupAssoc.portchain_id))
+            query += lambda q: q.join(
+                sfc_db.PortPair,
+                sfc_db.PortPair.portpairgroup_id ==
+                sfc_db.ChainGroupAssoc.portpairgroup_id)
+            query += lambda q: q.join(
+                models_v2.Port,
+                or_(models_v2.Port.id == sfc_db.PortPair.ingress,
+                    models_v2.Port.id == sfc_db.PortPair.egress))
+            query += lambda q: q.filter(
+                models_v2.Port.network_id == sa.bindparam('network_id'))
+            chain_ids.update(x for x, in query(session).params(
+                network_id=network_id).all())
+        return chain_ids
+
     def _get_groups_by_pair_id(self, plugin_context, pp_id):
         # NOTE(ivar): today, port pair can be associated only to one PPG
         context = plugin_context
@@ -739,6 +789,66 @@ class SfcAIMDriver(SfcAIMDriverBase):
                     plugin_context, filters={'id': [pp_db.portpairgroup_id]})
         return []
 
+    def _get_pair_group_ids_by_port_ids(self, plugin_context, port_ids):
+        """Map the port pairs using any of the ports to their group."""
+        if not port_ids:
+            return {}
+        query = BAKERY(lambda s: s.query(
+            sfc_db.PortPair.id, sfc_db.PortPair.portpairgroup_id))
+        query += lambda q: q.filter(
+            or_(sfc_db.PortPair.ingress.in_(
+                    sa.bindparam('ingress_ids', expanding=True)),
+                sfc_db.PortPair.egress.in_(
+                    sa.bindparam('egress_ids', expanding=True))))
+        return dict(query(plugin_context.session).params(
+            ingress_ids=port_ids, egress_ids=port_ids).all())
+
+    def _remap_port_pairs_by_port_ids(self, plugin_context, port_ids):
+        """Remap the chains using port pairs of the given bound ports.
+
+        The port pairs, the ports on their other side, their groups and
+        the chains of those groups are each fetched at once, and each
+        chain is remapped once, however many of its ports were bound.
+        """
+        ppg_id_by_pp_id = self._get_pair_group_ids_by_port_ids(
+            plugin_context, port_ids)
+        if not ppg_id_by_pp_id:
+            return
+        pps = self.sfc_plugin.get_port_pairs(
+            plugin_context, filters={'id': list(ppg_id_by_pp_id)})
+        port_ids = set(port_ids)
+        other_ids = set(pp[side] for pp in pps
+                        for side in ('ingress', 'egress')) - port_ids
+        others = []
+        if other_ids:
+            others = self.plugin.get_ports(plugin_context,
+                                           filters={'id': list(other_ids)})
+        # Only update if both ports are bound
+        ready_ids = port_ids | set(
+            other['id'] for other in others
+            if self.aim_mech._is_port_bound(other) and
+            other.get('status') == n_constants.PORT_STATUS_ACTIVE)
+        ppg_ids = set()
+        for pp in pps:
+            if pp['ingress'] in ready_ids and pp['egress'] in ready_ids:
+                d_ctx = sfc_ctx.PortPairContext(self.sfc_plugin,
+                                                plugin_context, pp, pp)
+                self._validate_port_pair(d_ctx)
+                if ppg_id_by_pp_id[pp['id']]:
+                    ppg_ids.add(ppg_id_by_pp_id[pp['id']])
+        if not ppg_ids:
+            return
+        for ppg in self.sfc_plugin.get_port_pair_groups(
+                plugin_context, filters={'id': list(ppg_ids)}):
+            g_ctx = sfc_ctx.PortPairGroupContext(self.sfc_plugin,
+                                                 plugin_context, ppg, ppg)
+            self._validate_port_pair_group(g_ctx)
+        for chain in self._get_chains_by_ppg_ids(plugin_context,
+                                                 list(ppg_ids)):
+            c_ctx = sfc_ctx.PortChainContext(self.sfc_plugin, plugin_context,
+                                             chain, chain)
+            self.update_port_chain_precommit(c_ctx, remap=True)
+
     def _get_group_ids_by_network_ids(self, plugin_context, network_ids):
         if not network_ids:
             return []
@@ -930,42 +1040,21 @@ class SfcAIMDriver(SfcAIMDriverBase):
                                          (c_bound != o_bound) or
                                          (c_active != o_active)):
                 LOG.debug("Update port pair for port %s", context.current)
-                pps = self.sfc_plugin.get_port_pairs(
-                    p_ctx, filters={'ingress': [port_id]})
-                pps.extend(self.sfc_plugin.get_port_pairs(
-                    p_ctx, filters={'egress': [port_id]}))
-                for pp in pps:
-                    # Only update if both ports are bound
-                    other = pp['ingress'] if pp['ingress'] != port_id else (
-                        pp['egress'])
-                    other = self.plugin.get_port(p_ctx, other)
-                    other_bound = self.aim_mech._is_port_bound(other)
-                    other_active = other.get(
-                        'status') == n_constants.PORT_STATUS_ACTIVE
-                    if other_bound and other_active:
-                        d_ctx = sfc_ctx.PortPairContext(self.sfc_plugin, p_ctx,
-                                                        pp, pp)
-                        self.update_port_pair_precommit(d_ctx, remap=True)
+                self._remap_port_pairs_by_port_ids(p_ctx, [port_id])
 
     @registry.receives(constants.GBP_NETWORK_EPG, [events.PRECOMMIT_UPDATE])
     @registry.receives(constants.GBP_NETWORK_VRF, [events.PRECOMMIT_UPDATE])
     def _handle_net_gbp_change(self, rtype, event, trigger, payload):
         context = payload.context
         network_id = payload.metadata['network_id']
-        chains = {}
-        ppg_ids = self._get_group_ids_by_network_ids(context, [network_id])
-        flowc_ids = self.aim_flowc._get_classifiers_by_network_id(
-            context, network_id)
-        for flowc_id in flowc_ids:
-            for chain in self._get_chains_by_classifier_id(context,
-                                                           flowc_id):
-                chains[chain['id']] = chain
-        if rtype == constants.GBP_NETWORK_VRF:
-            # Don't need to check PPGs if the EPG is changing
-            for ppg_id in ppg_ids:
-                for chain in self._get_chains_by_ppg_ids(context, [ppg_id]):
-                    chains[chain['id']] = chain
-        for chain in list(chains.values()):
+        # Don't need to check PPGs if the EPG is changing
+        chain_ids = self._get_chain_ids_by_network_id(
+            context, network_id,
+            include_groups=rtype == constants.GBP_NETWORK_VRF)
+        if not chain_ids:
+            return
+        for chain in self.sfc_plugin.get_port_chains(
+                context, filters={'id': list(chain_ids)}):
             flowcs, ppgs = self._get_pc_flowcs_and_ppgs(context, chain)
             self._validate_port_chain(context, chain, flowcs, ppgs)
 
@@ -986,6 +1075,8 @@ class SfcAIMDriver(SfcAIMDriverBase):
         ports = self.plugin.get_ports(context,
                                       filters={'id': list(cdi_by_port.keys())})
         networks_map = {x[0]['id']: x[1] for x in networks_map}
+        # The path only depends on the port's network.
+        path_by_network = {}
 
         for port in ports:
             if port['network_id'] not in networks_map:
@@ -994,9 +1085,13 @@ class SfcAIMDriver(SfcAIMDriverBase):
                             "associated to it.",
                             {'port': port['id'], 'host': host})
                 continue
-            hlinks = self.aim_mech._filter_host_links_by_segment(
-                context.session, networks_map[port['network_id']], host_links)
-            path = '' if not hlinks else hlinks[0].path
+            path = path_by_network.get(port['network_id'])
+            if path is None:
+                hlinks = self.aim_mech._filter_host_links_by_segment(
+                    context.session, networks_map[port['network_id']],
+                    host_links)
+                path = '' if not hlinks else hlinks[0].path
+                path_by_network[port['network_id']] = path
             for cdi in cdi_by_port.get(port['id']):
                 self.aim.update(aim_ctx, cdi, path=path)
 
@@ -0,0 +1,213 @@
+# Copyright (c) 2026 Cisco Systems Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark apic_aim hot paths on sqlite.
+
+Sets up the ML2Plus plugin with the apic_aim mechanism driver the way
+the unit tests do: Neutron's and AIM's tables live in an in-memory
+sqlite database, and AIM is driven through its own manager without an
+APIC. A synthetic topology is then seeded, with the given number of
+tenants, networks per tenant and ports per network, spread over a
+number of hosts each running an OpFlex agent, and the following are
+timed:
+
+- an endpoint details RPC (request_endpoint_details) for every port,
+- creating and then deleting security group rules one at a time,
+- read-only runs of the AIM validation tool.
+
+The latency percentiles and the number of SQL statements executed are
+printed for each operation. This builds on the unit test base
+classes, so it lives with the unit tests and needs their requirements
+installed.
+
+    python -m \\
+        gbpservice.neutron.tests.unit.plugins.ml2plus.benchmark_apic_aim \\
+        --tenants 2 --networks 4 --ports 10 --hosts 4 --sg-rules 50
+"""
+
+import argparse
+import sys
+import time
+import unittest
+
+from neutron_lib import constants as n_constants
+from neutron_lib import context as n_context
+import sqlalchemy as sa
+
+from gbpservice.neutron.tests.unit.plugins.ml2plus import (
+    test_apic_aim as test_aim)
+
+PERCENTILES = (50, 90, 99)
+
+
+class QueryCounter(object):
+    """Counts the SQL statements executed by any engine while active."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __enter__(self):
+        sa.event.listen(sa.engine.Engine, 'before_cursor_execute',
+                        self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        sa.event.remove(sa.engine.Engine, 'before_cursor_execute',
+                        self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+class Operation(object):
+    """Latencies and statement counts of one benchmarked operation."""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.queries = []
+
+    def measure(self, func, *args, **kwargs):
+        with QueryCounter() as counter:
+            started = time.time()
+            result = func(*args, **kwargs)
+            self.latencies.append(time.time() - started)
+        self.queries.append(counter.count)
+        return result
+
+    @staticmethod
+    def _percentile(values, percent):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, len(ordered) * percent // 100)]
+
+    def report(self):
+        if not self.latencies:
+            return "%-22s no samples" % self.name
+        latencies = ' '.join(
+            "p%d=%.1fms" % (percent,
+                            self._percentile(self.latencies, percent) * 1000)
+            for percent in PERCENTILES)
+        return ("%-22s n=%-5d %s max=%.1fms queries: mean=%.1f max=%d" %
+                (self.name, len(self.latencies), latencies,
+                 max(self.latencies) * 1000,
+                 float(sum(self.queries)) / len(self.queries),
+                 max(self.queries)))
+
+
+class ApicAimBenchmark(test_aim.ApicAimTestCase):
+
+    # Set by main() before the case is run.
+    args = None
+
+    def run_benchmark(self):
+        self.operations = []
+        ports = self._seed_topology()
+        self._benchmark_endpoint_details(ports)
+        self._benchmark_sg_rules()
+        self._benchmark_validation()
+
+    def _seed_topology(self):
+        args = self.args
+        hosts = ['host-%d' % i for i in range(args.hosts)]
+        for host in hosts:
+            self._register_agent(host, test_aim.AGENT_CONF_OPFLEX)
+        ports = []
+        for t in range(args.tenants):
+            project_id = 'bench-tenant-%d' % t
+            for n in range(args.networks):
+                net = self._make_network(
+                    self.fmt, 'bench-net-%d' % n, True,
+                    project_id=project_id, as_admin=True)
+                self._make_subnet(
+                    self.fmt, net, '10.%d.%d.1' % (t, n),
+                    '10.%d.%d.0/24' % (t, n), project_id=project_id,
+                    as_admin=True)
+                for p in range(args.ports):
+                    port = self._make_port(
+                        self.fmt, net['network']['id'], as_admin=True,
+                        project_id=project_id)['port']
+                    host = hosts[len(ports) % len(hosts)]
+                    self._bind_port_to_host(port['id'], host)
+                    ports.append((port['id'], host))
+        return ports
+
+    def _benchmark_endpoint_details(self, ports):
+        op = Operation('endpoint details')
+        self.operations.append(op)
+        for port_id, host in ports:
+            request = {'device': 'tap' + port_id,
+                       'timestamp': 0,
+                       'request_id': 'bench-%s' % port_id}
+            op.measure(self.driver.request_endpoint_details,
+                       n_context.get_admin_context(), request=request,
+                       host=host)
+
+    def _benchmark_sg_rules(self):
+        create_op = Operation('sg rule create')
+        delete_op = Operation('sg rule delete')
+        self.operations.extend([create_op, delete_op])
+        sg_id = self._make_security_group(
+            self.fmt, 'bench-sg', 'benchmark')['security_group']['id']
+        rule_ids = []
+        for i in range(self.args.sg_rules):
+            port = str(1024 + i)
+            rule = self._build_security_group_rule(
+                sg_id, 'ingress', n_constants.PROTO_NAME_TCP, port, port,
+                remote_ip_prefix='10.0.0.0/8', remote_group_id=None,
+                ethertype=n_constants.IPv4)
+            rule_ids.append(create_op.measure(
+                self._make_security_group_rule, self.fmt,
+                {'security_group_rules': [rule['security_group_rule']]}
+            )['security_group_rules'][0]['id'])
+        for rule_id in rule_ids:
+            delete_op.measure(self._delete, 'security-group-rules', rule_id)
+
+    def _benchmark_validation(self):
+        op = Operation('validation')
+        self.operations.append(op)
+        for i in range(self.args.validations):
+            op.measure(self.validation_mgr.validate)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tenants', type=int, default=2)
+    parser.add_argument('--networks', type=int, default=4,
+                        help="Networks per tenant")
+    parser.add_argument('--ports', type=int, default=10,
+                        help="Ports per network")
+    parser.add_argument('--hosts', type=int, default=4)
+    parser.add_argument('--sg-rules', type=int, default=50)
+    parser.add_argument('--validations', type=int, default=3)
+    return parser.parse_args(argv)
+
+
+def main():
+    ApicAimBenchmark.args = parse_args()
+
+    case = ApicAimBenchmark('run_benchmark')
+    result = unittest.TestResult()
+    case.run(result)
+    for _, trace in result.errors + result.failures:
+        print(trace)
+    if not result.wasSuccessful():
+        return 1
+    for op in case.operations:
+        print(op.report())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -69,14 +69,19 @@ from gbpservice.neutron.db import api as db_api
 from gbpservice.neutron.extensions import cisco_apic_l3 as l3_ext
 from gbpservice.neutron.plugins.ml2plus.drivers.apic_aim import (  # noqa
     config as aimcfg)
+from gbpservice.neutron.plugins.ml2plus.drivers.apic_aim import (
+    distributed_snat_helper as dsh)
 from gbpservice.neutron.plugins.ml2plus.drivers.apic_aim import (
     extension_db as extn_db)
 from gbpservice.neutron.plugins.ml2plus.drivers.apic_aim import (
     mechanism_driver as md)
 from gbpservice.neutron.plugins.ml2plus.drivers.apic_aim import apic_mapper
+from gbpservice.neutron.plugins.ml2plus.drivers.apic_aim import cache
 from gbpservice.neutron.plugins.ml2plus.drivers.apic_aim import data_migrations
 from gbpservice.neutron.plugins.ml2plus.drivers.apic_aim import db
 from gbpservice.neutron.plugins.ml2plus.drivers.apic_aim import exceptions
+from gbpservice.neutron.plugins.ml2plus.drivers.apic_aim import (
+    rpc as apic_rpc)
 from gbpservice.neutron.services.grouppolicy import (
     group_policy_driver_api as pd_api)
 from gbpservice.neutron.services.grouppolicy.drivers.cisco.apic import (
@@ -251,6 +256,8 @@ class ApicAimTestMixin(object):
             aim_context.AimContext(db_session=session), '')
         self.aim_cfg_manager.replace_all(aim_cfg.CONF)
         data_migrations.do_hpp_insertion(session)
+        extn_db.SETTINGS.clear()
+        extn_db.DIST_SNAT_SERVICE_NODES.clear()
 
     def set_override(self, item, value, group=None, host=''):
         # Override DB config as well
@@ -792,6 +799,40 @@ class TestRpcListeners(ApicAimTestCase):
             self.assertIn('apic-service', topics)
             self.assertIn('opflex', topics)
 
+    def test_ensure_static_resources_once(self):
+        # The static resources were ensured when the test case was set
+        # up, so they are not ensured again at the same version.
+        with db_api.CONTEXT_READER.using(self.db_session):
+            self.assertEqual(
+                md.STATIC_RESOURCES_VERSION,
+                self.driver._get_static_resources_version(
+                    self.db_session, self.driver.apic_system_id))
+        with mock.patch.object(
+                self.driver, '_ensure_common_tenant') as ensure_tenant:
+            self.driver._ensure_static_resources()
+            ensure_tenant.assert_not_called()
+
+        # They are ensured again if the unrouted VRF was removed from
+        # AIM, even at the same version.
+        aim_ctx = aim_context.AimContext(self.db_session)
+        self.aim_mgr.delete(aim_ctx, self.driver._map_unrouted_vrf())
+        self.driver._ensure_static_resources()
+        self.assertIsNotNone(
+            self.aim_mgr.get(aim_ctx, self.driver._map_unrouted_vrf()))
+
+        # A new version ensures them again.
+        with mock.patch.object(md, 'STATIC_RESOURCES_VERSION',
+                               md.STATIC_RESOURCES_VERSION + 1):
+            with mock.patch.object(
+                    self.driver, '_ensure_common_tenant') as ensure_tenant:
+                self.driver._ensure_static_resources()
+                ensure_tenant.assert_called_once_with(mock.ANY)
+            with db_api.CONTEXT_READER.using(self.db_session):
+                self.assertEqual(
+                    md.STATIC_RESOURCES_VERSION,
+                    self.driver._get_static_resources_version(
+                        self.db_session, self.driver.apic_system_id))
+
     def test_opflex_endpoint(self):
         self.plugin.start_rpc_listeners()
         endpoint = self.driver._opflex_endpoint
@@ -1894,6 +1935,43 @@ class TestAimMapping(ApicAimTestCase):
         self._sg_should_not_exist(sg_id)
         self._sg_rule_should_not_exist(sg_rule['id'])
 
+    def test_security_group_rule_bulk_create(self):
+        sg = self._make_security_group(self.fmt,
+                                       'sg1', 'test')['security_group']
+        sg_id = sg['id']
+        remote_sg_id = self._make_security_group(
+            self.fmt, 'sg2', 'test')['security_group']['id']
+
+        rules = []
+        for direction, proto, port_min, port_max, prefix, remote_sg in [
+                ('ingress', n_constants.PROTO_NAME_TCP, '22', '23',
+                 '1.1.1.1/0', None),
+                ('egress', n_constants.PROTO_NAME_UDP, '53', '53',
+                 '2.2.2.0/24', None),
+                ('ingress', n_constants.PROTO_NAME_TCP, '80', '80',
+                 None, remote_sg_id),
+                ('ingress', n_constants.PROTO_NAME_ICMP, None, None,
+                 None, remote_sg_id)]:
+            rules.append(self._build_security_group_rule(
+                sg_id, direction, proto, port_min, port_max,
+                remote_ip_prefix=prefix, remote_group_id=remote_sg,
+                ethertype=n_constants.IPv4)['security_group_rule'])
+
+        # All the rules are passed to the mechanism driver at once.
+        with mock.patch.object(
+                self.driver, 'create_security_group_rule_bulk_precommit',
+                wraps=self.driver.create_security_group_rule_bulk_precommit
+        ) as bulk_precommit:
+            sg_rules = self._make_security_group_rule(
+                self.fmt, {'security_group_rules': rules}
+            )['security_group_rules']
+        self.assertEqual(1, bulk_precommit.call_count)
+        self.assertEqual(4, len(bulk_precommit.call_args[0][0]))
+
+        self.assertEqual(4, len(sg_rules))
+        for sg_rule in sg_rules:
+            self._check_sg_rule(sg_id, sg_rule)
+
     def test_multi_nets_ext_network(self):
         l3out = aim_resource.L3Outside(tenant_name=self.t1_aname, name='l1')
 
@@ -4504,6 +4582,92 @@ class TestAimMapping(ApicAimTestCase):
         dhcp_agt_mock.stop()
 
 
+class TestAimObjectCache(ApicAimTestCase):
+
+    def test_objects_cached_within_transaction(self):
+        aim_mgr = self.driver.aim
+        ctx = n_context.get_admin_context()
+        tenant = aim_resource.Tenant(name='t1')
+        with db_api.CONTEXT_WRITER.using(ctx):
+            aim_ctx = aim_context.AimContext(ctx.session)
+            self.assertIsNone(aim_mgr.get(aim_ctx, tenant))
+            aim_mgr.create(aim_ctx, tenant)
+
+            # Create invalidates the cached miss.
+            fetched = aim_mgr.get(aim_ctx, tenant)
+            self.assertEqual('t1', fetched.name)
+            self.assertEqual(0, aim_mgr.get_saved_round_trips(aim_ctx))
+
+            # Callers get copies of cached objects.
+            fetched.descr = 'changed'
+            self.assertEqual('', aim_mgr.get(aim_ctx, tenant).descr)
+            self.assertEqual(1, aim_mgr.get_saved_round_trips(aim_ctx))
+
+            # Update invalidates both get and find results.
+            self.assertEqual(
+                1, len(aim_mgr.find(aim_ctx, aim_resource.Tenant,
+                                    name='t1')))
+            aim_mgr.update(aim_ctx, tenant, descr='updated')
+            self.assertEqual('updated', aim_mgr.get(aim_ctx, tenant).descr)
+            self.assertEqual('updated', aim_mgr.find(
+                aim_ctx, aim_resource.Tenant, name='t1')[0].descr)
+            aim_mgr.find(aim_ctx, aim_resource.Tenant, name='t1')
+            self.assertEqual(2, aim_mgr.get_saved_round_trips(aim_ctx))
+
+        # The cache does not outlive the transaction.
+        with db_api.CONTEXT_READER.using(ctx):
+            aim_ctx = aim_context.AimContext(ctx.session)
+            self.assertEqual(0, aim_mgr.get_saved_round_trips(aim_ctx))
+            self.assertEqual('updated', aim_mgr.get(aim_ctx, tenant).descr)
+
+    def test_hpp_normalized_cached(self):
+        ctx = n_context.get_admin_context()
+        with mock.patch.object(
+                extn_db.SETTINGS, '_loaders',
+                {extn_db.HPP_NORMALIZED: (
+                    mock.Mock(wraps=extn_db._load_hpp_normalized),
+                    True)}):
+            loader = extn_db.SETTINGS._loaders[extn_db.HPP_NORMALIZED][0]
+
+            # Non-final values are only loaded once per transaction.
+            with db_api.CONTEXT_READER.using(ctx):
+                self.assertFalse(self.driver.get_hpp_normalized(ctx.session))
+                self.assertFalse(self.driver.get_hpp_normalized(ctx.session))
+            self.assertEqual(1, loader.call_count)
+            with db_api.CONTEXT_READER.using(ctx):
+                self.assertFalse(self.driver.get_hpp_normalized(ctx.session))
+            self.assertEqual(2, loader.call_count)
+
+            # The change is seen within its transaction and after it.
+            with db_api.CONTEXT_WRITER.using(ctx):
+                self.driver.set_hpp_normalized(ctx.session, True)
+                self.assertTrue(self.driver.get_hpp_normalized(ctx.session))
+            self.assertEqual(3, loader.call_count)
+
+            # The final value is cached for the process.
+            with db_api.CONTEXT_READER.using(ctx):
+                self.assertTrue(self.driver.get_hpp_normalized(ctx.session))
+            with db_api.CONTEXT_READER.using(ctx):
+                self.assertTrue(self.driver.get_hpp_normalized(ctx.session))
+            self.assertEqual(4, loader.call_count)
+
+    def test_global_setting_none_not_final(self):
+        # A setting registered without a final value is reloaded once
+        # expired, even when it loaded None.
+        cfg.CONF.set_override('global_settings_cache_max_age', 0,
+                              group='ml2_apic_aim')
+        settings = cache.GlobalSettingsCache()
+        loader = mock.Mock(return_value=None)
+        settings.register('setting', loader)
+        ctx = n_context.get_admin_context()
+        with db_api.CONTEXT_READER.using(ctx):
+            self.assertIsNone(settings.get(ctx.session, 'setting'))
+        self.assertEqual(1, loader.call_count)
+        with db_api.CONTEXT_READER.using(ctx):
+            self.assertIsNone(settings.get(ctx.session, 'setting'))
+        self.assertEqual(2, loader.call_count)
+
+
 class TestTrackedResources(tr_res.TestTrackedResources, ApicAimTestCase):
 
     def setUp(self, **kwargs):
@@ -6139,6 +6303,84 @@ class TestPortBinding(ApicAimTestCase):
             'port_filter': False, 'ovs_hybrid_plug': False})
         self.assertEqual(vif_details, port['binding:vif_details'])
 
+    def test_bind_opflex_agent_cached(self):
+        self._register_agent('host1', AGENT_CONF_OPFLEX)
+        net = self._make_network(self.fmt, 'net1', True)
+        self._make_subnet(self.fmt, net, '10.0.1.1', '10.0.1.0/24')
+        net_id = net['network']['id']
+        port0_id = self._make_port(self.fmt, net_id)['port']['id']
+        port1_id = self._make_port(self.fmt, net_id)['port']['id']
+        port2_id = self._make_port(self.fmt, net_id)['port']['id']
+        bindings = self.driver._binding_latency.count
+
+        # The host's agents are not cached by default.
+        self._bind_port_to_host(port0_id, 'host1')
+        self.assertNotIn('host1', self.driver._host_agents_cache)
+
+        cfg.CONF.set_override('agent_cache_ttl', 5, group='ml2_apic_aim')
+        port = self._bind_port_to_host(port1_id, 'host1')['port']
+        self.assertEqual('ovs', port['binding:vif_type'])
+        self.assertIn('host1', self.driver._host_agents_cache)
+
+        # The host's agents are reused for the next binding.
+        with mock.patch.object(self.plugin, 'get_agents',
+                               wraps=self.plugin.get_agents) as get_agents:
+            port = self._bind_port_to_host(port2_id, 'host1')['port']
+            self.assertEqual('ovs', port['binding:vif_type'])
+            self.assertFalse(any(
+                call[1].get('filters', {}).get('agent_type') ==
+                md.BINDING_AGENT_TYPES
+                for call in get_agents.call_args_list))
+
+        # An agent state report drops them.
+        self._register_agent('host1', AGENT_CONF_OPFLEX)
+        self.assertNotIn('host1', self.driver._host_agents_cache)
+
+        self.assertGreaterEqual(self.driver._binding_latency.count,
+                                bindings + 2)
+        self.assertEqual(
+            self.driver._binding_latency.count,
+            sum(self.driver.get_binding_latency_histogram().values()))
+
+    def test_request_endpoint_details_profiled(self):
+        self._register_agent('host1', AGENT_CONF_OPFLEX)
+        net = self._make_network(self.fmt, 'net1', True)
+        self._make_subnet(self.fmt, net, '10.0.1.1', '10.0.1.0/24')
+        port_id = self._make_port(self.fmt, net['network']['id'])['port']['id']
+        self._bind_port_to_host(port_id, 'host1')
+        name = ('gbpservice.neutron.plugins.ml2plus.drivers.apic_aim.rpc.'
+                'ApicRpcHandlerMixin._request_endpoint_details')
+        self.addCleanup(g_utils.clear_operation_stats)
+        g_utils.clear_operation_stats()
+
+        def request_details():
+            return self.driver.request_endpoint_details(
+                n_context.get_admin_context(),
+                request={'device': 'tap%s' % port_id, 'timestamp': 0,
+                         'request_id': 'request_id'},
+                host='host1')
+
+        # Nothing is measured by default.
+        with mock.patch.object(g_utils.LOG, 'warning') as warning:
+            request_details()
+            warning.assert_not_called()
+        self.assertEqual({}, g_utils.get_operation_stats())
+
+        # Exceeding the query threshold logs the call and counts it.
+        cfg.CONF.set_override('slow_operation_queries', 1,
+                              group='gbp_profiling')
+        cfg.CONF.set_override('collect_operation_stats', True,
+                              group='gbp_profiling')
+        with mock.patch.object(g_utils.LOG, 'warning') as warning:
+            request_details()
+            self.assertTrue(any(call[0][1]['operation'] == name
+                                for call in warning.call_args_list))
+        stats = g_utils.get_operation_stats()[name]
+        self.assertEqual(1, stats['calls'])
+        self.assertEqual(1, stats['slow_calls'])
+        self.assertGreater(stats['queries'], 1)
+        self.assertEqual(1, sum(stats['latency'].values()))
+
     def test_dualstack_svi_opflex_agent(self):
         with db_api.CONTEXT_READER.using(self.db_session):
             aim_ctx = aim_context.AimContext(self.db_session)
@@ -8394,6 +8636,51 @@ class TestExtensionAttributes(ApicAimTestCase):
         self.assertEqual(5499, mapping.end_port)
         self.assertEqual('port-1', mapping.service_port_id)
 
+    def test_dist_snat_port_range_bitmap(self):
+        bitmap = dsh.DistSnatPortRangeBitmap(5000, 6999, 500)
+        self.assertEqual(4, bitmap.slot_count)
+        # A mapping from an older, larger alloc_size covers two slots.
+        bitmap.mark_used(5000, 5999)
+        self.assertEqual(2, bitmap.first_free())
+        self.assertEqual(3, bitmap.first_free(3))
+        self.assertEqual(2, bitmap.first_free(1))
+        bitmap.mark_used(*bitmap.slot_range(2))
+        self.assertEqual((6500, 6999), bitmap.slot_range(
+            bitmap.first_free(2)))
+        bitmap.mark_used(6500, 6999)
+        self.assertIsNone(bitmap.first_free())
+
+    def test_dist_snat_port_range_allocation_fills_range(self):
+        ctx = n_context.get_admin_context()
+        net = self._make_network(self.fmt, 'net1', True)['network']
+        subnet = self._make_subnet(
+            self.fmt, {'network': net}, '10.0.0.1',
+            '10.0.0.0/24')['subnet']
+        # Room for exactly 32 port ranges.
+        gw_info = {'snat_ip': '66.66.66.7',
+                   'snat_subnet_id': subnet['id'],
+                   'start_port': 1024,
+                   'end_port': 1024 + 32 * 64 - 1,
+                   'alloc_size': 64}
+        hosts = ['host-%d' % i for i in range(32)]
+        for host in hosts:
+            self.assertIsNotNone(
+                self.driver._get_or_allocate_dist_snat_port_range(
+                    ctx, gw_info, host, 'port-' + host))
+        self.assertIsNone(
+            self.driver._get_or_allocate_dist_snat_port_range(
+                ctx, gw_info, 'host-32', 'port-host-32'))
+
+        with db_api.CONTEXT_READER.using(ctx):
+            mappings = self.driver.get_dist_snat_mappings(
+                ctx.session, snat_ip='66.66.66.7')
+        self.assertEqual(set(hosts), set(m.host_name for m in mappings))
+        ranges = sorted((m.start_port, m.end_port) for m in mappings)
+        self.assertEqual(32, len(ranges))
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertLess(end, start)
+        self.assertLessEqual(ranges[-1][1], gw_info['end_port'])
+
     def test_dist_snat_service_port_delete_releases_mapping(self):
         ctx = n_context.get_admin_context()
         extn = extn_db.ExtensionDbMixin()
@@ -11152,6 +11439,116 @@ class TestSnatIpAllocation(ApicAimTestCase):
                           'gateway_ip': '200.100.100.1',
                           'prefixlen': 28}, alloc)
 
+    def test_preallocate_snat_ips(self):
+        admin_ctx = n_context.get_admin_context()
+        ext_net = self._make_ext_network('ext-net1',
+                                         dn=self.dn_t1_l1_n1)
+        sub1 = self._make_subnet(
+            self.fmt, {'network': ext_net}, '100.100.100.1',
+            '100.100.100.0/29')['subnet']
+        self._update('subnets', sub1['id'],
+                     {'subnet': {SNAT_POOL: True}})
+        alloc = self.driver.get_or_allocate_snat_ip(admin_ctx, 'h0', ext_net)
+
+        # Only the hosts without an SNAT IP are allocated, in one batch.
+        with mock.patch.object(
+                self.plugin, 'create_port_bulk',
+                wraps=self.plugin.create_port_bulk) as create_port_bulk:
+            allocs = self.driver.preallocate_snat_ips(
+                admin_ctx, ['h0', 'h1', 'h2'], ext_net)
+        create_port_bulk.assert_called_once()
+        self.assertEqual(2, len(create_port_bulk.call_args[0][1]['ports']))
+        self.assertEqual(alloc, allocs['h0'])
+        for host in ['h1', 'h2']:
+            self._check_ip_in_cidr(allocs[host]['host_snat_ip'],
+                                   sub1['cidr'])
+            self.assertEqual(allocs[host],
+                             self.driver.get_or_allocate_snat_ip(
+                                 admin_ctx, host, ext_net))
+
+        # A second SNAT port cannot be created for the same host.
+        attrs = self.driver._make_snat_port_attrs(
+            'h1', ext_net, mock.Mock(id=sub1['id']))
+        self.assertRaises(n_exceptions.MultipleExceptions,
+                          self.plugin.create_port, admin_ctx,
+                          {'port': attrs})
+
+        # Set the gateway of a router with a port bound to a host, and
+        # check that the host's SNAT IP is allocated.
+        cfg.CONF.set_override('preallocate_snat_ips', True,
+                              group='ml2_apic_aim')
+        net = self._make_network(self.fmt, 'net1', True)['network']
+        sub = self._make_subnet(
+            self.fmt, {'network': net}, '10.0.0.1', '10.0.0.0/24')['subnet']
+        rtr = self._make_router(
+            self.fmt, net['tenant_id'], 'router1')['router']
+        self._router_interface_action('add', rtr['id'], sub['id'], None)
+        port = self._make_port(self.fmt, net['id'])['port']
+        self._bind_port_to_host(port['id'], 'h3')
+        self._update('routers', rtr['id'],
+                     {'router': {'external_gateway_info':
+                                 {'network_id': ext_net['id']}}})
+        self.assertEqual(
+            ['h3'],
+            list(self.driver._get_snat_ip_allocations(
+                admin_ctx.session, ext_net['id'], ['h3'])))
+
+        # No SNAT IPs are allocated for a router without SNAT.
+        net = self._make_network(self.fmt, 'net2', True)['network']
+        sub = self._make_subnet(
+            self.fmt, {'network': net}, '10.0.1.1', '10.0.1.0/24')['subnet']
+        rtr = self._make_router(
+            self.fmt, net['tenant_id'], 'router2')['router']
+        self._router_interface_action('add', rtr['id'], sub['id'], None)
+        port = self._make_port(self.fmt, net['id'])['port']
+        self._bind_port_to_host(port['id'], 'h4')
+        self.l3_plugin.update_router(
+            admin_ctx, rtr['id'],
+            {'router': {'external_gateway_info':
+                        {'network_id': ext_net['id'],
+                         'enable_snat': False}}})
+        self.assertEqual(
+            {},
+            self.driver._get_snat_ip_allocations(
+                admin_ctx.session, ext_net['id'], ['h4']))
+
+    def test_snat_port_owner_update(self):
+        admin_ctx = n_context.get_admin_context()
+        ext_net = self._make_ext_network('ext-net1',
+                                         dn=self.dn_t1_l1_n1)
+        sub1 = self._make_subnet(
+            self.fmt, {'network': ext_net}, '100.100.100.1',
+            '100.100.100.0/29')['subnet']
+        self._update('subnets', sub1['id'],
+                     {'subnet': {SNAT_POOL: True}})
+        alloc = self.driver.get_or_allocate_snat_ip(admin_ctx, 'h1', ext_net)
+        port = self.plugin.get_ports(
+            admin_ctx, filters={'device_id': ['h1']})[0]
+
+        # Moving the SNAT port to another host moves its owner, so the
+        # original host can be allocated a new one.
+        self.plugin.update_port(admin_ctx, port['id'],
+                                {'port': {'device_id': 'h2'}})
+        self.assertIsNone(self.driver._get_snat_port_owner(
+            admin_ctx.session, ext_net['id'], 'h1'))
+        self.assertEqual(port['id'], self.driver._get_snat_port_owner(
+            admin_ctx.session, ext_net['id'], 'h2').port_id)
+        self.assertEqual(alloc, self.driver.get_or_allocate_snat_ip(
+            admin_ctx, 'h2', ext_net))
+        self.assertNotEqual(alloc, self.driver.get_or_allocate_snat_ip(
+            admin_ctx, 'h1', ext_net))
+
+        # The port cannot be moved to a host that already has one.
+        self.assertRaises(n_exceptions.MultipleExceptions,
+                          self.plugin.update_port, admin_ctx, port['id'],
+                          {'port': {'device_id': 'h1'}})
+
+        # A port that is no longer an SNAT port has no owner.
+        self.plugin.update_port(admin_ctx, port['id'],
+                                {'port': {'device_owner': 'compute:'}})
+        self.assertIsNone(self.driver._get_snat_port_owner(
+            admin_ctx.session, ext_net['id'], 'h2'))
+
     def test_snat_pool_flag_update_no_ip(self):
         ext_net = self._make_ext_network('ext-net1',
                                          dn=self.dn_t1_l1_n1)
@@ -11314,6 +11711,31 @@ class TestSnatIpAllocation(ApicAimTestCase):
             fip = self._make_floatingip(self.fmt, ext_net['id'])['floatingip']
             self.assertTrue(fip['floating_ip_address'] in ips)
 
+    def test_floatingip_alloc_prefers_free_subnet(self):
+        ext_net = self._make_ext_network('ext-net1',
+                                         dn=self.dn_t1_l1_n1)
+        small_sub = self._make_subnet(
+            self.fmt, {'network': ext_net}, '200.100.100.1',
+            '200.100.100.0/29')['subnet']
+        large_sub = self._make_subnet(
+            self.fmt, {'network': ext_net}, '250.100.100.1',
+            '250.100.100.0/28')['subnet']
+
+        # Leave a single free address in the small subnet.
+        for x in range(0, 4):
+            fip = self._create_floatingip(self.fmt, ext_net['id'],
+                                          subnet_id=small_sub['id'])
+            self.assertEqual(201, fip.status_int)
+
+        ctx = n_context.get_admin_context()
+        with db_api.CONTEXT_READER.using(ctx):
+            self.assertEqual(
+                [large_sub['id'], small_sub['id']],
+                self.driver.get_subnets_for_fip(
+                    ctx, {'floating_network_id': ext_net['id']}))
+        fip = self._make_floatingip(self.fmt, ext_net['id'])['floatingip']
+        self._check_ip_in_cidr(fip['floating_ip_address'], large_sub['cidr'])
+
 
 class TestPortVlanNetwork(ApicAimTestCase):
 
@@ -11773,6 +12195,67 @@ class TestPortVlanNetwork(ApicAimTestCase):
         self._test_multiple_ports_on_host(is_svi=True)
         self._test_multiple_ports_on_host(is_svi=True, bgp_enabled=True)
 
+    def _test_static_path_kept_for_other_port_on_host(self, is_svi=False):
+        with db_api.CONTEXT_READER.using(self.db_session):
+            aim_ctx = aim_context.AimContext(self.db_session)
+        hlink2 = aim_infra.HostLink(
+            host_name='h2',
+            interface_name='eth0',
+            path='topology/pod-1/paths-201/pathep-[eth1/19]')
+        self.aim_mgr.create(aim_ctx, hlink2)
+        self._register_agent('h2', AGENT_CONF_OVS)
+
+        if is_svi:
+            net1 = self._make_network(self.fmt, 'net1', True,
+                                      arg_list=self.extension_attributes,
+                                      **{'apic:svi': 'True'})['network']
+            ext_net = aim_resource.ExternalNetwork.from_dn(
+                net1[DN]['ExternalNetwork'])
+        else:
+            net1 = self._make_network(self.fmt, 'net1', True)['network']
+            epg = self.aim_mgr.get(aim_ctx, self._net_2_epg(net1))
+
+        def get_path(hlink):
+            if is_svi:
+                return self.aim_mgr.get(aim_ctx, aim_resource.L3OutInterface(
+                    tenant_name=ext_net.tenant_name,
+                    l3out_name=ext_net.l3out_name,
+                    node_profile_name=md.L3OUT_NODE_PROFILE_NAME,
+                    interface_profile_name=md.L3OUT_IF_PROFILE_NAME,
+                    interface_path=hlink.path))
+            return self.aim_mgr.get(aim_ctx, aim_resource.EPGStaticPath(
+                tenant_name=epg.tenant_name,
+                app_profile_name=epg.app_profile_name,
+                epg_name=epg.name,
+                path=hlink.path))
+
+        with self.subnet(network={'network': net1}) as sub1:
+            p1, p2, p3 = [self._make_port(self.fmt, net1['id'])['port']
+                          for _ in range(3)]
+            self._bind_port_to_host(p1['id'], 'h1')
+            self._bind_port_to_host(p2['id'], 'h1')
+            self._bind_port_to_host(p3['id'], 'h2')
+            self.assertIsNotNone(get_path(self.hlink1))
+            self.assertIsNotNone(get_path(hlink2))
+
+            # Another port is still bound to the segment on h1.
+            self._delete('ports', p1['id'])
+            self.assertIsNotNone(get_path(self.hlink1))
+
+            # No port is left on h1, the one bound on h2 does not count.
+            self._delete('ports', p2['id'])
+            self.assertIsNone(get_path(self.hlink1))
+            self.assertIsNotNone(get_path(hlink2))
+
+            self._delete('ports', p3['id'])
+            self.assertIsNone(get_path(hlink2))
+
+    def test_static_path_kept_for_other_port_on_host(self):
+        self._test_static_path_kept_for_other_port_on_host()
+
+    def test_static_path_kept_for_other_port_on_host_svi(self):
+        self._test_static_path_kept_for_other_port_on_host(is_svi=True)
+
     def _test_multiple_networks_on_host(self, is_svi=False, bgp_enabled=False):
         with db_api.CONTEXT_READER.using(self.db_session):
             aim_ctx = aim_context.AimContext(self.db_session)
@@ -12658,6 +13141,44 @@ class TestPortVlanNetwork(ApicAimTestCase):
                 self.assertEqual('ExhaustedApicRouterIdPool',
                                  result['NeutronError']['type'])
 
+    def test_topology_cache(self):
+        cfg.CONF.set_override('topology_cache_max_age', 600,
+                              group='ml2_apic_aim')
+        nctx = n_context.get_admin_context()
+        aim_ctx = aim_context.AimContext(self.db_session)
+        topology_cache = self.driver._topology_cache
+        path1 = 'topology/pod-1/paths-101/pathep-[eth1/19]'
+        path2 = 'topology/pod-1/paths-101/pathep-[eth1/42]'
+        self.driver.update_link(nctx, 'h1', 'eth0', 'A:A', 101, 1, 19, '1',
+                                path1)
+
+        with mock.patch.object(self.driver.aim, 'find',
+                               wraps=self.driver.aim.find) as find:
+            links = topology_cache.get_host_links(aim_ctx, 'h1')
+            self.assertEqual([path1], [link.path for link in links])
+            # Callers can modify what they get without affecting the
+            # cache.
+            links[0].path = path2
+            links = topology_cache.get_host_links(aim_ctx, 'h1')
+            self.assertEqual([path1], [link.path for link in links])
+            self.assertEqual(1, find.call_count)
+
+            # A link update handled by this process invalidates the
+            # host's entry.
+            self.driver.update_link(nctx, 'h1', 'eth0', 'A:A', 101, 1, 42,
+                                    '1', path2)
+            links = topology_cache.get_host_links(aim_ctx, 'h1')
+            self.assertEqual([path2], [link.path for link in links])
+
+        # Parsed paths are cached, but callers get their own lists.
+        topology = self.driver._get_topology_from_path(path2)
+        self.assertEqual(
+            (False, '1', ['101'], ['topology/pod-1/node-101'], '1', '42'),
+            topology)
+        topology[2].append('102')
+        self.assertEqual(['101'],
+                         self.driver._get_topology_from_path(path2)[2])
+
     def test_port_binding_missing_hostlink(self):
         with db_api.CONTEXT_READER.using(self.db_session):
             aim_ctx = aim_context.AimContext(self.db_session)
@@ -13229,35 +13750,63 @@ class TestPortOnPhysicalNode(TestPortVlanNetwork):
             sg_rule['id'], 'default', sg_id, tenant_aname)
         self.assertEqual(aim_sg_rule.remote_ips, ['10.0.1.0/24'])
 
+        # create other security group rules referencing the address
+        # group
+        rule = self._build_security_group_rule(
+            sg_id, 'egress', n_constants.PROTO_NAME_TCP, '22', '23',
+            remote_address_group_id=ag_id, ethertype=n_constants.IPv4)
+        rules = {'security_group_rules': [rule['security_group_rule']]}
+        sg_rule2 = self._make_security_group_rule(
+            self.fmt, rules)['security_group_rules'][0]
+        rule = self._build_security_group_rule(
+            sg_id, 'ingress', n_constants.PROTO_NAME_TCP, '22', '23',
+            remote_address_group_id=ag_id, ethertype=n_constants.IPv6)
+        rules = {'security_group_rules': [rule['security_group_rule']]}
+        sg_rule_v6 = self._make_security_group_rule(
+            self.fmt, rules)['security_group_rules'][0]
+        aim_sg_rule = self._get_sg_rule(
+            sg_rule_v6['id'], 'default', sg_id, tenant_aname)
+        self.assertEqual(aim_sg_rule.remote_ips, [])
+
         # add addresses to address group
-        data = {'addresses': ['192.168.0.1/32']}
+        data = {'addresses': ['192.168.0.1/32', '2001:db8::/64']}
         self._test_address_group_actions(ag['address_group']['id'],
                                          data, 'add_addresses')
         req = self.new_show_request('address-groups',
                                     ag['address_group']['id'])
         ag = self.deserialize(self.fmt, req.get_response(self.ext_api))
+        for rule_id in [sg_rule['id'], sg_rule2['id']]:
+            aim_sg_rule = self._get_sg_rule(
+                rule_id, 'default', sg_id, tenant_aname)
+            self.assertEqual(aim_sg_rule.remote_ips,
+                             ['10.0.1.0/24', '192.168.0.1/32'])
         aim_sg_rule = self._get_sg_rule(
-            sg_rule['id'], 'default', sg_id, tenant_aname)
-        self.assertEqual(aim_sg_rule.remote_ips,
-                         ['10.0.1.0/24', '192.168.0.1/32'])
+            sg_rule_v6['id'], 'default', sg_id, tenant_aname)
+        self.assertEqual(aim_sg_rule.remote_ips, ['2001:db8::/64'])
 
         # remove addresses to address group
-        data = {'addresses': ['192.168.0.1/32']}
+        data = {'addresses': ['192.168.0.1/32', '2001:db8::/64']}
         self._test_address_group_actions(ag['address_group']['id'],
                                          data, 'remove_addresses')
         req = self.new_show_request('address-groups',
                                     ag['address_group']['id'])
         ag = self.deserialize(self.fmt, req.get_response(self.ext_api))
+        for rule_id in [sg_rule['id'], sg_rule2['id']]:
+            aim_sg_rule = self._get_sg_rule(
+                rule_id, 'default', sg_id, tenant_aname)
+            self.assertEqual(aim_sg_rule.remote_ips, ['10.0.1.0/24'])
         aim_sg_rule = self._get_sg_rule(
-            sg_rule['id'], 'default', sg_id, tenant_aname)
-        self.assertEqual(aim_sg_rule.remote_ips, ['10.0.1.0/24'])
+            sg_rule_v6['id'], 'default', sg_id, tenant_aname)
+        self.assertEqual(aim_sg_rule.remote_ips, [])
 
         # delete address group when sg rule reference present
         self._delete('address-groups', ag['address_group']['id'],
                     expected_code=webob.exc.HTTPConflict.code)
 
-        # delete address group with removing sg rule
+        # delete address group with removing sg rules
         self._delete('security-group-rules', sg_rule['id'])
+        self._delete('security-group-rules', sg_rule2['id'])
+        self._delete('security-group-rules', sg_rule_v6['id'])
         self._delete('address-groups', ag['address_group']['id'])
         self._show('address-groups', ag['address_group']['id'],
                    expected_code=webob.exc.HTTPNotFound.code)
@@ -14651,8 +15200,9 @@ class TestOpflexRpc(ApicAimTestCase):
         response = self.driver.request_endpoint_details(
             n_context.get_admin_context(), request=request, host='h2')
         h2_snat = response['gbp_details']['host_snat_ips'][0]
-        self.assertEqual(10000, h2_snat['start_port'])
-        self.assertEqual(10999, h2_snat['end_port'])
+        # Each host starts from its own slot, so either range may go to h2.
+        self.assertIn(h2_snat['start_port'], (10000, 11000))
+        self.assertEqual(h2_snat['start_port'] + 999, h2_snat['end_port'])
 
         p1 = self._make_port(
             self.fmt, net['id'],
@@ -14670,8 +15220,8 @@ class TestOpflexRpc(ApicAimTestCase):
         self.assertEqual(ext_net['id'], snat['ext_net_id'])
         self.assertEqual(self.dn_t1_l1_n1.replace('/', ':'),
                          snat['external_segment_name'])
-        self.assertEqual(11000, snat['start_port'])
-        self.assertEqual(11999, snat['end_port'])
+        self.assertEqual(21000 - h2_snat['start_port'], snat['start_port'])
+        self.assertEqual(snat['start_port'] + 999, snat['end_port'])
         self.assertEqual('0.0.0.0/0', snat['dest_prefix'])
         self.assertEqual(snat_subnet['id'], snat['snat_subnet_id'])
         self.assertEqual(snat_subnet['id'], snat['snat_uuid'])
@@ -14681,11 +15231,45 @@ class TestOpflexRpc(ApicAimTestCase):
         self.assertEqual(1, len(snat['service_nodes']))
         node = snat['service_nodes'][0]
         self.assertEqual('h2', node['host'])
-        self.assertEqual(10000, node['start_port'])
-        self.assertEqual(10999, node['end_port'])
+        self.assertEqual(h2_snat['start_port'], node['start_port'])
+        self.assertEqual(h2_snat['end_port'], node['end_port'])
         self.assertEqual(node['service_mac'], node['mac'])
         self._check_ip_in_cidr(node['service_ip'], svc_subnet['cidr'])
 
+        # The service nodes sharing the SNAT IP are cached, so they are
+        # not queried again for the next endpoint.
+        with mock.patch.object(self.driver, '_load_dist_snat_service_nodes',
+                               wraps=self.driver._load_dist_snat_service_nodes
+                               ) as load:
+            response = self.driver.request_endpoint_details(
+                n_context.get_admin_context(), request=request, host='h1')
+            load.assert_not_called()
+            self.assertEqual(
+                snat['service_nodes'],
+                response['gbp_details']['host_snat_ips'][0]['service_nodes'])
+
+            # Dropping a mapping of the SNAT IP invalidates them.
+            admin_ctx = n_context.get_admin_context()
+            with db_api.CONTEXT_WRITER.using(admin_ctx) as session:
+                self.driver.delete_dist_snat_mappings(
+                    session, snat_ip=snat_ip, host_name='h2')
+            response = self.driver.request_endpoint_details(
+                n_context.get_admin_context(), request=request, host='h1')
+            load.assert_called_once()
+            self.assertEqual(
+                [],
+                response['gbp_details']['host_snat_ips'][0]['service_nodes'])
+
+        # Entries reloaded before such a change is committed are dropped
+        # once it is.
+        with db_api.CONTEXT_WRITER.using(admin_ctx) as session:
+            self.driver.delete_dist_snat_mappings(
+                session, snat_ip=snat_ip, host_name='h1')
+            extn_db.DIST_SNAT_SERVICE_NODES.get(
+                snat_ip, snat_subnet['id'], lambda: ['stale'])
+        self.assertEqual([], extn_db.DIST_SNAT_SERVICE_NODES.get(
+            snat_ip, snat_subnet['id'], lambda: []))
+
     def test_endpoint_details_dist_snat_exhaustion_has_no_mapping(self):
         self._register_agent('h1', AGENT_CONF_OPFLEX)
         self._register_agent('h2', AGENT_CONF_OPFLEX)
@@ -14792,6 +15376,50 @@ class TestOpflexRpc(ApicAimTestCase):
             request, response, port, net['network'], subnets,
             network_type='vlan')
 
+    def test_endpoint_details_unbound_binding_in_progress(self):
+        host = 'host1'
+        net = self._make_network(self.fmt, 'net1', True)
+        net_id = net['network']['id']
+        subnet = self._make_subnet(
+            self.fmt, net, '10.0.1.1', '10.0.1.0/24')['subnet']
+        port = self._make_port(self.fmt, net_id)['port']
+        port_id = port['id']
+        port = self._bind_port_to_host(port_id, host)['port']
+        with db_api.CONTEXT_READER.using(self.db_session):
+            self.db_session.query(ml2_models.PortBinding).filter_by(
+                port_id=port['id']).update(
+                    {'vif_type': portbindings.VIF_TYPE_BINDING_FAILED})
+        request = {
+            'device': 'tap' + port_id,
+            'timestamp': 12345,
+            'request_id': 'a_request'
+        }
+
+        # While another request is binding the port, the RPC returns
+        # without details and without binding the port itself.
+        coalesced = apic_rpc.BINDING_COALESCER.coalesced
+        self.assertTrue(apic_rpc.BINDING_COALESCER.begin(port_id))
+        with mock.patch.object(
+                self.plugin, 'get_bound_port_context') as bind:
+            try:
+                response = self.driver.request_endpoint_details(
+                    n_context.get_admin_context(), request=request,
+                    host=host)
+            finally:
+                apic_rpc.BINDING_COALESCER.end(port_id)
+        bind.assert_not_called()
+        self.assertTrue(response['binding_in_progress'])
+        self.assertEqual('a_request', response['request_id'])
+        self.assertNotIn('gbp_details', response)
+        self.assertEqual(coalesced + 1, apic_rpc.BINDING_COALESCER.coalesced)
+
+        # Once that is done, the agent's retry binds the port.
+        response = self.driver.request_endpoint_details(
+            n_context.get_admin_context(), request=request, host=host)
+        self._check_response(
+            request, response, port, net['network'], [subnet],
+            network_type='vlan')
+
     def test_endpoint_details_nonexistent_port(self):
         host = 'host1'
 
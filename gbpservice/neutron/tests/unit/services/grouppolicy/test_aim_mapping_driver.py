@@ -1640,6 +1640,22 @@ class TestLegacyL3Policy(TestL3Policy):
         self.driver._create_per_l3p_implicit_contracts()
         self._validate_implicit_contracts_created(l3p['id'])
 
+    def test_default_l3p_forgotten(self):
+        # Renaming the cached default L3P drops its entry.
+        l2p = self.create_l2_policy()['l2_policy']
+        self.assertEqual(l2p['l3_policy_id'],
+                         self.driver._default_l3p_ids.get(self._tenant_id))
+        self.update_l3_policy(l2p['l3_policy_id'], name='renamed',
+                              expected_res_status=200)
+        self.assertNotIn(self._tenant_id, self.driver._default_l3p_ids)
+
+        # So does deleting it, here along with its implicit L2P.
+        l2p = self.create_l2_policy()['l2_policy']
+        self.assertEqual(l2p['l3_policy_id'],
+                         self.driver._default_l3p_ids.get(self._tenant_id))
+        self.delete_l2_policy(l2p['id'], expected_res_status=204)
+        self.assertNotIn(self._tenant_id, self.driver._default_l3p_ids)
+
 
 class TestL3PolicyRollback(AIMBaseTestCase):
 
@@ -3080,6 +3096,42 @@ class TestPolicyTarget(AIMBaseTestCase,
                          set(self._doms(aim_epg.physical_domains,
                                         with_type=False)))
 
+    def test_create_policy_target_bulk(self):
+        ptg = self.create_policy_target_group(
+            name="ptg1")['policy_target_group']
+        with self.port() as port:
+            port_id = port['port']['id']
+            pts = [{'name': 'pt%d' % i, 'policy_target_group_id': ptg['id'],
+                    'tenant_id': self._tenant_id} for i in range(3)]
+            pts[0]['port_id'] = port_id
+            req = self.new_create_request('policy_targets',
+                                          {'policy_targets': pts}, self.fmt)
+            with mock.patch.object(
+                    self.driver, '_associate_explicit_port',
+                    wraps=self.driver._associate_explicit_port) as assoc:
+                res = req.get_response(self.ext_api)
+            self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+            pts = self.deserialize(self.fmt, res)['policy_targets']
+            self.assertEqual(['pt0', 'pt1', 'pt2'],
+                             [pt['name'] for pt in pts])
+
+            # Only the explicit port is associated in precommit, the
+            # others are created implicitly in postcommit.
+            self.assertEqual(1, assoc.call_count)
+            self.assertEqual(port_id,
+                             assoc.call_args[0][0].current['port_id'])
+            self.assertEqual(port_id, pts[0]['port_id'])
+            for pt in pts:
+                self.assertIsNotNone(pt['port_id'])
+                self._show('ports', pt['port_id'])
+                pt_info = self.driver._port_id_to_pt_info(
+                    nctx.get_admin_context(), pt['port_id'])
+                self.assertEqual(pt['id'], pt_info.pt_id)
+                self.assertEqual(ptg['id'], pt_info.ptg_id)
+
+            for pt in pts:
+                self.delete_policy_target(pt['id'], expected_res_status=204)
+
     def test_policy_target_with_default_domains_explicit_port(self):
         aim_ctx = aim_context.AimContext(self.db_session)
         self.aim_mgr.create(aim_ctx,
@@ -3801,6 +3853,62 @@ class TestPolicyTarget(AIMBaseTestCase,
             newp1 = self._bind_port_to_host(pt['port_id'], 'h3')
             self.assertEqual(newp1['port']['binding:vif_type'], 'ovs')
 
+    def test_port_id_to_pt_info(self):
+        self.driver._port_pt_infos = {}
+        ptg = self.create_policy_target_group(
+            name="ptg1")['policy_target_group']
+        l2p = self.show_l2_policy(ptg['l2_policy_id'])['l2_policy']
+        pt = self.create_policy_target(
+            policy_target_group_id=ptg['id'])['policy_target']
+        with self.port() as port:
+            other_port_id = port['port']['id']
+
+        ctx = nctx.get_admin_context()
+        with mock.patch.object(
+                self.driver, '_query_port_pt_infos',
+                wraps=self.driver._query_port_pt_infos) as query:
+            for _ in range(2):
+                info = self.driver._port_id_to_pt_info(ctx, pt['port_id'])
+                self.assertEqual(
+                    (pt['id'], ptg['id'], l2p['id'], l2p['l3_policy_id']),
+                    info)
+                self.assertIsNone(
+                    self.driver._port_id_to_pt_info(ctx, other_port_id))
+            # Each port is only queried once per request.
+            self.assertEqual(2, query.call_count)
+
+            # Hits are also kept in the process-scoped cache.
+            info = self.driver._port_id_to_pt_info(
+                nctx.get_admin_context(), pt['port_id'])
+            self.assertEqual(pt['id'], info.pt_id)
+            self.assertEqual(2, query.call_count)
+
+        self.assertEqual([pt['port_id']],
+                         self.driver.get_ptg_port_ids(ctx, ptg))
+
+        # The PTG is resolved without going through the plugin's GETs,
+        # and maps to the same EPG as the full PTG.
+        with mock.patch.object(self._gbp_plugin,
+                               'get_policy_target') as get_pt, \
+                mock.patch.object(self._gbp_plugin,
+                                  'get_policy_target_group') as get_ptg:
+            port_ptg, port_pt = self.driver._port_id_to_ptg(
+                ctx, pt['port_id'])
+            get_pt.assert_not_called()
+            get_ptg.assert_not_called()
+        self.assertEqual(ptg['id'], port_ptg['id'])
+        self.assertEqual(pt['id'], port_pt['id'])
+        self.assertEqual(
+            self.driver._aim_endpoint_group(ctx.session, ptg).dn,
+            self.driver._aim_endpoint_group(ctx.session, port_ptg).dn)
+
+        # Deleting the PT invalidates the cached entry.
+        self.delete_policy_target(pt['id'], expected_res_status=204)
+        self.assertNotIn(pt['port_id'], self.driver._port_pt_infos)
+        self.assertIsNone(self.driver._port_id_to_pt_info(
+            nctx.get_admin_context(), pt['port_id']))
+        self.assertEqual([], self.driver.get_ptg_port_ids(ctx, ptg))
+
 
 class TestPolicyTargetDvs(AIMBaseTestCase):
 
@@ -4613,6 +4721,22 @@ class TestExternalSegment(AIMBaseTestCase):
         es_net = self._show('networks', es_sub['network_id'])['network']
         self.assertEqual(['0.0.0.0/0'], es_net[CIDR])
 
+    def test_default_es_ids_cleared(self):
+        es_sub = self._make_ext_subnet('net1', '90.90.0.0/16',
+                                       dn=self._dn_t1_l1_n1)
+        self.driver._default_es_ids[self._tenant_id] = 'stale'
+        es = self.create_external_segment(
+            name='seg1', subnet_id=es_sub['id'])['external_segment']
+        self.assertEqual({}, self.driver._default_es_ids)
+
+        self.driver._default_es_ids[self._tenant_id] = 'stale'
+        self.update_external_segment(es['id'], name='seg2')
+        self.assertEqual({}, self.driver._default_es_ids)
+
+        self.driver._default_es_ids[self._tenant_id] = 'stale'
+        self.delete_external_segment(es['id'])
+        self.assertEqual({}, self.driver._default_es_ids)
+
     def test_implicit_subnet(self):
         res = self.create_external_segment(name='seg1',
                                            expected_res_status=400)
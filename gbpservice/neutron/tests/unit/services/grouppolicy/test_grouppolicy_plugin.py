@@ -1029,6 +1029,51 @@ class TestResourceStatusChange(GroupPolicyPluginTestCase):
         for resource_name in gpolicy.RESOURCE_ATTRIBUTE_MAP:
             self._test_status_change_on_list(resource_name, fields=['name'])
 
+    def _test_status_refresh(self, resource_name):
+        resource_singular = self._get_resource_singular(resource_name)
+        if resource_name == 'policy_rules':
+            pc_id = self.create_policy_classifier()['policy_classifier']['id']
+            resource = self.create_policy_rule(policy_classifier_id=pc_id)
+        else:
+            resource = getattr(self, "create_" + resource_singular)()
+        resource_id = resource[resource_singular]['id']
+
+        # Reset status directly in the DB, and verify that GET neither
+        # recomputes it nor writes it.
+        neutron_context = context.Context('', self._tenant_id)
+        reset_status = {resource_singular: {'status': None,
+                                            'status_details': None}}
+        getattr(gpmdb.GroupPolicyMappingDbPlugin,
+                "update_" + resource_singular)(
+                    self._gbp_plugin, neutron_context, resource_id,
+                    reset_status)
+        res = self._get_object(resource_name, resource_id, self.ext_api)
+        self.assertIsNone(res[resource_singular]['status'])
+        self.assertIsNone(res[resource_singular]['status_details'])
+
+        # The periodic refresh recomputes and persists the status.
+        self._gbp_plugin._refresh_all_status()
+        res = self._get_object(resource_name, resource_id, self.ext_api)
+        self.assertEqual(NEW_STATUS, res[resource_singular]['status'])
+        self.assertEqual(NEW_STATUS_DETAILS,
+                         res[resource_singular]['status_details'])
+
+    def test_status_refresh_in_background(self):
+        self._gbp_plugin.status_refresh_interval = 60
+        for resource_name in gpolicy.RESOURCE_ATTRIBUTE_MAP:
+            self._test_status_refresh(resource_name)
+
+    def test_status_refresh_worker(self):
+        self.assertEqual([], self._gbp_plugin.get_workers())
+        self._gbp_plugin.status_refresh_interval = 60
+        workers = self._gbp_plugin.get_workers()
+        self.assertEqual(1, len(workers))
+        # The worker's loop survives a failed refresh.
+        with mock.patch.object(self._gbp_plugin,
+                               '_really_refresh_all_status',
+                               side_effect=Exception):
+            workers[0]._check_func()
+
 
 class TestGroupPolicyPluginGroupResources(
         GroupPolicyPluginTestCase, tgpdb.TestGroupResources):
@@ -11,6 +11,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from unittest import mock
+
 from oslo_config import cfg
 import webob.exc
 
@@ -203,6 +205,25 @@ class TestImplicitL3Policy(ImplicitPolicyTestCase):
         self.assertEqual('DefaultL3PolicyAlreadyExists',
                          res['NeutronError']['type'])
 
+    def test_default_policy_cached(self):
+        driver = self.plugin.policy_driver_manager.policy_drivers[
+            'implicit_policy'].obj
+        l3p_id = self.create_l2_policy()['l2_policy']['l3_policy_id']
+
+        # Verify the default L3 policy is not searched for again.
+        with mock.patch.object(driver, '_get_l3_policies',
+                               wraps=driver._get_l3_policies) as get_l3ps:
+            l2p = self.create_l2_policy()
+            self.assertEqual(l3p_id, l2p['l2_policy']['l3_policy_id'])
+            get_l3ps.assert_not_called()
+
+        # Verify renaming the default L3 policy is noticed.
+        data = {'l3_policy': {'name': 'notdefault'}}
+        req = self.new_update_request('l3_policies', data, l3p_id)
+        req.get_response(self.ext_api)
+        l2p = self.create_l2_policy()
+        self.assertNotEqual(l3p_id, l2p['l2_policy']['l3_policy_id'])
+
     def test_update_from_implicit(self):
         # Create L2 policy with implicit L3 policy.
         l2p = self.create_l2_policy()
@@ -331,6 +352,27 @@ class TestImplicitExternalSegment(ImplicitPolicyTestCase):
     def test_implicit_lifecycle_shared(self):
         self._test_implicit_lifecycle(True)
 
+    def test_default_es_cached(self):
+        driver = self.plugin.policy_driver_manager.policy_drivers[
+            'implicit_policy'].obj
+        es = self._create_default_es(shared=True)['external_segment']
+        self.create_l3_policy(name='l3p1', ip_pool='10.1.0.0/16')
+
+        # Verify the default ES is not searched for again.
+        with mock.patch.object(driver, '_get_external_segments',
+                               wraps=driver._get_external_segments) as get_ess:
+            l3p = self.create_l3_policy(
+                name='l3p2', ip_pool='10.2.0.0/16')['l3_policy']
+            self.assertEqual([es['id']], list(l3p['external_segments']))
+            get_ess.assert_not_called()
+
+        # Verify renaming the default ES is noticed.
+        self.update_external_segment(es['id'], expected_res_status=200,
+                                     name='non-default-name')
+        l3p = self.create_l3_policy(
+            name='l3p3', ip_pool='10.3.0.0/16')['l3_policy']
+        self.assertEqual({}, l3p['external_segments'])
+
     def test_implicit_shared_visibility(self):
         es = self._create_default_es(shared=True,
                                      tenant_id='onetenant')['external_segment']
@@ -349,6 +391,20 @@ class TestImplicitExternalSegment(ImplicitPolicyTestCase):
         self.assertEqual('DefaultExternalSegmentAlreadyExists',
                          res['NeutronError']['type'])
 
+    def test_rename_to_default_es_name(self):
+        self._create_default_es(shared=True, tenant_id='onetenant')
+        es = self.create_external_segment(
+            name='non-default-name', tenant_id='anothertenant',
+            expected_res_status=201)['external_segment']
+
+        # Verify an ES cannot be renamed to the default name while
+        # another default ES is visible.
+        res = self.update_external_segment(
+            es['id'], expected_res_status=400, name=self._default_es_name,
+            tenant_id='anothertenant')
+        self.assertEqual('DefaultExternalSegmentAlreadyExists',
+                         res['NeutronError']['type'])
+
 
 class TestQuotasForGBPWithImplicitDriver(ImplicitPolicyTestCase):
 
@@ -395,6 +451,23 @@ class TestQuotasForGBPWithImplicitDriver(ImplicitPolicyTestCase):
         self.assertRaises(webob.exc.HTTPClientError,
                           self.create_policy_target_group)
 
+    def test_quota_for_implicit_l3p_not_reserved(self):
+        # The following tests that implicit L3P creation does not take
+        # a quota reservation when reserve_implicit_resource_quota is
+        # disabled, while explicit creates are still limited.
+        cfg.CONF.set_override('reserve_implicit_resource_quota', False,
+                              group='group_policy')
+        cfg.CONF.set_override('quota_policy_target_group', 2, group='QUOTAS')
+        cfg.CONF.set_override('quota_l2_policy', 2, group='QUOTAS')
+        l3p = self.create_l3_policy(name='test')
+        l3p_id = l3p['l3_policy']['id']
+        l2p = self.create_l2_policy(name='test', l3_policy_id=l3p_id)
+        l2p_id = l2p['l2_policy']['id']
+        self.create_policy_target_group(l2_policy_id=l2p_id)
+        self.create_policy_target_group()
+        self.assertRaises(webob.exc.HTTPClientError,
+                          self.create_l3_policy)
+
     def test_quota_for_implicit_l2p(self):
         # The following tests that implicit L2P creation fails
         # when resource quota is reached.
@@ -597,6 +597,43 @@ class TestPolicyTarget(ResourceMappingTestCase, TestClusterIdMixin):
             ip = port['fixed_ips'][0]['ip_address']
             self.assertEqual('10.10.1.5', ip)
 
+    def test_create_policy_target_bulk(self):
+        ptg = self.create_policy_target_group(
+            name="ptg1")['policy_target_group']
+        # Ports created in bulk are expected to match one created for
+        # a single policy_target.
+        ref_pt = self.create_policy_target(
+            policy_target_group_id=ptg['id'])['policy_target']
+        ref_port = self._get_object('ports', ref_pt['port_id'],
+                                    self.api)['port']
+        pts = [{'name': 'pt%d' % i, 'policy_target_group_id': ptg['id'],
+                'tenant_id': self._tenant_id} for i in range(3)]
+        req = self.new_create_request('policy_targets',
+                                      {'policy_targets': pts}, self.fmt)
+        with mock.patch.object(resource_mapping.ResourceMappingDriver,
+                               '_use_implicit_port') as use_implicit_port:
+            res = req.get_response(self.ext_api)
+        self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+        # All the implicit ports are created through the bulk path.
+        use_implicit_port.assert_not_called()
+        pts = self.deserialize(self.fmt, res)['policy_targets']
+        self.assertEqual(['pt0', 'pt1', 'pt2'], [pt['name'] for pt in pts])
+        for pt in pts:
+            port = self._get_object('ports', pt['port_id'], self.api)['port']
+            self.assertEqual('pt_' + pt['name'], port['name'])
+            self.assertEqual(
+                [ip['subnet_id'] for ip in ref_port['fixed_ips']],
+                [ip['subnet_id'] for ip in port['fixed_ips']])
+            self.assertEqual(sorted(ref_port['security_groups']),
+                             sorted(port['security_groups']))
+
+        # Deleting the policy_targets cleans up the implicit ports.
+        for pt in pts:
+            self.delete_policy_target(pt['id'], expected_res_status=204)
+            req = self.new_show_request('ports', pt['port_id'], fmt=self.fmt)
+            res = req.get_response(self.api)
+            self.assertEqual(webob.exc.HTTPNotFound.code, res.status_int)
+
     def test_explicit_port_lifecycle(self):
         # Create policy_target group.
         ptg = self.create_policy_target_group(name="ptg1")
@@ -2448,6 +2485,69 @@ class TestPolicyRuleSet(ResourceMappingTestCase):
         self._verify_prs_rules(policy_rule_set1_id)
         self._verify_prs_rules(policy_rule_set2_id)
 
+    def test_policy_target_group_update_bulk_port_sgs(self):
+        # PRS changes on a PTG update all its PT ports' SGs in one
+        # transaction, without a full port update per PT.
+        allow_rule = self._create_simple_policy_rule()
+        prs = self.create_policy_rule_set(
+            policy_rules=[allow_rule['id']])['policy_rule_set']
+        ptg = self.create_policy_target_group()['policy_target_group']
+        port_ids = [self.create_policy_target(
+            policy_target_group_id=ptg['id'])['policy_target']['port_id']
+            for i in range(3)]
+        orig_sgs = {port_id: set(self._get_object(
+            'ports', port_id, self.api)['port'][ext_sg.SECURITYGROUPS])
+            for port_id in port_ids}
+        mapping = self._get_prs_mapping(prs['id'])
+
+        with mock.patch.object(resource_mapping.ResourceMappingDriver,
+                               '_update_port') as update_port:
+            self.update_policy_target_group(
+                ptg['id'], provided_policy_rule_sets={prs['id']: None},
+                expected_res_status=200)
+            update_port.assert_not_called()
+        for port_id in port_ids:
+            port = self._get_object('ports', port_id, self.api)['port']
+            self.assertEqual(orig_sgs[port_id] | {mapping.provided_sg_id},
+                             set(port[ext_sg.SECURITYGROUPS]))
+
+        with mock.patch.object(resource_mapping.ResourceMappingDriver,
+                               '_update_port') as update_port:
+            self.update_policy_target_group(
+                ptg['id'], provided_policy_rule_sets={},
+                expected_res_status=200)
+            update_port.assert_not_called()
+        for port_id in port_ids:
+            port = self._get_object('ports', port_id, self.api)['port']
+            self.assertEqual(orig_sgs[port_id],
+                             set(port[ext_sg.SECURITYGROUPS]))
+
+    def test_policy_target_group_update_bulk_port_sgs_notify(self):
+        # Each PT port whose SGs change in bulk gets a port update
+        # notification, besides the SG member update.
+        allow_rule = self._create_simple_policy_rule()
+        prs = self.create_policy_rule_set(
+            policy_rules=[allow_rule['id']])['policy_rule_set']
+        ptg = self.create_policy_target_group()['policy_target_group']
+        port_ids = [self.create_policy_target(
+            policy_target_group_id=ptg['id'])['policy_target']['port_id']
+            for i in range(3)]
+        mapping = self._get_prs_mapping(prs['id'])
+
+        notifier = self._plugin.notifier
+        with mock.patch.object(self._plugin,
+                               '_notify_port_updated') as notify_port, \
+                mock.patch.object(notifier,
+                                  'security_groups_member_updated') as notify:
+            self.update_policy_target_group(
+                ptg['id'], provided_policy_rule_sets={prs['id']: None},
+                expected_res_status=200)
+            self.assertEqual(
+                sorted(port_ids),
+                sorted(call[0][0].current['id']
+                       for call in notify_port.call_args_list))
+            notify.assert_any_call(mock.ANY, [mapping.provided_sg_id])
+
     # Test update of policy rules
     def test_policy_rule_update(self):
         classifier1 = self.create_policy_classifier(
@@ -16,6 +16,7 @@ from unittest import mock
 from aim.api import infra as aim_infra
 from aim.api import resource as aim_res
 from aim.api import service_graph as aim_sg
+from aim import context as aim_context
 from networking_sfc.extensions import flowclassifier as flowc_ext
 from networking_sfc.extensions import sfc as sfc_ext
 from networking_sfc.services.flowclassifier.common import config as flc_cfg
@@ -1191,6 +1192,54 @@ class TestPortChain(TestAIMServiceFunctionChainingBase):
                               self._ctx, net_db.aim_mapping,
                               aim_res.VRF(tenant_name='new', name='new'))
 
+    def test_chain_ids_by_network_id(self):
+        fc = self._create_simple_flowc(src_svi=self.src_svi,
+                                       dst_svi=self.dst_svi)
+        ppg = self._create_simple_ppg(pairs=1)
+        pc = self.create_port_chain(port_pair_groups=[ppg['id']],
+                                    flow_classifiers=[fc['id']],
+                                    expected_res_status=201)['port_chain']
+        pp = self.show_port_pair(ppg['port_pairs'][0])['port_pair']
+        service_net = self._get_port_network(pp['ingress'])['id']
+        other_net = self._make_network(self.fmt, 'other', True)['network']
+        get_chain_ids = self.sfc_driver._get_chain_ids_by_network_id
+        with db_api.CONTEXT_READER.using(self._ctx):
+            for net_id in (fc['l7_parameters']['logical_source_network'],
+                           fc['l7_parameters']['logical_destination_network'],
+                           service_net):
+                self.assertEqual(set([pc['id']]),
+                                 get_chain_ids(self._ctx, net_id))
+            # Service networks are only looked up through the groups.
+            self.assertEqual(set(), get_chain_ids(
+                self._ctx, service_net, include_groups=False))
+            self.assertEqual(set(), get_chain_ids(self._ctx,
+                                                  other_net['id']))
+
+    def test_sfc_writes_seen_by_mech_driver_reads(self):
+        fc = self._create_simple_flowc(src_svi=self.src_svi,
+                                       dst_svi=self.dst_svi)
+        ppg = self._create_simple_ppg(pairs=1)
+        pc = self.create_port_chain(port_pair_groups=[ppg['id']],
+                                    flow_classifiers=[fc['id']],
+                                    expected_res_status=201)['port_chain']
+        self.assertIs(self.aim_mech.aim, self.sfc_driver.aim)
+        try:
+            with db_api.CONTEXT_WRITER.using(self._ctx) as session:
+                aim_ctx = aim_context.AimContext(session)
+                epg = self.sfc_driver._get_ppg_left_right_epgs(
+                    self._ctx, ppg)[0]
+                # The mechanism driver caches the EPG unsynced by the
+                # chain, and then sees it synced again by the SFC driver.
+                self.assertFalse(self.aim_mech.aim.get(aim_ctx, epg).sync)
+                flowcs, ppgs = self.sfc_driver._get_pc_flowcs_and_ppgs(
+                    self._ctx, pc)
+                self.sfc_driver._delete_port_chain_mapping(
+                    self._ctx, pc, flowcs, ppgs)
+                self.assertTrue(self.aim_mech.aim.get(aim_ctx, epg).sync)
+                raise Rollback()
+        except Rollback:
+            pass
+
     def test_pc_mapping_no_host_mapping(self):
         ctx = self._aim_context
         self.aim_mgr.delete_all(ctx, aim_infra.HostDomainMappingV2)
@@ -1318,6 +1367,25 @@ class TestPortChain(TestAIMServiceFunctionChainingBase):
         verify_port_in_host(eprt, 'h2')
         self._verify_pc_mapping(pc)
 
+    def test_port_pair_rebind_remaps_chain_once(self):
+        ppg = self._create_simple_ppg(pairs=2)
+        fc = self._create_simple_flowc(src_svi=self.src_svi,
+                                       dst_svi=self.dst_svi)
+        pc = self.create_port_chain(port_pair_groups=[ppg['id']],
+                                    flow_classifiers=[fc['id']],
+                                    expected_res_status=201)['port_chain']
+        pp = self.show_port_pair(ppg['port_pairs'][0])['port_pair']
+        iprt = self._unbind_port(pp['ingress'])['port']
+        self._plugin.update_port_status(self._ctx, iprt['id'], 'BUILD')
+        self._bind_port_to_host(iprt['id'], 'h2')
+        with mock.patch.object(
+                self.sfc_driver, 'update_port_chain_precommit',
+                wraps=self.sfc_driver.update_port_chain_precommit) as remap:
+            self._plugin.update_port_status(self._ctx, iprt['id'], 'ACTIVE')
+            self.assertEqual(1, remap.call_count)
+            self.assertEqual(pc['id'], remap.call_args[0][0].current['id'])
+        self._verify_pc_mapping(pc)
+
     # Enable once fixed on the SVI side.
     def _test_pc_mapping_default_sub_ipv6(self):
         fc = self._create_simple_flowc(src_svi=self.src_svi,